@@ -0,0 +1,178 @@
+"""
+Ограничение одновременных запросов на запись
+
+Маршруты записи (создание заказа, правки в админке) занимают соединения
+пула SQLAlchemy на всю транзакцию. Когда Postgres замедляется, запросы
+без ограничения копятся в очереди пула, и таймауты распространяются на
+все эндпоинты, включая каталог.
+
+Лимитер пропускает к базе не больше WRITE_CONCURRENCY запросов записи (по
+умолчанию DB_POOL_SIZE), так что соединения сверх пула (DB_MAX_OVERFLOW)
+остаются чтению и фоновым задачам. Еще WRITE_QUEUE_SIZE запросов ждут
+свободного слота не дольше WRITE_QUEUE_TIMEOUT, остальные сразу получают
+429 с Retry-After. Счетчики доступны на /api/admission
+(только после входа в админку).
+
+При групповой записи заказов (ORDER_BATCH_WINDOW_MS) пачка заказов
+занимает одно соединение, поэтому заказы ограничиваются отдельно: две
+пачки (пишется и собирается) плюс очередь на одну пачку.
+"""
+import asyncio
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from fastapi import Depends, HTTPException
+
+from admin_service.admin.idempotency import order_replay
+from shared.config import settings
+
+# Через сколько секунд клиенту стоит повторить запрос
+RETRY_AFTER = 1
+
+
+class Overloaded(Exception):
+    """Нет свободного слота и места в очереди"""
+
+
+class AdmissionLimiter:
+    """Ограничение одновременных запросов с короткой очередью"""
+
+    def __init__(self, name: str, limit: int, queue_size: int, queue_timeout: float):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """Запросов в очереди"""
+        return len(self._waiters)
+
+    async def acquire(self):
+        """
+        Занять слот
+
+        Raises:
+            Overloaded: очередь заполнена или слот не освободился за queue_timeout
+        """
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return
+
+        if len(self._waiters) >= self.queue_size:
+            self.rejected += 1
+            raise Overloaded()
+
+        # release() передает слот первому ожидающему, не уменьшая in_flight
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            # Слот мог быть передан одновременно с таймаутом
+            if not (waiter.done() and not waiter.cancelled()):
+                self.timed_out += 1
+                self.rejected += 1
+                raise Overloaded()
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        self.admitted += 1
+
+    def release(self):
+        """Освободить слот"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Текущая загрузка и счетчики"""
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queue_size": self.queue_size,
+            "queue_depth": self.queue_depth,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out
+        }
+
+
+_write_limit = settings.WRITE_CONCURRENCY or settings.DB_POOL_SIZE
+
+# Глобальный лимитер запросов на запись
+write_limiter = AdmissionLimiter(
+    "write",
+    limit=_write_limit,
+    queue_size=settings.WRITE_QUEUE_SIZE or _write_limit,
+    queue_timeout=settings.WRITE_QUEUE_TIMEOUT
+)
+
+
+def get_write_limiter() -> AdmissionLimiter:
+    """Получает глобальный лимитер запросов на запись"""
+    return write_limiter
+
+
+if settings.ORDER_BATCH_WINDOW_MS > 0:
+    # Глобальный лимитер заказов при групповой записи
+    order_limiter = AdmissionLimiter(
+        "order",
+        limit=2 * settings.ORDER_BATCH_MAX_SIZE,
+        queue_size=settings.ORDER_BATCH_MAX_SIZE,
+        queue_timeout=settings.WRITE_QUEUE_TIMEOUT
+    )
+else:
+    order_limiter = write_limiter
+
+
+async def _acquire(limiter: AdmissionLimiter):
+    """Занять слот лимитера или ответить 429"""
+    try:
+        await limiter.acquire()
+    except Overloaded:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests, retry later",
+            headers={"Retry-After": str(RETRY_AFTER)}
+        )
+
+
+async def admit_write():
+    """Dependency для маршрутов записи: слот лимитера на время запроса или 429"""
+    await _acquire(write_limiter)
+    try:
+        yield
+    finally:
+        write_limiter.release()
+
+
+async def admit_order(replay: Optional[Dict[str, Any]] = Depends(order_replay)):
+    """
+    Dependency для создания заказа: слот лимитера заказов или 429
+
+    Повтор с Idempotency-Key, ответ на который есть в памяти процесса,
+    проходит без слота; некорректный ключ получает 422 до лимитера.
+    """
+    if replay is not None:
+        yield
+        return
+    await _acquire(order_limiter)
+    try:
+        yield
+    finally:
+        order_limiter.release()
@@ -0,0 +1,396 @@
+"""
+Рассылка акций подписчикам (User.is_subscribed)
+
+Кампания (BroadcastCampaign) - HTML-текст, обычно собранный из скидки, и
+контрольная точка: id пользователя, до которого рассылка уже обработана.
+Подписчики читаются по возрастанию id пачками по USERS_BATCH
+(WHERE id > последний прочитанный ORDER BY id LIMIT), каждая пачка -
+отдельной короткой транзакцией: таблица пользователей не загружается в
+память целиком, а часовая кампания не держит ни соединение пула, ни
+транзакцию, задерживающую vacuum.
+
+Одновременно отправляется не больше TELEGRAM_BROADCAST_CONCURRENCY
+сообщений и не чаще общего лимита бота: TELEGRAM_BROADCAST_RATE сообщений
+в секунду на все кампании (Telegram допускает около 30). Ответ 429
+останавливает всю рассылку на retry_after. У рассылки свой пул соединений
+с Bot API, чтобы уведомления о заказах не стояли за ней в очереди.
+
+Каждые CHECKPOINT_EVERY отправок контрольная точка, счетчики и отписка
+заблокировавших бота (Forbidden) записываются одной транзакцией.
+Контрольная точка - наибольший id, до которого обработаны все
+пользователи: после перезапуска кампания продолжается с него, и повторно
+сообщение получат не больше TELEGRAM_BROADCAST_CONCURRENCY человек.
+
+Процесс берет кампанию в аренду (leased_by, leased_until на LEASE_TIMEOUT)
+и продлевает ее с каждой контрольной точкой, поэтому из нескольких
+процессов uvicorn кампанию отправляет один, а кампания упавшего процесса
+освобождается по истечении аренды. Незавершенные
+кампании продолжаются при старте приложения. Кампанию можно отправить и
+отдельным процессом: python -m admin_service.admin.broadcast <id>
+"""
+import asyncio
+import html
+import logging
+import os
+import sys
+import uuid
+from collections import deque
+from datetime import timedelta
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, or_, select, update
+
+from shared.database import get_db_session
+from shared.models import BroadcastCampaign, Discount, User
+from shared.telegram.sender import (
+    Bot, Forbidden, HTTPXRequest, RetryAfter, SEND_TIMEOUT, TokenBucket, _seconds, get_telegram_sender
+)
+
+logger = logging.getLogger(__name__)
+
+# Статусы кампании
+RUNNING = "running"
+PAUSED = "paused"
+DONE = "done"
+
+# Результаты отправки одному пользователю
+SENT = "sent"
+FAILED = "failed"
+BLOCKED = "blocked"
+
+# Подписчиков в одной пачке чтения
+USERS_BATCH = 1000
+
+# Отправок между записями контрольной точки
+CHECKPOINT_EVERY = 500
+
+# Сколько ждать текущих отправок при остановке приложения
+SHUTDOWN_TIMEOUT = 10.0
+
+# Аренда кампании, продлевается каждой контрольной точкой
+LEASE_TIMEOUT = 300.0
+
+
+def discount_message(discount: Discount) -> str:
+    """HTML-сообщение о скидке для рассылки"""
+    lines = [f"🔥 <b>{html.escape(discount.title)}</b>"]
+    if discount.description:
+        lines.append(html.escape(discount.description))
+    if discount.percent:
+        lines.append(f"Скидка {discount.percent:g}%")
+    if discount.date_end:
+        lines.append(f"До {discount.date_end.strftime('%d.%m.%Y')}")
+    return "\n".join(lines)
+
+
+class BroadcastRun:
+    """Отправка одной кампании"""
+
+    def __init__(self, broadcaster: "Broadcaster", campaign_id: int):
+        self.broadcaster = broadcaster
+        self.campaign_id = campaign_id
+        self.stopping = False
+        # Владелец аренды кампании
+        self.token = uuid.uuid4().hex
+        # id прочитанных пользователей, еще не вошедших в контрольную точку, по порядку
+        self._window: Deque[int] = deque()
+        # Результаты отправки пользователям из окна
+        self._done: Dict[int, str] = {}
+        self._since_checkpoint = 0
+        self.in_flight = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Отправки в работе и еще не записанные в контрольную точку"""
+        return {"in_flight": self.in_flight, "pending": len(self._window)}
+
+    async def _deliver(self, user_id: int, telegram_id: str, text: str):
+        self.in_flight += 1
+        try:
+            self._done[user_id] = await self.broadcaster.send(telegram_id, text)
+            self._since_checkpoint += 1
+        finally:
+            self.in_flight -= 1
+
+    async def _claim(self) -> Optional[Tuple[str, int]]:
+        """Взять кампанию в аренду; None - ее отправляет другой процесс, она приостановлена или завершена"""
+        async with get_db_session() as db:
+            result = await db.execute(
+                update(BroadcastCampaign)
+                .where(
+                    BroadcastCampaign.id == self.campaign_id,
+                    BroadcastCampaign.status == RUNNING,
+                    or_(BroadcastCampaign.leased_until.is_(None), BroadcastCampaign.leased_until < func.now())
+                )
+                .values(leased_by=self.token, leased_until=func.now() + timedelta(seconds=LEASE_TIMEOUT))
+                .returning(BroadcastCampaign.message, BroadcastCampaign.last_user_id)
+            )
+            row = result.first()
+            await db.commit()
+        return tuple(row) if row is not None else None
+
+    async def _recipients(self, after: int) -> List[Tuple[int, str]]:
+        """Следующие USERS_BATCH подписчиков с id больше after (своя короткая транзакция)"""
+        async with get_db_session() as db:
+            result = await db.execute(
+                select(User.id, User.telegram_id)
+                .where(User.is_subscribed.is_(True), User.id > after)
+                .order_by(User.id)
+                .limit(USERS_BATCH)
+            )
+            return [tuple(row) for row in result.all()]
+
+    async def _checkpoint(self, finished: bool = False, release: bool = False):
+        """
+        Записать обработанное начало окна, счетчики и отписку заблокировавших бота; продлить аренду
+
+        Args:
+            finished: подписчики прочитаны до конца; кампания завершена, если все отправки обработаны
+            release: отпустить аренду (отправка остановлена)
+        """
+        self._since_checkpoint = 0
+        last_user_id = None
+        counts = {SENT: 0, FAILED: 0, BLOCKED: 0}
+        blocked: List[int] = []
+        while self._window and self._window[0] in self._done:
+            last_user_id = self._window.popleft()
+            outcome = self._done.pop(last_user_id)
+            counts[outcome] += 1
+            if outcome == BLOCKED:
+                blocked.append(last_user_id)
+
+        values: Dict[str, Any] = {
+            "sent": BroadcastCampaign.sent + counts[SENT],
+            "failed": BroadcastCampaign.failed + counts[FAILED],
+            "blocked": BroadcastCampaign.blocked + counts[BLOCKED],
+            "leased_until": func.now() + timedelta(seconds=LEASE_TIMEOUT)
+        }
+        if last_user_id is not None:
+            values["last_user_id"] = last_user_id
+        if finished and not self._window:
+            values["status"] = DONE
+            values["finished_at"] = func.now()
+        if release:
+            values["leased_by"] = None
+            values["leased_until"] = None
+
+        async with get_db_session() as db:
+            if blocked:
+                await db.execute(update(User).where(User.id.in_(blocked)).values(is_subscribed=False))
+            status = await db.scalar(
+                update(BroadcastCampaign)
+                .where(BroadcastCampaign.id == self.campaign_id, BroadcastCampaign.leased_by == self.token)
+                .values(**values)
+                .returning(BroadcastCampaign.status)
+            )
+            if status is None:
+                # Аренда истекла и кампанию взял другой процесс: его контрольная точка главнее
+                await db.rollback()
+                logger.warning(f"Кампания #{self.campaign_id} потеряла аренду, отправка остановлена")
+                self.stopping = True
+                return
+            await db.commit()
+        if status != RUNNING:
+            # Кампанию приостановили, возможно, из другого процесса
+            self.stopping = True
+
+    async def run(self):
+        """Отправить кампанию с контрольной точки до конца или до остановки"""
+        claimed = await self._claim()
+        if claimed is None:
+            logger.info(f"Кампания #{self.campaign_id} не отправляется: она не запущена или ее отправляет другой процесс")
+            return
+        text, after = claimed
+        logger.info(f"Рассылка кампании #{self.campaign_id} с пользователя {after}")
+
+        tasks = set()
+        finished = False
+        try:
+            while not self.stopping:
+                users = await self._recipients(after)
+                if not users:
+                    finished = True
+                    break
+                for user_id, telegram_id in users:
+                    if self.stopping:
+                        break
+                    await self.broadcaster.slots.acquire()
+                    self._window.append(user_id)
+                    task = asyncio.create_task(self._deliver(user_id, telegram_id, text))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                    # Слот освобождается и у задачи, отмененной до начала отправки
+                    task.add_done_callback(lambda _: self.broadcaster.slots.release())
+                    if self._since_checkpoint >= CHECKPOINT_EVERY:
+                        await self._checkpoint()
+                after = users[-1][0]
+            await asyncio.gather(*tasks)
+        finally:
+            # При отмене неподтвержденные отправки повторятся после перезапуска
+            for task in tasks:
+                task.cancel()
+            await self._checkpoint(finished, release=True)
+        logger.info(f"Рассылка кампании #{self.campaign_id} {'завершена' if finished else 'остановлена'}")
+
+
+class Broadcaster:
+    """Кампании рассылки процесса с общим лимитом сообщений бота"""
+
+    def __init__(self):
+        self.rate = float(os.getenv('TELEGRAM_BROADCAST_RATE', 25))
+        self.concurrency = int(os.getenv('TELEGRAM_BROADCAST_CONCURRENCY', 16))
+        self.bucket = TokenBucket(self.rate, max(1, int(self.rate)))
+        self.slots = asyncio.Semaphore(self.concurrency)
+        self.bot = None
+        self._started = False
+        self._runs: Dict[int, BroadcastRun] = {}
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self.sent = 0
+        self.failed = 0
+        self.blocked = 0
+        self.retry_after = 0
+
+    def is_available(self) -> bool:
+        """Есть ли чем отправлять: токен бота и python-telegram-bot"""
+        return self.bot is not None or bool(Bot and get_telegram_sender().bot_token)
+
+    async def _open(self):
+        if self.bot is None:
+            self.bot = Bot(
+                token=get_telegram_sender().bot_token,
+                request=HTTPXRequest(connection_pool_size=self.concurrency)
+            )
+        if not self._started:
+            await self.bot.initialize()
+            self._started = True
+
+    async def send(self, chat_id: str, text: str) -> str:
+        """Отправить сообщение в общем лимите рассылки; результат SENT, FAILED или BLOCKED"""
+        while True:
+            delay = self.bucket.delay()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            self.bucket.take()
+            try:
+                await asyncio.wait_for(
+                    self.bot.send_message(chat_id=chat_id, text=text, parse_mode='HTML'),
+                    timeout=SEND_TIMEOUT
+                )
+            except RetryAfter as e:
+                # Лимит бота общий: ждут все отправки, это сообщение повторяется
+                seconds = _seconds(e.retry_after)
+                logger.warning(f"⏳ Telegram ограничил рассылку: повтор через {seconds:g} с")
+                self.retry_after += 1
+                self.bucket.pause(seconds)
+                continue
+            except Forbidden:
+                self.blocked += 1
+                return BLOCKED
+            except Exception as e:
+                logger.warning(f"Сообщение рассылки пользователю {chat_id} не отправлено: {e}")
+                self.failed += 1
+                return FAILED
+            self.sent += 1
+            return SENT
+
+    async def start(self, campaign_id: int) -> bool:
+        """Запустить отправку кампании в фоне; False - бот не настроен"""
+        task = self._tasks.get(campaign_id)
+        if task is not None:
+            if not self._runs[campaign_id].stopping:
+                return True
+            # Кампанию возобновили, пока приостановленная дописывала текущие отправки
+            await asyncio.wait([task])
+        if not self.is_available():
+            logger.warning(f"Рассылка не запущена: {get_telegram_sender().get_initialization_error()}")
+            return False
+        await self._open()
+        run = self._runs[campaign_id] = BroadcastRun(self, campaign_id)
+        self._tasks[campaign_id] = asyncio.create_task(self._run(run))
+        return True
+
+    async def _run(self, run: BroadcastRun):
+        try:
+            await run.run()
+        except Exception as e:
+            # Кампания продолжится с контрольной точки при следующем старте
+            logger.error(f"Ошибка рассылки кампании #{run.campaign_id}: {e}")
+        finally:
+            if self._runs.get(run.campaign_id) is run:
+                del self._runs[run.campaign_id]
+                del self._tasks[run.campaign_id]
+
+    def pause(self, campaign_id: int):
+        """Остановить кампанию после текущих отправок (статус меняет вызывающий)"""
+        run = self._runs.get(campaign_id)
+        if run is not None:
+            run.stopping = True
+
+    async def resume(self):
+        """Продолжить незавершенные кампании (вызывается при старте приложения)"""
+        try:
+            async with get_db_session() as db:
+                ids = (await db.scalars(
+                    select(BroadcastCampaign.id).where(BroadcastCampaign.status == RUNNING)
+                )).all()
+            for campaign_id in ids:
+                await self.start(campaign_id)
+        except Exception as e:
+            logger.error(f"Не удалось продолжить кампании рассылки: {e}")
+
+    def stats(self, campaign_id: Optional[int] = None) -> Dict[str, Any]:
+        """Счетчики рассылки процесса или отправка одной кампании"""
+        if campaign_id is not None:
+            run = self._runs.get(campaign_id)
+            return {"running": run is not None, **(run.stats() if run else {})}
+        return {
+            "campaigns": list(self._runs),
+            "available": self.bucket.available(),
+            "sent": self.sent,
+            "failed": self.failed,
+            "blocked": self.blocked,
+            "retry_after": self.retry_after
+        }
+
+    async def stop(self):
+        """Остановить кампании, дождавшись текущих отправок (не дольше SHUTDOWN_TIMEOUT), и закрыть соединения"""
+        for run in self._runs.values():
+            run.stopping = True
+        tasks = list(self._tasks.values())
+        if tasks:
+            done, pending = await asyncio.wait(tasks, timeout=SHUTDOWN_TIMEOUT)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        if self._started:
+            self._started = False
+            try:
+                await self.bot.shutdown()
+            except Exception as e:
+                logger.warning(f"Ошибка закрытия соединения рассылки с Telegram Bot API: {e}")
+
+
+# Глобальная рассылка процесса
+broadcaster = Broadcaster()
+
+
+def get_broadcaster() -> Broadcaster:
+    """Получает глобальную рассылку"""
+    return broadcaster
+
+
+async def main(campaign_id: int):
+    """Отправить кампанию отдельным процессом"""
+    if not broadcaster.is_available():
+        logger.error(f"Рассылка не запущена: {get_telegram_sender().get_initialization_error()}")
+        return
+    await broadcaster._open()
+    try:
+        await BroadcastRun(broadcaster, campaign_id).run()
+    finally:
+        await broadcaster.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(int(sys.argv[1])))
@@ -0,0 +1,86 @@
+"""
+Расчет корзины по снимку каталога
+
+Цена каждой позиции берется из снимка (effective_price уже учитывает
+скидки), доступность - из того же снимка: недоступных товаров в нем нет.
+Один и тот же расчет отдает /api/cart/quote и использует create_order_api,
+поэтому проверка цен заказа не требует запросов к базе данных.
+"""
+from typing import Any, Dict, List, Optional
+
+from admin_service.admin.catalog import CatalogSnapshot
+
+# Причины, по которым позиция не может быть заказана
+NOT_AVAILABLE = "not_available"
+OTHER_RESTAURANT = "other_restaurant"
+INVALID_QUANTITY = "invalid_quantity"
+OUT_OF_STOCK = "out_of_stock"
+
+
+def _to_int(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def quote_cart(
+        snapshot: CatalogSnapshot,
+        items: List[Dict[str, Any]],
+        restaurant_id: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Рассчитать корзину по текущим ценам каталога
+
+    Args:
+        snapshot: снимок каталога
+        items: позиции корзины ({"id": ..., "qty": ...}, как в заказе Mini App)
+        restaurant_id: ресторан заказа (товары других ресторанов не принимаются)
+
+    Returns:
+        dict: позиции с ценами и суммами, недоступные позиции, итог
+    """
+    lines = []
+    unavailable = []
+    total = 0.0
+
+    for item in items:
+        product_id = _to_int(item.get("id"))
+        quantity = _to_int(item.get("qty", 1))
+
+        product = snapshot.products_by_id.get(product_id)
+        if product is None:
+            unavailable.append({"id": item.get("id"), "reason": NOT_AVAILABLE})
+            continue
+        if quantity is None or quantity < 1:
+            unavailable.append({"id": product_id, "reason": INVALID_QUANTITY})
+            continue
+        if restaurant_id is not None and product["restaurant_id"] not in (None, restaurant_id):
+            unavailable.append({"id": product_id, "reason": OTHER_RESTAURANT})
+            continue
+        # Кеш сбрасывается, только когда товар закончился или снова появился, поэтому
+        # остаток в снимке может отличаться от фактического в обе стороны. Здесь
+        # отклоняется только закончившийся товар, количество проверяет reserve_stock
+        if product["stock"] is not None and product["stock"] <= 0:
+            unavailable.append({"id": product_id, "reason": OUT_OF_STOCK})
+            continue
+
+        price = product["effective_price"]
+        amount = round(price * quantity, 2)
+        total += amount
+        lines.append({
+            "id": product_id,
+            "name": product["name"],
+            "qty": quantity,
+            "price": price,
+            "base_price": product["price"],
+            "discount_id": product["discount_id"],
+            "sum": amount
+        })
+
+    return {
+        "items": lines,
+        "unavailable": unavailable,
+        "total": round(total, 2),
+        "catalog_version": snapshot.version
+    }
@@ -0,0 +1,431 @@
+"""
+Кеш каталога для API Mini App
+
+Рестораны, категории и доступные товары собираются в неизменяемый снимок,
+который отдается эндпоинтами /api/* без обращения к базе данных.
+Снимок перестраивается только после invalidate(), который роутеры админки
+вызывают после коммита изменений каталога.
+
+Цены товаров в снимке уже учитывают скидки (effective_price, см. pricing.py)
+на момент сборки. На границах действия скидок снимок пересобирает
+DiscountScheduler (discount_scheduler.py), сами чтения время не проверяют.
+
+Каждый ответ хранится уже сериализованным в JSON (плюс gzip и brotli
+варианты) вместе со строгим ETag, поэтому повторные запросы с If-None-Match
+получают 304 без сериализации и без обращения к базе данных.
+
+Кеш живет в памяти процесса: при запуске нескольких воркеров uvicorn
+каждый из них держит свой снимок и инвалидируется только своими запросами.
+"""
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+try:
+    import brotli
+except ImportError:
+    brotli = None  # brotli не установлен, отдаем только gzip
+
+from admin_service.admin.pricing import DiscountIndex
+from admin_service.admin.search import ProductSearchIndex
+from shared.database import get_db_session
+from shared.models import Restaurant, Category, Product, Discount
+
+logger = logging.getLogger(__name__)
+
+# Пауза между попытками перестроения после ошибки базы: пока она не
+# истекла, запросы сразу получают предыдущий снимок
+REBUILD_BACKOFF = 5.0
+
+
+class CatalogPayload:
+    """Готовое тело ответа: JSON в байтах, сжатые варианты и ETag"""
+
+    def __init__(self, document: Dict[str, Any]):
+        self.body = json.dumps(document, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.gzip_body = gzip.compress(self.body, compresslevel=6, mtime=0)
+        self.brotli_body = brotli.compress(self.body, quality=9) if brotli else None
+
+        # ETag зависит только от содержимого, поэтому не меняется после рестарта
+        digest = hashlib.sha256(self.body).hexdigest()[:32]
+        self.etag = f'"{digest}"'
+        self.gzip_etag = f'"{digest}-gz"'
+        self.brotli_etag = f'"{digest}-br"'
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """Проверить заголовок If-None-Match против любого варианта тела"""
+        if not if_none_match:
+            return False
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag.startswith("W/"):
+                tag = tag[2:]
+            if tag in ("*", self.etag, self.gzip_etag, self.brotli_etag):
+                return True
+        return False
+
+
+class CatalogSnapshot:
+    """Снимок каталога, собранный за одно чтение из базы данных"""
+
+    def __init__(
+            self,
+            version: int,
+            restaurants: List[Dict[str, Any]],
+            categories: List[Dict[str, Any]],
+            products: List[Dict[str, Any]]
+    ):
+        self.version = version
+        self.restaurants = restaurants
+        self.categories = categories
+        self.products = products
+
+        self.restaurants_payload = CatalogPayload({"restaurants": restaurants})
+        self.categories_payload = CatalogPayload({"categories": categories})
+        self.products_payload = CatalogPayload({"products": products})
+
+        self.restaurants_by_id = {r["id"]: r for r in restaurants}
+        self.restaurant_ids = set(self.restaurants_by_id)
+        self.products_by_id = {p["id"]: p for p in products}
+
+        # Индексы по ресторану, чтобы меню одной точки не требовало обхода всего каталога
+        self.categories_by_restaurant: Dict[Optional[int], List[Dict[str, Any]]] = {}
+        for category in categories:
+            self.categories_by_restaurant.setdefault(category["restaurant_id"], []).append(category)
+        self.products_by_restaurant: Dict[Optional[int], List[Dict[str, Any]]] = {}
+        for product in products:
+            self.products_by_restaurant.setdefault(product["restaurant_id"], []).append(product)
+
+        self._bootstrap_payloads: Dict[Optional[int], CatalogPayload] = {}
+        self._menu_payloads: Dict[tuple, CatalogPayload] = {}
+        self._search_index: Optional[ProductSearchIndex] = None
+
+    def bootstrap_payload(self, restaurant_id: Optional[int] = None) -> CatalogPayload:
+        """
+        Компактный документ для старта Mini App (собирается один раз на снимок)
+
+        Args:
+            restaurant_id: ограничить категории и товары одним рестораном
+
+        Returns:
+            CatalogPayload: рестораны, категории и товары одним ответом
+        """
+        payload = self._bootstrap_payloads.get(restaurant_id)
+        if payload is None:
+            categories = self.categories
+            products = self.products
+            if restaurant_id is not None:
+                categories = self.categories_by_restaurant.get(restaurant_id, [])
+                products = self.products_by_restaurant.get(restaurant_id, [])
+            payload = CatalogPayload({
+                "restaurants": self.restaurants,
+                "categories": categories,
+                "products": [_compact_product(p) for p in products]
+            })
+            self._bootstrap_payloads[restaurant_id] = payload
+        return payload
+
+    def menu_payload(self, restaurant_id: int, category_id: Optional[int] = None) -> CatalogPayload:
+        """
+        Меню одного ресторана (собирается один раз на снимок)
+
+        Args:
+            restaurant_id: ID ресторана из restaurant_ids
+            category_id: оставить только товары этой категории
+
+        Returns:
+            CatalogPayload: ресторан, его категории и доступные товары
+        """
+        key = (restaurant_id, category_id)
+        payload = self._menu_payloads.get(key)
+        if payload is None:
+            products = self.products_by_restaurant.get(restaurant_id, [])
+            if category_id is not None:
+                products = [p for p in products if p["category"]["id"] == category_id]
+            payload = CatalogPayload({
+                "restaurant": self.restaurants_by_id[restaurant_id],
+                "categories": self.categories_by_restaurant.get(restaurant_id, []),
+                "products": [_compact_product(p) for p in products]
+            })
+            self._menu_payloads[key] = payload
+        return payload
+
+    def search_products(self, query: str, restaurant_id: Optional[int] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Поиск доступных товаров (индекс строится при первом поиске по снимку)
+
+        Args:
+            query: строка поиска
+            restaurant_id: искать только в меню ресторана
+            limit: максимум результатов
+
+        Returns:
+            list: товары в компактном виде, лучшие совпадения первыми
+        """
+        if self._search_index is None:
+            self._search_index = ProductSearchIndex(self.products)
+        return [_compact_product(p) for p in self._search_index.search(query, restaurant_id, limit)]
+
+    def has_category(self, restaurant_id: int, category_id: int) -> bool:
+        """Проверить, что категория принадлежит ресторану"""
+        return any(c["id"] == category_id for c in self.categories_by_restaurant.get(restaurant_id, []))
+
+
+def _accepted_encodings(accept_encoding: Optional[str]) -> set:
+    """Разобрать Accept-Encoding, отбросив кодировки с q=0"""
+    encodings = set()
+    for part in (accept_encoding or "").split(","):
+        token, _, params = part.strip().partition(";")
+        params = params.replace(" ", "")
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if token:
+            encodings.add(token.lower())
+    return encodings
+
+
+def payload_response(request: Request, payload: CatalogPayload) -> Response:
+    """
+    Отдать готовый payload с учетом If-None-Match и Accept-Encoding
+
+    Args:
+        request: входящий запрос
+        payload: сериализованный ответ из снимка каталога
+
+    Returns:
+        Response: 304 для совпавшего ETag, иначе тело в лучшей доступной кодировке
+    """
+    headers = {
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding"
+    }
+
+    encodings = _accepted_encodings(request.headers.get("accept-encoding"))
+    if payload.brotli_body is not None and "br" in encodings:
+        body, etag = payload.brotli_body, payload.brotli_etag
+        headers["Content-Encoding"] = "br"
+    elif "gzip" in encodings:
+        body, etag = payload.gzip_body, payload.gzip_etag
+        headers["Content-Encoding"] = "gzip"
+    else:
+        body, etag = payload.body, payload.etag
+    headers["ETag"] = etag
+
+    if payload.matches(request.headers.get("if-none-match")):
+        headers.pop("Content-Encoding", None)
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _restaurant_to_api(restaurant: Restaurant) -> Dict[str, Any]:
+    return {
+        "id": restaurant.id,
+        "name": restaurant.name,
+        "address": restaurant.address
+    }
+
+
+def _category_to_api(category: Category) -> Dict[str, Any]:
+    return {
+        "id": category.id,
+        "name": category.name,
+        "restaurant_id": category.restaurant_id
+    }
+
+
+def _product_to_api(product: Product, categories: Dict[int, Category], pricing: DiscountIndex) -> Dict[str, Any]:
+    category = categories.get(product.category_id)
+    effective_price, discount_id = pricing.price(
+        product.id, product.category_id, product.restaurant_id, product.price, product.discount_price
+    )
+    return {
+        "id": product.id,
+        "name": product.name,
+        "description": product.description or "",
+        "price": product.price,
+        "discount_price": product.discount_price,
+        "effective_price": effective_price,
+        "discount_id": discount_id,
+        "size": product.size or "",
+        "photo": product.photo or "",
+        "is_available": product.is_available,
+        "stock": product.stock,
+        "category": {
+            "id": category.id,
+            "name": category.name
+        } if category else {"id": None, "name": "Без категории"},
+        "restaurant_id": product.restaurant_id
+    }
+
+
+def _compact_product(product: Dict[str, Any]) -> Dict[str, Any]:
+    """Товар для bootstrap: категория по id, без дублирования ее имени"""
+    return {
+        "id": product["id"],
+        "name": product["name"],
+        "description": product["description"],
+        "price": product["price"],
+        "discount_price": product["discount_price"],
+        "effective_price": product["effective_price"],
+        "discount_id": product["discount_id"],
+        "size": product["size"],
+        "photo": product["photo"],
+        "stock": product["stock"],
+        "category_id": product["category"]["id"],
+        "restaurant_id": product["restaurant_id"]
+    }
+
+
+async def build_snapshot(db: AsyncSession, version: int, moment: Optional[datetime] = None) -> CatalogSnapshot:
+    """Собрать снимок каталога из базы данных (цены - на момент moment, по умолчанию сейчас)"""
+    # Все чтения идут в одной транзакции REPEATABLE READ, чтобы рестораны,
+    # категории и товары соответствовали одному состоянию базы
+    await db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+
+    result = await db.execute(select(Restaurant).order_by(Restaurant.name))
+    restaurants = result.scalars().all()
+
+    result = await db.execute(select(Category).order_by(Category.id))
+    categories = result.scalars().all()
+
+    result = await db.execute(
+        select(Product).where(Product.is_available.is_(True)).order_by(Product.id)
+    )
+    products = result.scalars().all()
+
+    result = await db.execute(
+        select(Discount).where(Discount.is_active.is_(True), Discount.percent > 0)
+    )
+    pricing = DiscountIndex(result.scalars().all(), moment or datetime.now())
+
+    categories_by_id = {c.id: c for c in categories}
+
+    return CatalogSnapshot(
+        version=version,
+        restaurants=[_restaurant_to_api(r) for r in restaurants],
+        categories=[_category_to_api(c) for c in categories],
+        products=[_product_to_api(p, categories_by_id, pricing) for p in products]
+    )
+
+
+class CatalogCache:
+    """Версионированный кеш снимка каталога"""
+
+    def __init__(self):
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._version = 1
+        self._lock = asyncio.Lock()
+        # Время (time.monotonic), до которого не пытаемся перестроить снимок после ошибки
+        self._retry_at = 0.0
+        self._listeners: List[Callable[[], None]] = []
+
+    @property
+    def version(self) -> int:
+        """Текущая версия каталога"""
+        return self._version
+
+    def subscribe(self, listener: Callable[[], None]):
+        """Подписаться на изменения каталога (listener вызывается синхронно)"""
+        self._listeners.append(listener)
+
+    def _notify(self):
+        for listener in self._listeners:
+            listener()
+
+    def invalidate(self):
+        """Пометить снимок устаревшим (вызывается после коммита изменений каталога)"""
+        self._version += 1
+        logger.info(f"Каталог инвалидирован, новая версия: {self._version}")
+        self._notify()
+
+    def _fresh(self) -> Optional[CatalogSnapshot]:
+        snapshot = self._snapshot
+        if snapshot is not None and (snapshot.version == self._version or time.monotonic() < self._retry_at):
+            return snapshot
+        return None
+
+    async def get_snapshot(self) -> CatalogSnapshot:
+        """
+        Получить актуальный снимок каталога
+
+        Returns:
+            CatalogSnapshot: снимок, перестроенный при необходимости
+        """
+        snapshot = self._fresh()
+        if snapshot is not None:
+            return snapshot
+
+        # Перестраиваем снимок один раз, остальные запросы ждут результата
+        async with self._lock:
+            snapshot = self._fresh()
+            if snapshot is not None:
+                return snapshot
+
+            version = self._version
+            try:
+                async with get_db_session() as db:
+                    snapshot = await build_snapshot(db, version)
+            except Exception as e:
+                if self._snapshot is None:
+                    raise
+                # База недоступна - отдаем предыдущий снимок вместо ошибки и не
+                # повторяем перестроение REBUILD_BACKOFF секунд, чтобы запросы
+                # не стояли в очереди за таймаутами соединения
+                self._retry_at = time.monotonic() + REBUILD_BACKOFF
+                logger.error(f"Ошибка перестроения каталога, используем версию {self._snapshot.version}: {e}")
+                return self._snapshot
+
+            self._snapshot = snapshot
+            self._retry_at = 0.0
+            logger.info(f"Снимок каталога перестроен, версия: {version}")
+            return snapshot
+
+    async def rebuild(self, moment: Optional[datetime] = None):
+        """
+        Собрать новый снимок и подменить опубликованный одной операцией
+
+        В отличие от invalidate(), запросы во время сборки продолжают
+        получать предыдущий снимок, а не ждут перестроения.
+
+        Args:
+            moment: момент времени, на который считаются цены
+        """
+        async with self._lock:
+            start_version = self._version
+            async with get_db_session() as db:
+                snapshot = await build_snapshot(db, start_version + 1, moment)
+
+            if self._version != start_version:
+                # Во время сборки каталог изменили - снимок мог не увидеть изменения,
+                # его соберет первый запрос после invalidate()
+                return
+
+            self._version = snapshot.version
+            self._snapshot = snapshot
+            self._retry_at = 0.0
+            logger.info(f"Снимок каталога опубликован, версия: {snapshot.version}")
+        self._notify()
+
+
+# Глобальный кеш каталога
+catalog_cache = CatalogCache()
+
+
+def get_catalog_cache() -> CatalogCache:
+    """Получает глобальный кеш каталога"""
+    return catalog_cache
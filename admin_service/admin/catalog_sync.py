@@ -0,0 +1,121 @@
+"""
+Дельта-синхронизация каталога по версиям
+
+Товары, категории и скидки получают номер из catalog_version_seq при каждой
+вставке и изменении, удаления оставляют запись в catalog_tombstones.
+
+Курсор синхронизации - не номер версии, а xid транзакции, записавшей ее
+(version_xid). Номер берется при записи, а не при commit: транзакция может
+взять версию 41 и закоммитить ее после транзакции с версией 42, и курсор
+"версия > 42" пропустил бы ее навсегда. Поэтому ответ содержит только
+строки транзакций с xid ниже xmin снимка (самой старой незавершенной
+транзакции): такие транзакции завершены, и строк с xid ниже этой границы
+больше не появится. Граница и есть курсор; строки незавершенных
+транзакций придут в следующей синхронизации.
+"""
+from typing import Any, Dict, List
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shared.models import Product, Category, Discount, CatalogTombstone
+
+
+def _product_to_sync(product: Product) -> Dict[str, Any]:
+    return {
+        "id": product.id,
+        "name": product.name,
+        "description": product.description or "",
+        "price": product.price,
+        "discount_price": product.discount_price,
+        "size": product.size or "",
+        "photo": product.photo or "",
+        "is_available": product.is_available,
+        "stock": product.stock,
+        "category_id": product.category_id,
+        "restaurant_id": product.restaurant_id,
+        "version": product.version
+    }
+
+
+def _category_to_sync(category: Category) -> Dict[str, Any]:
+    return {
+        "id": category.id,
+        "name": category.name,
+        "restaurant_id": category.restaurant_id,
+        "version": category.version
+    }
+
+
+def _discount_to_sync(discount: Discount) -> Dict[str, Any]:
+    return {
+        "id": discount.id,
+        "title": discount.title,
+        "description": discount.description or "",
+        "date_start": discount.date_start.isoformat() if discount.date_start else None,
+        "date_end": discount.date_end.isoformat() if discount.date_end else None,
+        "is_active": discount.is_active,
+        "percent": discount.percent,
+        "category_id": discount.category_id,
+        "product_id": discount.product_id,
+        "restaurant_id": discount.restaurant_id,
+        "version": discount.version
+    }
+
+
+# xid самой старой транзакции, незавершенной на момент снимка
+SNAPSHOT_XMIN = text("pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+
+ENTITIES = (
+    ("products", "product", Product, _product_to_sync),
+    ("categories", "category", Category, _category_to_sync),
+    ("discounts", "discount", Discount, _discount_to_sync),
+)
+
+
+async def get_catalog_changes(db: AsyncSession, since: int) -> Dict[str, Any]:
+    """
+    Собрать изменения каталога после курсора since
+
+    Args:
+        db: сессия базы данных
+        since: курсор (version) из прошлого ответа, 0 - весь каталог
+
+    Returns:
+        dict: курсор следующей синхронизации и по каждой сущности списки upserted/deleted
+    """
+    # Все чтения в одном снимке; граница берется первым запросом, из этого же снимка
+    await db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    watermark = await db.scalar(select(SNAPSHOT_XMIN))
+    if watermark <= since:
+        watermark = since
+
+    changes: Dict[str, Any] = {}
+
+    for key, entity, model, to_sync in ENTITIES:
+        result = await db.execute(
+            select(model)
+            .where(model.version_xid >= since, model.version_xid < watermark)
+            .order_by(model.version)
+        )
+        changes[key] = {"upserted": [to_sync(row) for row in result.scalars()], "deleted": []}
+
+    result = await db.execute(
+        select(CatalogTombstone.entity, CatalogTombstone.entity_id)
+        .where(CatalogTombstone.version_xid >= since, CatalogTombstone.version_xid < watermark)
+        .order_by(CatalogTombstone.version)
+    )
+    keys_by_entity = {entity: key for key, entity, _, _ in ENTITIES}
+    for entity, entity_id in result.all():
+        key = keys_by_entity.get(entity)
+        if key:
+            changes[key]["deleted"].append(entity_id)
+
+    changes["version"] = watermark
+    return changes
+
+
+def record_deletion(db: AsyncSession, entity: str, entity_ids: List[int]):
+    """Записать tombstone для удаленных строк (в той же транзакции, что и удаление)"""
+    for entity_id in entity_ids:
+        db.add(CatalogTombstone(entity=entity, entity_id=entity_id))
@@ -0,0 +1,135 @@
+"""
+Переключение цен на границах действия скидок
+
+Планировщик держит min-heap будущих date_start/date_end активных скидок и
+спит до ближайшей границы. В момент границы он собирает новый снимок
+каталога с ценами на этот момент и подменяет опубликованный
+(CatalogCache.rebuild), поэтому запросы каталога не сравнивают даты скидок
+с текущим временем.
+
+Куча перечитывается из базы после каждого изменения скидок (reschedule()).
+Планировщик работает в каждом процессе uvicorn, как и кеш каталога.
+"""
+import asyncio
+import heapq
+import logging
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import or_, select
+
+from admin_service.admin.catalog import CatalogCache, catalog_cache
+from shared.database import get_db_session
+from shared.models import Discount
+
+logger = logging.getLogger(__name__)
+
+# Максимальный сон между проверками: часы могут быть переведены, пока планировщик спит
+MAX_SLEEP = 60.0
+
+# Пауза перед повтором после ошибки базы данных
+RETRY_DELAY = 5.0
+
+
+class DiscountScheduler:
+    """Планировщик пересборки каталога на границах действия скидок"""
+
+    def __init__(self, cache: CatalogCache):
+        self._cache = cache
+        self._heap: List[datetime] = []
+        self._reload = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Запустить планировщик (вызывается при старте приложения)"""
+        if self._task is None:
+            self._reload.set()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Остановить планировщик"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def reschedule(self):
+        """Перечитать границы скидок (вызывается после коммита изменений скидок)"""
+        self._reload.set()
+
+    @property
+    def next_boundary(self) -> Optional[datetime]:
+        """Ближайшая запланированная граница"""
+        return self._heap[0] if self._heap else None
+
+    async def _load(self):
+        now = datetime.now()
+        async with get_db_session() as db:
+            result = await db.execute(
+                select(Discount.date_start, Discount.date_end).where(
+                    Discount.is_active.is_(True),
+                    Discount.percent > 0,
+                    or_(Discount.date_start > now, Discount.date_end > now)
+                )
+            )
+            rows = result.all()
+
+        boundaries = {moment for row in rows for moment in row if moment and moment > now}
+        self._heap = list(boundaries)
+        heapq.heapify(self._heap)
+        logger.info(f"Границ скидок запланировано: {len(self._heap)}, ближайшая: {self.next_boundary}")
+
+    async def _wait(self, timeout: Optional[float]) -> bool:
+        """Ждать reschedule() не дольше timeout, вернуть True, если он был вызван"""
+        try:
+            await asyncio.wait_for(self._reload.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _run(self):
+        while True:
+            if self._reload.is_set():
+                self._reload.clear()
+                try:
+                    await self._load()
+                except Exception as e:
+                    logger.error(f"Ошибка загрузки границ скидок: {e}")
+                    await asyncio.sleep(RETRY_DELAY)
+                    self._reload.set()
+                    continue
+
+            if not self._heap:
+                await self._wait(None)
+                continue
+
+            delay = (self._heap[0] - datetime.now()).total_seconds()
+            if delay > 0:
+                await self._wait(min(delay, MAX_SLEEP))
+                continue
+
+            # Все границы, которые уже наступили, обрабатываются одной пересборкой
+            moment = heapq.heappop(self._heap)
+            while self._heap and self._heap[0] <= datetime.now():
+                moment = heapq.heappop(self._heap)
+
+            try:
+                await self._cache.rebuild(moment)
+                logger.info(f"Цены пересчитаны на границе скидок {moment}")
+            except Exception as e:
+                logger.error(f"Ошибка пересборки каталога на границе скидок {moment}: {e}")
+                heapq.heappush(self._heap, moment)
+                await asyncio.sleep(RETRY_DELAY)
+
+
+# Глобальный планировщик скидок
+discount_scheduler = DiscountScheduler(catalog_cache)
+
+
+def get_discount_scheduler() -> DiscountScheduler:
+    """Получает глобальный планировщик скидок"""
+    return discount_scheduler
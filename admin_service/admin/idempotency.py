@@ -0,0 +1,210 @@
+"""
+Идемпотентность создания заказов
+
+Mini App отправляет заказ с заголовком Idempotency-Key и повторяет запрос
+с тем же ключом при сбоях сети. Ответ на первый запрос хранится в
+idempotency_keys TTL часов; повтор получает его без обращения к таблицам
+заказов - из памяти процесса или одним SELECT по ключу.
+
+Ключ записывается в транзакции заказа, последним запросом перед commit.
+Если два запроса с одним ключом выполняются одновременно, второй ждет на
+уникальном индексе, получает конфликт, откатывает свой заказ и отдает
+ответ первого.
+
+До лимитера заказов (order_replay) ответ ищется только в памяти процесса:
+частый повтор уже созданного заказа не занимает слот и не получает 429,
+а новые ключи не идут в базу, пока лимитер их не пропустил. SELECT по
+ключу выполняет сам create_order_api, уже заняв слот.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import Header
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from admin_service.admin.order_request import InvalidOrder
+from shared.database import get_db_session
+from shared.models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+# Сколько хранится ответ по ключу
+TTL = timedelta(hours=24)
+
+# Ответов в памяти процесса
+MEMORY_SIZE = 10000
+
+# Интервал удаления просроченных ключей из базы данных
+PURGE_INTERVAL = 3600.0
+
+MAX_KEY_LENGTH = 64
+
+
+def valid_key(key: str) -> bool:
+    """Ключ - непустая строка из печатных ASCII-символов не длиннее MAX_KEY_LENGTH"""
+    return 0 < len(key) <= MAX_KEY_LENGTH and key.isascii() and key.isprintable()
+
+
+class IdempotencyStore:
+    """Ответы по ключам идемпотентности: память процесса поверх таблицы"""
+
+    def __init__(self):
+        # ключ -> (момент истечения по time.monotonic(), ответ)
+        self._memory: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+
+    def remember(self, key: str, response: Dict[str, Any], ttl: float = TTL.total_seconds()):
+        """Запомнить ответ в памяти (вызывается после commit)"""
+        self._memory[key] = (time.monotonic() + ttl, response)
+        self._memory.move_to_end(key)
+        while len(self._memory) > MEMORY_SIZE:
+            self._memory.popitem(last=False)
+
+    def cached(self, key: str) -> Optional[Dict[str, Any]]:
+        """Ответ по ключу из памяти процесса, без обращения к базе данных"""
+        cached = self._memory.get(key)
+        if cached is not None:
+            if cached[0] > time.monotonic():
+                return cached[1]
+            del self._memory[key]
+        return None
+
+    async def lookup(self, db: AsyncSession, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Найти сохраненный ответ по ключу
+
+        Returns:
+            dict: ответ на первый запрос, None - если ключ новый или истек
+        """
+        cached = self.cached(key)
+        if cached is not None:
+            return cached
+
+        result = await db.execute(
+            select(IdempotencyKey.response, func.extract("epoch", IdempotencyKey.expires_at - func.now()))
+            .where(IdempotencyKey.key == key, IdempotencyKey.expires_at > func.now())
+        )
+        row = result.first()
+        if row is None:
+            return None
+        response, ttl = row
+        self.remember(key, response, float(ttl))
+        return response
+
+    def _upsert(self, rows: List[Dict[str, Any]]):
+        stmt = pg_insert(IdempotencyKey).values(rows)
+        # Истекший ключ перезаписывается, действующий остается как есть
+        return stmt.on_conflict_do_update(
+            index_elements=[IdempotencyKey.key],
+            set_={
+                "response": stmt.excluded.response,
+                "created_at": func.now(),
+                "expires_at": stmt.excluded.expires_at
+            },
+            where=IdempotencyKey.expires_at <= func.now()
+        ).returning(IdempotencyKey.key)
+
+    async def save(self, db: AsyncSession, key: str, response: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Записать ответ по ключу в текущей транзакции (без commit)
+
+        Истекший ключ перезаписывается.
+
+        Returns:
+            dict: ответ, уже сохраненный по этому ключу другим запросом
+            (транзакцию нужно откатить), None - если ключ записан
+        """
+        result = await db.execute(self._upsert([{"key": key, "response": response, "expires_at": func.now() + TTL}]))
+        if result.first() is not None:
+            return None
+
+        result = await db.execute(select(IdempotencyKey.response).where(IdempotencyKey.key == key))
+        return result.scalar_one()
+
+    async def save_all(self, db: AsyncSession, responses: Dict[str, Dict[str, Any]]) -> bool:
+        """
+        Записать ответы нескольких заказов одним запросом (без commit)
+
+        Returns:
+            bool: True - записаны все ключи, False - часть ключей уже занята
+            (транзакцию нужно откатить и записывать заказы по одному)
+        """
+        if not responses:
+            return True
+        result = await db.execute(self._upsert([
+            {"key": key, "response": response, "expires_at": func.now() + TTL}
+            for key, response in responses.items()
+        ]))
+        return len(result.all()) == len(responses)
+
+    def start(self):
+        """Запустить удаление просроченных ключей (вызывается при старте приложения)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Остановить удаление просроченных ключей"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def purge(self) -> int:
+        """Удалить просроченные ключи, вернуть их число в базе данных"""
+        now = time.monotonic()
+        for key in [key for key, (expires, _) in self._memory.items() if expires <= now]:
+            del self._memory[key]
+
+        async with get_db_session() as db:
+            result = await db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= func.now()))
+            await db.commit()
+            return result.rowcount
+
+    async def _run(self):
+        while True:
+            try:
+                purged = await self.purge()
+                if purged:
+                    logger.info(f"Удалено просроченных ключей идемпотентности: {purged}")
+            except Exception as e:
+                logger.error(f"Ошибка удаления ключей идемпотентности: {e}")
+            await asyncio.sleep(PURGE_INTERVAL)
+
+
+# Глобальное хранилище ключей идемпотентности
+idempotency_store = IdempotencyStore()
+
+
+def get_idempotency_store() -> IdempotencyStore:
+    """Получает глобальное хранилище ключей идемпотентности"""
+    return idempotency_store
+
+
+async def order_replay(idempotency_key: Optional[str] = Header(None)) -> Optional[Dict[str, Any]]:
+    """
+    Dependency: ответ на уже созданный заказ по заголовку Idempotency-Key
+
+    Выполняется до лимитера и не обращается к базе данных: ответ только из
+    памяти процесса.
+
+    Returns:
+        dict: ответ на первый запрос, None - ключа нет или ответа нет в памяти
+
+    Raises:
+        InvalidOrder: некорректный ключ (422 до занятия слота)
+    """
+    if idempotency_key is None:
+        return None
+    if not valid_key(idempotency_key):
+        raise InvalidOrder("Некорректный Idempotency-Key")
+    return idempotency_store.cached(idempotency_key)
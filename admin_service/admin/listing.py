@@ -0,0 +1,116 @@
+"""
+Выборки для страниц-списков админки без ORM
+
+Таблицы товаров, категорий, скидок и заказов строятся по Core-запросам,
+которые выбирают только выводимые колонки. Строки приходят как Row
+(именованные кортежи): без identity map, без сборки связей joinedload и без
+дедупликации unique(). Имена связанных сущностей подтягиваются outer join
+в плоские колонки (category_name, restaurant_name, user_phone и т.д.).
+"""
+from typing import Optional, Sequence
+
+from sqlalchemy import Row, Select, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shared.models import Product, Category, Discount, Order, User, Restaurant
+
+products = Product.__table__
+categories = Category.__table__
+discounts = Discount.__table__
+orders = Order.__table__
+users = User.__table__
+restaurants = Restaurant.__table__
+
+
+def products_stmt() -> Select:
+    """Товары с именем категории"""
+    return (
+        select(
+            products.c.id,
+            products.c.name,
+            products.c.description,
+            products.c.price,
+            products.c.discount_price,
+            products.c.size,
+            products.c.is_available,
+            categories.c.name.label("category_name")
+        )
+        .select_from(products.outerjoin(categories, categories.c.id == products.c.category_id))
+        .order_by(products.c.id)
+    )
+
+
+def categories_stmt() -> Select:
+    """Категории с именем ресторана"""
+    return (
+        select(
+            categories.c.id,
+            categories.c.name,
+            restaurants.c.name.label("restaurant_name")
+        )
+        .select_from(categories.outerjoin(restaurants, restaurants.c.id == categories.c.restaurant_id))
+        .order_by(categories.c.id)
+    )
+
+
+def discounts_stmt() -> Select:
+    """Скидки (страница не выводит связанные категории и товары)"""
+    return (
+        select(
+            discounts.c.id,
+            discounts.c.title,
+            discounts.c.description,
+            discounts.c.date_start,
+            discounts.c.date_end,
+            discounts.c.is_active,
+            discounts.c.percent
+        )
+        .order_by(discounts.c.id)
+    )
+
+
+def orders_stmt(restaurant_id: Optional[int] = None) -> Select:
+    """Заказы с контактами пользователя и адресом ресторана"""
+    stmt = (
+        select(
+            orders.c.id,
+            orders.c.status,
+            orders.c.total,
+            orders.c.phone,
+            orders.c.created_at,
+            users.c.name.label("user_name"),
+            users.c.phone.label("user_phone"),
+            restaurants.c.name.label("restaurant_name"),
+            restaurants.c.address.label("restaurant_address")
+        )
+        .select_from(
+            orders
+            .outerjoin(users, users.c.id == orders.c.user_id)
+            .outerjoin(restaurants, restaurants.c.id == orders.c.restaurant_id)
+        )
+        .order_by(orders.c.created_at.desc(), orders.c.id.desc())
+    )
+    if restaurant_id:
+        stmt = stmt.where(orders.c.restaurant_id == restaurant_id)
+    return stmt
+
+
+def restaurants_stmt() -> Select:
+    """Рестораны для фильтров"""
+    return select(restaurants.c.id, restaurants.c.name, restaurants.c.address).order_by(restaurants.c.name)
+
+
+async def fetch_rows(db: AsyncSession, stmt: Select) -> Sequence[Row]:
+    """
+    Выполнить Core-запрос на соединении сессии
+
+    Args:
+        db: сессия базы данных
+        stmt: запрос из *_stmt()
+
+    Returns:
+        Sequence[Row]: строки с доступом к колонкам по атрибутам
+    """
+    conn = await db.connection()
+    result = await conn.execute(stmt)
+    return result.all()
@@ -1,11 +1,13 @@
-from fastapi import FastAPI, Request, Depends, HTTPException, status, Form, BackgroundTasks
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import FastAPI, Request, Depends, HTTPException, status, Form, Header
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 import uvicorn
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import Optional
 from starlette.middleware.sessions import SessionMiddleware
 import os
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -17,21 +19,61 @@ from sqlalchemy.orm import joinedload
 if os.path.exists('.env'):
     load_dotenv()
 
-from admin_service.admin.routes import products, orders, discounts, restaurants, categories
+from admin_service.admin.routes import products, orders, discounts, restaurants, categories, notifications, broadcasts
+from admin_service.admin.admission import admit_order, order_limiter, write_limiter
 from admin_service.admin.auth import login_user, logout_user, is_authenticated, require_auth
+from admin_service.admin.broadcast import broadcaster
+from admin_service.admin.cart import quote_cart
+from admin_service.admin.catalog import CatalogSnapshot, catalog_cache, payload_response
+from admin_service.admin.catalog_sync import get_catalog_changes
+from admin_service.admin.discount_scheduler import discount_scheduler
+from admin_service.admin.idempotency import idempotency_store, order_replay
+from admin_service.admin.notification_outbox import outbox_dispatcher
+from admin_service.admin.order_batcher import order_batcher
+from admin_service.admin.order_ingest import OrderRejected, order_committed, write_order
+from admin_service.admin.order_request import InvalidOrder, OrderRequest, parse_order
+from admin_service.admin.static_export import catalog_exporter
+from admin_service.admin.pagination import keyset_page, page_limit, parse_fields
+from admin_service.admin.schemas import ProductOut, json_response, order_list_adapter, product_adapter
 import sys
 import os
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 from shared.database import get_db
+from shared.database.connection import engine
 from shared.models import Order, User, Restaurant, Product, Discount
 from shared.config import settings
 
-from shared.telegram.sender import send_order_to_telegram, get_telegram_sender
-
-import asyncio
-
-app = FastAPI(title="Online Customer Admin", version="1.0.0")
+from shared.telegram.sender import get_telegram_sender
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Фоновые задачи приложения"""
+    discount_scheduler.start()
+    # Одно HTTP-соединение с Bot API на все уведомления процесса
+    await get_telegram_sender().start()
+    outbox_dispatcher.start()
+    # Кампании рассылки, прерванные остановкой, продолжаются с контрольной точки
+    await broadcaster.resume()
+    idempotency_store.start()
+    if order_batcher:
+        order_batcher.start()
+    if catalog_exporter:
+        catalog_exporter.start()
+    yield
+    if catalog_exporter:
+        await catalog_exporter.stop()
+    if order_batcher:
+        await order_batcher.stop()
+    await idempotency_store.stop()
+    await broadcaster.stop()
+    await outbox_dispatcher.stop()
+    await get_telegram_sender().close()
+    await discount_scheduler.stop()
+
+
+app = FastAPI(title="Online Customer Admin", version="1.0.0", lifespan=lifespan)
 
 # Добавляем middleware для сессий
 # Нужен для flash-сообщений и авторизации
@@ -61,6 +103,14 @@ app.include_router(orders.router, prefix="/admin", tags=["orders"])
 app.include_router(discounts.router, prefix="/admin", tags=["discounts"])
 app.include_router(restaurants.router, prefix="/admin", tags=["restaurants"])
 app.include_router(categories.router, prefix="/admin", tags=["categories"])
+app.include_router(notifications.router, prefix="/admin", tags=["notifications"])
+app.include_router(broadcasts.router, prefix="/admin", tags=["broadcasts"])
+
+
+@app.exception_handler(InvalidOrder)
+async def invalid_order_handler(request: Request, exc: InvalidOrder):
+    """Некорректное тело заказа - 422 в формате ошибок create_order_api"""
+    return JSONResponse(status_code=422, content=exc.response())
 
 
 @app.get("/home", response_class=HTMLResponse)
@@ -133,226 +183,195 @@ async def logout(request: Request):
 
 
 # API эндпоинты для Mini App
+# Каталог отдается из снимка в памяти готовыми байтами с ETag, без обращения к базе данных
 @app.get("/api/restaurants")
-async def get_restaurants_api(db: AsyncSession = Depends(get_db)):
+async def get_restaurants_api(request: Request):
     """Получить список всех ресторанов для Mini App"""
-    stmt = select(Restaurant).order_by(Restaurant.name)
-    result = await db.execute(stmt)
-    restaurants = result.scalars().all()
-
-    return {
-        "restaurants": [
-            {
-                "id": r.id,
-                "name": r.name,
-                "address": r.address
-            } for r in restaurants
-        ]
-    }
+    snapshot = await catalog_cache.get_snapshot()
+    return payload_response(request, snapshot.restaurants_payload)
+
+
+# Поля, доступные для выборки через fields=
+PRODUCT_FIELDS = {
+    "id": Product.id,
+    "name": Product.name,
+    "description": Product.description,
+    "price": Product.price,
+    "discount_price": Product.discount_price,
+    "size": Product.size,
+    "photo": Product.photo,
+    "is_available": Product.is_available,
+    "stock": Product.stock,
+    "category_id": Product.category_id,
+    "restaurant_id": Product.restaurant_id,
+}
 
 
 @app.get("/api/products")
-async def get_products_api(db: AsyncSession = Depends(get_db)):
-    """Получить список всех товаров для Mini App"""
-    stmt = select(Product).options(
-        joinedload(Product.category),
-        joinedload(Product.restaurant)
-    )
-    result = await db.execute(stmt)
-    products = result.scalars().unique().all()
-
-    return {
-        "products": [
-            {
-                "id": p.id,
-                "name": p.name,
-                "description": p.description or "",
-                "price": p.price,
-                "discount_price": p.discount_price,
-                "size": p.size or "",
-                "photo": p.photo or "",
-                "is_available": p.is_available,
-                "stock": p.stock,
-                "category": {
-                    "id": p.category.id if p.category else None,
-                    "name": p.category.name if p.category else "Без категории"
-                } if p.category else {"id": None, "name": "Без категории"},
-                "restaurant_id": p.restaurant_id
-            } for p in products if p.is_available
-        ]
-    }
+async def get_products_api(
+        request: Request,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        fields: Optional[str] = None,
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Получить список всех товаров для Mini App
+
+    Без параметров отдается весь каталог из снимка. С limit/cursor/fields
+    товары читаются из базы страницами по id с выбранными полями.
+    """
+    if limit is None and cursor is None and fields is None:
+        snapshot = await catalog_cache.get_snapshot()
+        return payload_response(request, snapshot.products_payload)
+
+    names = parse_fields(fields, PRODUCT_FIELDS, default=list(PRODUCT_FIELDS))
+    stmt = select(*[PRODUCT_FIELDS[name].label(name) for name in names]).where(Product.is_available.is_(True))
+    products, next_cursor = await keyset_page(db, stmt, Product.id, cursor, page_limit(limit))
+    return json_response({"products": products, "next_cursor": next_cursor})
 
 
 @app.get("/api/categories")
-async def get_categories_api(db: AsyncSession = Depends(get_db)):
+async def get_categories_api(request: Request):
     """Получить список всех категорий для Mini App"""
-    from shared.models import Category
-    stmt = select(Category)
-    result = await db.execute(stmt)
-    categories = result.scalars().all()
-
+    snapshot = await catalog_cache.get_snapshot()
+    return payload_response(request, snapshot.categories_payload)
+
+
+@app.get("/api/bootstrap")
+async def get_bootstrap_api(request: Request, restaurant_id: Optional[int] = None):
+    """Рестораны, категории и товары одним ответом для старта Mini App"""
+    snapshot = await catalog_cache.get_snapshot()
+    if restaurant_id is not None and restaurant_id not in snapshot.restaurant_ids:
+        raise HTTPException(status_code=404, detail="Restaurant not found")
+    return payload_response(request, snapshot.bootstrap_payload(restaurant_id))
+
+
+@app.get("/api/restaurants/{restaurant_id}/menu")
+async def get_restaurant_menu_api(request: Request, restaurant_id: int, category_id: Optional[int] = None):
+    """Получить меню одного ресторана (только доступные товары)"""
+    snapshot = await catalog_cache.get_snapshot()
+    if restaurant_id not in snapshot.restaurant_ids:
+        raise HTTPException(status_code=404, detail="Restaurant not found")
+    if category_id is not None and not snapshot.has_category(restaurant_id, category_id):
+        raise HTTPException(status_code=404, detail="Category not found")
+    return payload_response(request, snapshot.menu_payload(restaurant_id, category_id))
+
+
+@app.get("/api/products/search")
+async def search_products_api(
+        q: str,
+        restaurant_id: Optional[int] = None,
+        limit: Optional[int] = None
+):
+    """Поиск доступных товаров по названию и описанию (с опечатками)"""
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Empty search query")
+    snapshot = await catalog_cache.get_snapshot()
+    if restaurant_id is not None and restaurant_id not in snapshot.restaurant_ids:
+        raise HTTPException(status_code=404, detail="Restaurant not found")
+    products = snapshot.search_products(q, restaurant_id, page_limit(limit))
+    return json_response({"products": products})
+
+
+def _cart_restaurant(snapshot: CatalogSnapshot, value) -> Optional[int]:
+    """ID ресторана корзины, если он есть в каталоге"""
+    try:
+        restaurant_id = int(value)
+    except (TypeError, ValueError):
+        return None
+    return restaurant_id if restaurant_id in snapshot.restaurant_ids else None
+
+
+@app.post("/api/cart/quote")
+async def quote_cart_api(cart: dict):
+    """
+    Рассчитать корзину по текущим ценам каталога
+
+    Принимает {"items": [{"id", "qty"}], "restaurant_id"} (или "order", как в
+    заказе) и возвращает цены со скидками, суммы позиций, недоступные товары и
+    итог - тот же расчет, что применяется при создании заказа.
+    """
+    items = cart.get("items", cart.get("order"))
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise HTTPException(status_code=400, detail="items must be a list of objects")
+    snapshot = await catalog_cache.get_snapshot()
+    restaurant_id = _cart_restaurant(snapshot, cart.get("restaurant_id"))
+    if cart.get("restaurant_id") is not None and restaurant_id is None:
+        raise HTTPException(status_code=404, detail="Restaurant not found")
+    return json_response(quote_cart(snapshot, items, restaurant_id))
+
+
+@app.get("/api/admission", dependencies=[Depends(require_auth)])
+async def admission_api():
+    """Загрузка лимитера записи и пула соединений"""
+    pool = engine.pool
     return {
-        "categories": [
-            {
-                "id": c.id,
-                "name": c.name,
-                "restaurant_id": c.restaurant_id
-            } for c in categories
-        ]
+        "write": write_limiter.stats(),
+        "order": order_limiter.stats(),
+        "order_batcher": order_batcher.stats() if order_batcher else None,
+        "pool": {"size": pool.size(), "checked_out": pool.checkedout(), "overflow": pool.overflow()}
     }
 
 
-def send_telegram_notification_sync(telegram_data: dict):
-    """Синхронная обертка для отправки уведомления в Telegram"""
-    import logging
-    logger = logging.getLogger(__name__)
-
-    logger.info(f"🚀 Начинаем отправку уведомления в Telegram для заказа {telegram_data.get('order_id', 'unknown')}")
-
+@app.get("/api/catalog/sync")
+async def sync_catalog_api(since: int = 0, db: AsyncSession = Depends(get_db)):
+    """Изменения товаров, категорий и скидок после версии since"""
+    if since < 0:
+        raise HTTPException(status_code=400, detail="since must be >= 0")
+    return await get_catalog_changes(db, since)
+
+
+# Тело заказа проверяется до лимитера: некорректный заказ не занимает слот
+@app.post("/api/orders", dependencies=[Depends(parse_order), Depends(admit_order)])
+async def create_order_api(
+        order: OrderRequest = Depends(parse_order),
+        replay: Optional[dict] = Depends(order_replay),
+        idempotency_key: Optional[str] = Header(None),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Создать новый заказ из Mini App
+
+    С заголовком Idempotency-Key повтор запроса возвращает ответ на первый,
+    не создавая второй заказ.
+    """
     try:
-        # Создаем новый event loop для фоновой задачи
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(send_order_to_telegram(telegram_data))
-            if result:
-                logger.info(
-                    f"✅ Уведомление в Telegram отправлено успешно для заказа {telegram_data.get('order_id', 'unknown')}")
-            else:
-                logger.warning(
-                    f"⚠️ Не удалось отправить уведомление в Telegram для заказа {telegram_data.get('order_id', 'unknown')}")
-            return result
-        finally:
-            loop.close()
-    except Exception as e:
-        logger.error(f"💥 Критическая ошибка отправки уведомления в Telegram: {e}")
-        return False
-
-
-
-
-@app.post("/api/orders")
-async def create_order_api(order_data: dict, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_db)):
-    """Создать новый заказ из Mini App"""
-    try:
-        # Создаем пользователя если его нет
-        user = None
-        if order_data.get("user"):
-            user_data = order_data["user"]
-            stmt = select(User).where(User.telegram_id == str(user_data.get("id")))
-            result = await db.execute(stmt)
-            user = result.scalar_one_or_none()
-
-            if not user:
-                user = User(
-                    telegram_id=str(user_data.get("id")),
-                    name=f"{user_data.get('first_name', '')} {user_data.get('last_name', '')}".strip(),
-                    phone=order_data.get("phone", "")
-                )
-                db.add(user)
-                await db.flush()
-
-        # Получаем ресторан по переданному ID или первый доступный
-        restaurant = None
-        if order_data.get("restaurant_id"):
-            stmt = select(Restaurant).where(Restaurant.id == order_data["restaurant_id"])
-            result = await db.execute(stmt)
-            restaurant = result.scalar_one_or_none()
-
-        # Если ресторан не найден по ID, берем первый доступный
-        if not restaurant:
-            stmt = select(Restaurant).order_by(Restaurant.id)
-            result = await db.execute(stmt)
-            restaurant = result.scalars().first()
-
-        if not restaurant:
+        # Ответ из памяти найден до лимитера (order_replay), в базе ищем уже со слотом
+        if replay is not None:
+            return replay
+        if idempotency_key is not None:
+            replay = await idempotency_store.lookup(db, idempotency_key)
+            if replay is not None:
+                return replay
+
+        # Цены и доступность - по снимку каталога, без запросов к базе данных
+        items = [{"id": line.id, "qty": line.qty} for line in order.order]
+        snapshot = await catalog_cache.get_snapshot()
+        quote = quote_cart(snapshot, items, _cart_restaurant(snapshot, order.restaurant_id))
+        if quote["unavailable"]:
             return {
                 "status": "error",
-                "message": "Нет доступных ресторанов в системе"
+                "message": "Некоторые товары недоступны для заказа",
+                "unavailable": quote["unavailable"]
             }
+        if order.totalSum is None or abs(order.totalSum - quote["total"]) >= 0.01:
+            print(f"⚠️ Сумма заказа пересчитана: {order.totalSum} -> {quote['total']}")
 
-        # Создаем заказ
-        order = Order(
-            user_id=user.id if user else None,
-            restaurant_id=restaurant.id,  # Используем выбранный или первый доступный ресторан
-            status="new",
-            total=order_data.get("totalSum", 0),
-            phone=order_data.get("phone", "")
-        )
-        db.add(order)
-        await db.flush()
-
-        # Создаем элементы заказа
-        for item in order_data.get("order", []):
-            from shared.models import OrderItem
-            order_item = OrderItem(
-                order_id=order.id,
-                product_id=item.get("id"),
-                quantity=item.get("qty", 1),
-                price=item.get("price", 0)
-            )
-            db.add(order_item)
-
-        await db.commit()
+        if order_batcher is not None:
+            # Соединение запроса больше не нужно: заказ запишет общая транзакция пачки
+            await db.rollback()
+            return await order_batcher.submit(order, quote, idempotency_key)
 
-        # Отправляем уведомление в Telegram
         try:
-            # Получаем полную информацию о товарах из базы данных
-            order_items_with_products = []
-            for item in order_data.get("order", []):
-                # Получаем информацию о товаре из базы данных
-                product_stmt = select(Product).where(Product.id == item.get("id"))
-                product_result = await db.execute(product_stmt)
-                product = product_result.scalar_one_or_none()
-                
-                if product:
-                    order_items_with_products.append({
-                        "id": product.id,
-                        "name": product.name,
-                        "qty": item.get("qty", 1),
-                        "price": item.get("price", 0)
-                    })
-                else:
-                    # Если товар не найден, используем данные из заказа
-                    order_items_with_products.append({
-                        "id": item.get("id"),
-                        "name": item.get("name", "Неизвестный товар"),
-                        "qty": item.get("qty", 1),
-                        "price": item.get("price", 0)
-                    })
-
-            # Подготавливаем данные для отправки в Telegram
-            telegram_data = {
-                "order_id": order.id,
-                "user": order_data.get("user"),
-                "address": order_data.get("address", "Не указан"),
-                "order": order_items_with_products,
-                "totalSum": order_data.get("totalSum", 0),
-                "timestamp": order_data.get("timestamp"),
-                "restaurant_id": restaurant.id
-            }
-
-            # Отправляем уведомление напрямую (как в test_telegram_fix.py)
-            sender = get_telegram_sender()
-            if sender.is_initialized():
-                order_success = await sender.send_order_notification(telegram_data)
-                if order_success:
-                    print(f"✅ Уведомление о заказе #{order.id} отправлено в Telegram")
-                else:
-                    print(f"⚠️ Не удалось отправить уведомление о заказе #{order.id} в Telegram")
-            else:
-                error = sender.get_initialization_error()
-                print(f"❌ Telegram Bot не инициализирован: {error}")
-
-        except Exception as telegram_error:
-            # Логируем ошибку, но не прерываем создание заказа
-            print(f"Ошибка отправки в Telegram: {telegram_error}")
+            response, sold_out = await write_order(db, order, quote, idempotency_key)
+        except OrderRejected as rejected:
+            await db.rollback()
+            return rejected.response
 
-        return {
-            "status": "success",
-            "message": "Заказ успешно создан",
-            "order_id": order.id
-        }
+        await db.commit()
+        order_committed(response, sold_out, idempotency_key)
+        return response
 
     except Exception as e:
         await db.rollback()
@@ -386,26 +405,82 @@ async def test_telegram():
         }
 
 
-@app.get("/products/{product_id}")
+@app.get("/api/telegram/queue")
+async def telegram_queue():
+    """Отправка уведомлений: запросы к Bot API в работе, диспетчер outbox и очереди чатов"""
+    return {
+        **get_telegram_sender().stats(),
+        "dispatcher": outbox_dispatcher.stats()
+    }
+
+
+@app.get("/products/{product_id}", response_model=ProductOut)
 async def get_product(product_id: int, db: AsyncSession = Depends(get_db)):
     """Получить товар по ID"""
     result = await db.execute(select(Product).where(Product.id == product_id))
     product = result.scalar_one_or_none()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    return product
+    return json_response(product, product_adapter)
+
+
+# Поля, доступные для выборки через fields=
+# user_* и restaurant_name подтягиваются join-ом только если запрошены
+ORDER_FIELDS = {
+    "id": Order.id,
+    "user_id": Order.user_id,
+    "restaurant_id": Order.restaurant_id,
+    "status": Order.status,
+    "total": Order.total,
+    "phone": Order.phone,
+    "created_at": Order.created_at,
+    "paid_at": Order.paid_at,
+    "admin_comment": Order.admin_comment,
+    "user_name": User.name,
+    "user_telegram_id": User.telegram_id,
+    "restaurant_name": Restaurant.name,
+}
+ORDER_DEFAULT_FIELDS = [
+    "id", "user_id", "restaurant_id", "status", "total", "phone", "created_at", "paid_at", "admin_comment"
+]
 
 
 @app.get("/api/orders")
-async def get_orders(db: AsyncSession = Depends(get_db)):
-    """Получить список всех заказов"""
-    stmt = select(Order).options(
-        joinedload(Order.user),
-        joinedload(Order.restaurant)
-    ).order_by(Order.created_at.desc())
-    result = await db.execute(stmt)
-    orders = result.scalars().unique().all()
-    return orders
+async def get_orders(
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        fields: Optional[str] = None,
+        restaurant_id: Optional[int] = None,
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Получить заказы, от новых к старым
+
+    Без limit/cursor/fields - прежний ответ: список всех заказов с
+    пользователем и рестораном. С ними - страница {"orders", "next_cursor"}
+    с выбранными полями.
+    """
+    if limit is None and cursor is None and fields is None:
+        stmt = select(Order).options(
+            joinedload(Order.user),
+            joinedload(Order.restaurant)
+        ).order_by(Order.created_at.desc())
+        if restaurant_id is not None:
+            stmt = stmt.where(Order.restaurant_id == restaurant_id)
+        result = await db.execute(stmt)
+        return json_response(result.scalars().unique().all(), order_list_adapter)
+
+    names = parse_fields(fields, ORDER_FIELDS, default=ORDER_DEFAULT_FIELDS)
+    stmt = select(*[ORDER_FIELDS[name].label(name) for name in names]).select_from(Order)
+    if any(name.startswith("user_") and name != "user_id" for name in names):
+        stmt = stmt.outerjoin(User, Order.user_id == User.id)
+    if "restaurant_name" in names:
+        stmt = stmt.outerjoin(Restaurant, Order.restaurant_id == Restaurant.id)
+    if restaurant_id is not None:
+        stmt = stmt.where(Order.restaurant_id == restaurant_id)
+
+    orders, next_cursor = await keyset_page(db, stmt, Order.id, cursor, page_limit(limit), descending=True)
+    return json_response({"orders": orders, "next_cursor": next_cursor})
 
 
 if __name__ == "__main__":
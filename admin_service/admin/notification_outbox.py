@@ -0,0 +1,354 @@
+"""
+Отправка уведомлений о заказах через outbox
+
+create_order_api записывает уведомление в notification_outbox в той же
+транзакции, что и заказ, и не ждет Telegram: время ответа клиенту зависит
+только от Postgres, а записанное уведомление переживает перезапуск.
+
+Диспетчер берет пачку неотправленных записей в аренду: короткая
+транзакция с FOR UPDATE SKIP LOCKED переносит их available_at на
+LEASE_TIMEOUT вперед и сразу коммитится, поэтому несколько процессов
+uvicorn делят очередь без двойной отправки, а ожидание Telegram не держит
+ни транзакцию, ни блокировки строк. После отправки результат каждой
+записи (sent_at, повтор или dead letter) пишется отдельной короткой
+транзакцией. Аренда длиннее QUEUE_TIMEOUT, за который отправка
+гарантированно завершается; если процесс упал, записи вернутся в очередь
+по ее истечении. Пачка отправляется одновременно: очередь
+чата в TelegramSender соблюдает лимит Telegram и при всплеске объединяет
+заказы в сводку. Доставка "хотя бы один раз": при падении между
+отправкой и commit уведомление уйдет повторно.
+
+Неудачная отправка повторяется с экспоненциальной паузой (RETRY_DELAY,
+удваивается до MAX_RETRY_DELAY) и случайным разбросом: после сбоя
+Telegram накопившиеся уведомления возвращаются в очередь постепенно, а не
+все разом. После MAX_ATTEMPTS попыток, или сразу, если повтор не поможет
+(Telegram отклонил сообщение, бот удален из чата), запись переносится в
+notification_dead_letters. Оттуда ее можно вернуть в outbox из админки
+(/admin/api/notifications/dead-letters).
+
+Отправленные записи хранятся SENT_RETENTION (для разбора жалоб), затем
+диспетчер раз в PURGE_INTERVAL удаляет их: в payload данные клиента, а
+таблица не растет с каждым заказом.
+
+Диспетчер - одна долгоживущая задача на процесс: запускается вместе с
+приложением и отправляет все уведомления через одно соединение с Bot API
+(TelegramSender.start). При остановке он дописывает текущую пачку (не
+дольше SHUTDOWN_TIMEOUT), чтобы отправленное не ушло повторно; недописанная
+пачка уйдет снова после истечения аренды. Его можно
+запустить и отдельным процессом: python -m admin_service.admin.notification_outbox
+"""
+import asyncio
+import logging
+import random
+import time
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from admin_service.admin.notification_routing import notification_routing
+from shared.database import get_db_session
+from shared.models import NotificationDeadLetter, NotificationOutbox
+from shared.telegram.sender import QUEUE_TIMEOUT, get_telegram_sender, is_permanent_error
+
+logger = logging.getLogger(__name__)
+
+# Виды уведомлений
+ORDER = "order"
+
+# Записей в одной пачке диспетчера
+BATCH_SIZE = 20
+
+# Аренда пачки: отправка завершается за QUEUE_TIMEOUT, остальное - запас
+LEASE_TIMEOUT = QUEUE_TIMEOUT + 60.0
+
+# Проверка outbox без сигнала (заказы из других процессов)
+POLL_INTERVAL = 5.0
+
+# Сколько ждать завершения текущей пачки при остановке
+SHUTDOWN_TIMEOUT = 10.0
+
+# Пауза перед первой повторной отправкой, удваивается с каждой попыткой
+RETRY_DELAY = 30.0
+MAX_RETRY_DELAY = 3600.0
+
+# Попыток до переноса в notification_dead_letters
+MAX_ATTEMPTS = 10
+
+# Возвращенные из dead letters записи разносятся по этому интервалу
+REPLAY_SPREAD = 60.0
+
+# Длина сохраняемого текста ошибки
+MAX_ERROR_LENGTH = 1000
+
+# Сколько хранятся отправленные уведомления
+SENT_RETENTION = timedelta(days=7)
+
+# Интервал удаления отправленных уведомлений
+PURGE_INTERVAL = 3600.0
+
+
+class UnknownKind(Exception):
+    """Вид уведомления, который диспетчер не умеет отправлять"""
+
+
+def retry_delay(attempts: int) -> float:
+    """Пауза после attempts неудачных попыток: экспонента со случайным разбросом в верхней половине"""
+    delay = min(MAX_RETRY_DELAY, RETRY_DELAY * 2 ** (attempts - 1))
+    return random.uniform(delay / 2, delay)
+
+
+async def enqueue_notification(db: AsyncSession, kind: str, payload: Dict[str, Any]):
+    """Добавить уведомление в outbox (без commit, в транзакции заказа)"""
+    await db.execute(insert(NotificationOutbox).values(kind=kind, payload=payload))
+
+
+async def enqueue_notifications(db: AsyncSession, kind: str, payloads: List[Dict[str, Any]]):
+    """Добавить несколько уведомлений одной вставкой (без commit)"""
+    if payloads:
+        await db.execute(insert(NotificationOutbox), [{"kind": kind, "payload": payload} for payload in payloads])
+
+
+class OutboxDispatcher:
+    """Фоновая отправка уведомлений из outbox"""
+
+    def __init__(self):
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        # Следующее удаление отправленных уведомлений по time.monotonic()
+        self._purge_at = 0.0
+        # Уведомлений текущей пачки, ожидающих ответа Telegram
+        self.in_flight = 0
+        self.sent = 0
+        self.failed = 0
+
+    def start(self):
+        """Запустить диспетчер (вызывается при старте приложения)"""
+        if self._task is not None:
+            return
+        sender = get_telegram_sender()
+        if not sender.is_initialized():
+            # Уведомления копятся в outbox и уйдут после настройки бота
+            logger.warning(f"Диспетчер уведомлений не запущен: {sender.get_initialization_error()}")
+            return
+        self._stopping = False
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Остановить диспетчер, дождавшись текущей пачки (не дольше SHUTDOWN_TIMEOUT)"""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._task, SHUTDOWN_TIMEOUT)
+        except asyncio.TimeoutError:
+            # Пачка останется в аренде и будет отправлена повторно после ее истечения
+            logger.warning(f"Диспетчер уведомлений остановлен с {self.in_flight} неподтвержденными отправками")
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Состояние диспетчера и счетчики"""
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "in_flight": self.in_flight,
+            "sent": self.sent,
+            "failed": self.failed
+        }
+
+    def notify(self):
+        """Разбудить диспетчер (вызывается после commit заказа)"""
+        self._wakeup.set()
+
+    async def _send(self, record: NotificationOutbox) -> Optional[BaseException]:
+        if record.kind == ORDER:
+            chat_id = await notification_routing.chat_for(record.payload.get("restaurant_id"))
+            return await get_telegram_sender().deliver_order_notification(record.payload, chat_id)
+        return UnknownKind(f"Неизвестный вид уведомления: {record.kind}")
+
+    def _failed(self, db: AsyncSession, record: NotificationOutbox, error: BaseException) -> bool:
+        """Записать неудачную попытку; True - запись перенесена в dead letters и ее нужно удалить"""
+        record.attempts += 1
+        record.last_error = (str(error) or type(error).__name__)[:MAX_ERROR_LENGTH]
+
+        if record.attempts < MAX_ATTEMPTS and not is_permanent_error(error) and not isinstance(error, UnknownKind):
+            record.available_at = func.now() + timedelta(seconds=retry_delay(record.attempts))
+            return False
+
+        logger.error(f"Уведомление #{record.id} перенесено в dead letters (попыток: {record.attempts}): "
+                     f"{record.last_error}")
+        db.add(NotificationDeadLetter(
+            kind=record.kind,
+            payload=record.payload,
+            attempts=record.attempts,
+            last_error=record.last_error,
+            created_at=record.created_at
+        ))
+        return True
+
+    async def _lease(self) -> List[NotificationOutbox]:
+        """Взять в аренду пачку готовых к отправке записей (своя короткая транзакция)"""
+        ready = (
+            select(NotificationOutbox.id)
+            .where(NotificationOutbox.sent_at.is_(None), NotificationOutbox.available_at <= func.now())
+            .order_by(NotificationOutbox.id)
+            .limit(BATCH_SIZE)
+            .with_for_update(skip_locked=True)
+        )
+        async with get_db_session() as db:
+            result = await db.scalars(
+                update(NotificationOutbox)
+                .where(NotificationOutbox.id.in_(ready.scalar_subquery()))
+                .values(available_at=func.now() + timedelta(seconds=LEASE_TIMEOUT))
+                .returning(NotificationOutbox),
+                execution_options={"synchronize_session": False}
+            )
+            records = sorted(result.all(), key=lambda record: record.id)
+            await db.commit()
+        return records
+
+    async def drain(self) -> int:
+        """
+        Отправить одну пачку уведомлений
+
+        Returns:
+            int: сколько записей обработано
+        """
+        records = await self._lease()
+        if not records:
+            return 0
+
+        # Вся пачка сразу попадает в очереди чатов ресторанов: чаты отправляют
+        # параллельно, а при нехватке лимита чат объединяет заказы в сводку
+        self.in_flight = len(records)
+        try:
+            results = await asyncio.gather(*(self._send(record) for record in records), return_exceptions=True)
+        finally:
+            self.in_flight = 0
+
+        sent = [record.id for record, error in zip(records, results) if error is None]
+        async with get_db_session() as db:
+            if sent:
+                await db.execute(
+                    update(NotificationOutbox)
+                    .where(NotificationOutbox.id.in_(sent))
+                    .values(sent_at=func.now())
+                )
+            for record, error in zip(records, results):
+                if error is None:
+                    continue
+                self.failed += 1
+                logger.error(f"Ошибка отправки уведомления #{record.id}: {error}")
+                db.add(record)
+                if self._failed(db, record, error):
+                    await db.delete(record)
+            await db.commit()
+        self.sent += len(sent)
+        return len(records)
+
+    async def purge(self) -> int:
+        """Удалить уведомления, отправленные раньше SENT_RETENTION, вернуть их число"""
+        async with get_db_session() as db:
+            result = await db.execute(
+                delete(NotificationOutbox)
+                .where(NotificationOutbox.sent_at < func.now() - SENT_RETENTION)
+            )
+            await db.commit()
+            return result.rowcount
+
+    async def _purge_due(self):
+        if time.monotonic() < self._purge_at:
+            return
+        self._purge_at = time.monotonic() + PURGE_INTERVAL
+        try:
+            purged = await self.purge()
+            if purged:
+                logger.info(f"Удалено отправленных уведомлений: {purged}")
+        except Exception as e:
+            logger.error(f"Ошибка удаления отправленных уведомлений: {e}")
+
+    async def run(self):
+        """Отправлять уведомления до stop()"""
+        while not self._stopping:
+            self._wakeup.clear()
+            await self._purge_due()
+            try:
+                processed = await self.drain()
+            except Exception as e:
+                logger.error(f"Ошибка чтения outbox уведомлений: {e}")
+                processed = 0
+
+            # Полная пачка - в outbox, вероятно, есть еще записи
+            if processed == BATCH_SIZE or self._stopping:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def replay_dead_letters(db: AsyncSession, ids: Optional[List[int]] = None) -> int:
+    """
+    Вернуть уведомления из dead letters в outbox (без commit)
+
+    Попытки начинаются заново; время отправки разносится по REPLAY_SPREAD,
+    чтобы возврат большой пачки не упирался сразу в лимит Telegram.
+
+    Args:
+        db: сессия базы данных
+        ids: id записей dead letters, None - все
+
+    Returns:
+        int: сколько уведомлений возвращено
+    """
+    moved = delete(NotificationDeadLetter)
+    if ids is not None:
+        moved = moved.where(NotificationDeadLetter.id.in_(ids))
+    moved = moved.returning(
+        NotificationDeadLetter.kind,
+        NotificationDeadLetter.payload,
+        NotificationDeadLetter.created_at
+    ).cte("moved")
+
+    result = await db.execute(
+        insert(NotificationOutbox)
+        .from_select(
+            ["kind", "payload", "created_at", "available_at"],
+            select(
+                moved.c.kind,
+                moved.c.payload,
+                moved.c.created_at,
+                func.now() + func.random() * timedelta(seconds=REPLAY_SPREAD)
+            )
+        )
+        .returning(NotificationOutbox.id)
+    )
+    return len(result.all())
+
+
+# Глобальный диспетчер уведомлений
+outbox_dispatcher = OutboxDispatcher()
+
+
+def get_outbox_dispatcher() -> OutboxDispatcher:
+    """Получает глобальный диспетчер уведомлений"""
+    return outbox_dispatcher
+
+
+async def main():
+    """Диспетчер отдельным процессом"""
+    sender = get_telegram_sender()
+    await sender.start()
+    try:
+        await outbox_dispatcher.run()
+    finally:
+        await sender.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+"""
+Маршрутизация уведомлений о заказах по чатам ресторанов
+
+У ресторана может быть свой Telegram-чат кухни (Restaurant.telegram_chat_id);
+заказы ресторанов без чата уходят в общий TELEGRAM_CHAT_ID. Таблица
+ресторан -> чат читается одним запросом и хранится в памяти процесса.
+
+Роутер ресторанов вызывает invalidate() после коммита, как и для кеша
+каталога. Диспетчер, запущенный отдельным процессом, таких вызовов не
+получает, поэтому таблица в любом случае перечитывается раз в ROUTES_TTL.
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import select
+
+from shared.database import get_db_session
+from shared.models import Restaurant
+
+logger = logging.getLogger(__name__)
+
+# Как долго таблица маршрутов считается актуальной без invalidate()
+ROUTES_TTL = 60.0
+
+
+class NotificationRouting:
+    """Таблица ресторан -> чат уведомлений в памяти процесса"""
+
+    def __init__(self):
+        self._routes: Optional[Dict[int, str]] = None
+        self._loaded_at = 0.0
+        self._version = 0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        """Пометить таблицу устаревшей (вызывается после коммита изменений ресторанов)"""
+        self._version += 1
+        self._routes = None
+
+    def _fresh(self) -> Optional[Dict[int, str]]:
+        if self._routes is not None and time.monotonic() - self._loaded_at < ROUTES_TTL:
+            return self._routes
+        return None
+
+    async def routes(self) -> Dict[int, str]:
+        """Чаты ресторанов, у которых он задан"""
+        routes = self._fresh()
+        if routes is not None:
+            return routes
+
+        async with self._lock:
+            routes = self._fresh()
+            if routes is not None:
+                return routes
+            version = self._version
+            async with get_db_session() as db:
+                result = await db.execute(
+                    select(Restaurant.id, Restaurant.telegram_chat_id)
+                    .where(Restaurant.telegram_chat_id.is_not(None))
+                )
+                routes = dict(result.all())
+            # Таблица, прочитанная до invalidate(), не сохраняется
+            if version == self._version:
+                self._routes = routes
+                self._loaded_at = time.monotonic()
+            logger.info(f"Маршруты уведомлений загружены: ресторанов со своим чатом {len(routes)}")
+            return routes
+
+    async def chat_for(self, restaurant_id: Optional[int]) -> Optional[str]:
+        """
+        Чат уведомлений ресторана
+
+        Returns:
+            str: чат ресторана, None - общий чат отправителя
+        """
+        if restaurant_id is None:
+            return None
+        return (await self.routes()).get(restaurant_id)
+
+
+# Глобальная таблица маршрутов уведомлений
+notification_routing = NotificationRouting()
+
+
+def get_notification_routing() -> NotificationRouting:
+    """Получает глобальную таблицу маршрутов уведомлений"""
+    return notification_routing
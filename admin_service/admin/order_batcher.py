@@ -0,0 +1,214 @@
+"""
+Групповая запись заказов (group commit)
+
+В часы открытия и во время акций заказы приходят сотнями за секунды, и
+каждый платит за свой commit и fsync WAL. При ORDER_BATCH_WINDOW_MS > 0
+create_order_api не пишет заказ сам, а ставит его в очередь. Заказы,
+пришедшие в течение окна (но не больше ORDER_BATCH_MAX_SIZE), пишутся
+одной транзакцией с одним commit:
+  - товары всей пачки блокируются заранее в порядке id (lock_products)
+  - пачка пишется write_orders: по одному запросу на шаг для всей пачки
+  - если какому-то заказу нужно отказать (нет остатка, занятый ключ
+    идемпотентности) или запись пачки упала, она откатывается до
+    SAVEPOINT, и заказы пишутся по одному, каждый в своем SAVEPOINT:
+    отказ или ошибка откатывают только его
+  - каждый вызывающий получает свой ответ: order_id или свою ошибку
+
+Пока пачка пишется, следующие заказы копятся в очереди и уходят
+следующей пачкой, поэтому пропускная способность растет с размером
+пачки, а не с числом commit в секунду. Ошибка commit возвращается
+всем заказам пачки.
+
+При остановке заказы текущей пачки и очереди получают ошибку, а не ждут
+ответа до разрыва соединения; клиент повторяет заказ с тем же
+Idempotency-Key и получает order_id, если пачка успела закоммититься.
+"""
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from admin_service.admin.order_ingest import (
+    OrderRejected, order_committed, order_quantities, write_order, write_orders
+)
+from admin_service.admin.order_request import OrderRequest
+from admin_service.admin.stock import lock_products
+from shared.config import settings
+from shared.database import get_db_session
+
+logger = logging.getLogger(__name__)
+
+# (заказ, расчет корзины, ключ идемпотентности, ответ вызывающему)
+Job = Tuple[OrderRequest, Dict[str, Any], Optional[str], asyncio.Future]
+
+
+def _error(e: Exception) -> Dict[str, Any]:
+    return {
+        "status": "error",
+        "message": f"Ошибка создания заказа: {str(e)}"
+    }
+
+
+class OrderBatcher:
+    """Очередь заказов, которые пишутся пачками в одной транзакции"""
+
+    def __init__(self, window: float, max_size: int):
+        """
+        Args:
+            window: сколько секунд собирать пачку после первого заказа
+            max_size: максимум заказов в пачке
+        """
+        self.window = window
+        self.max_size = max_size
+        self._queue: "asyncio.Queue[Job]" = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        # Собираемая или записываемая пачка
+        self._batch: List[Job] = []
+
+        self.batches = 0
+        self.orders = 0
+        self.largest_batch = 0
+        self.fallbacks = 0
+
+    def start(self):
+        """Запустить запись пачек (вызывается при старте приложения)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Остановить запись пачек и ответить ошибкой всем ожидающим заказам"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        jobs = self._batch
+        self._batch = []
+        while not self._queue.empty():
+            jobs.append(self._queue.get_nowait())
+        error = _error(RuntimeError("сервер останавливается, повторите заказ"))
+        for _, _, _, future in jobs:
+            if not future.done():
+                future.set_result(error)
+
+    async def submit(
+            self,
+            order: OrderRequest,
+            quote: Dict[str, Any],
+            idempotency_key: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Поставить заказ в очередь и дождаться записи его пачки
+
+        Returns:
+            dict: ответ клиенту, как у create_order_api
+        """
+        if self._task is None:
+            return _error(RuntimeError("запись заказов остановлена"))
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((order, quote, idempotency_key, future))
+        return await future
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики пачек"""
+        return {
+            "window_ms": self.window * 1000,
+            "max_size": self.max_size,
+            "queued": self._queue.qsize(),
+            "batches": self.batches,
+            "orders": self.orders,
+            "largest_batch": self.largest_batch,
+            "fallbacks": self.fallbacks
+        }
+
+    async def _collect(self) -> List[Job]:
+        batch = self._batch
+        batch.append(await self._queue.get())
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.window
+        while len(batch) < self.max_size:
+            # Накопившееся за время записи предыдущей пачки забираем без ожидания
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _write(self, batch: List[Job]):
+        async with get_db_session() as db:
+            # Иначе списания отдельных заказов брали бы блокировки не по порядку id
+            product_ids = [product_id for _, quote, _, _ in batch for product_id in order_quantities(quote)]
+            await lock_products(db, product_ids)
+
+            savepoint = await db.begin_nested()
+            try:
+                results = await write_orders(db, [job[:3] for job in batch])
+            except Exception as e:
+                logger.warning(f"Пачка из {len(batch)} заказов пишется по одному: {e}")
+                results = None
+            if results is None:
+                await savepoint.rollback()
+                self.fallbacks += 1
+                results = await self._write_each(db, batch)
+            else:
+                await savepoint.commit()
+
+            await db.commit()
+
+        for (_, _, idempotency_key, future), (response, sold_out) in zip(batch, results):
+            if response.get("status") == "success":
+                order_committed(response, sold_out, idempotency_key)
+            if not future.done():
+                future.set_result(response)
+
+    async def _write_each(self, db: AsyncSession, batch: List[Job]) -> List[Tuple[Dict[str, Any], bool]]:
+        results: List[Tuple[Dict[str, Any], bool]] = []
+        for order, quote, idempotency_key, _ in batch:
+            try:
+                async with db.begin_nested():
+                    results.append(await write_order(db, order, quote, idempotency_key))
+            except OrderRejected as rejected:
+                results.append((rejected.response, False))
+            except Exception as e:
+                logger.error(f"Ошибка записи заказа в пачке: {e}")
+                results.append((_error(e), False))
+        return results
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            try:
+                await self._write(batch)
+            except Exception as e:
+                logger.error(f"Ошибка записи пачки из {len(batch)} заказов: {e}")
+                for _, _, _, future in batch:
+                    if not future.done():
+                        future.set_result(_error(e))
+
+            self._batch = []
+            self.batches += 1
+            self.orders += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+
+
+# Глобальная очередь групповой записи заказов (None, если ORDER_BATCH_WINDOW_MS = 0)
+order_batcher = OrderBatcher(
+    settings.ORDER_BATCH_WINDOW_MS / 1000,
+    settings.ORDER_BATCH_MAX_SIZE
+) if settings.ORDER_BATCH_WINDOW_MS > 0 else None
+
+
+def get_order_batcher() -> Optional[OrderBatcher]:
+    """Получает глобальную очередь групповой записи заказов"""
+    return order_batcher
@@ -0,0 +1,339 @@
+"""
+Запись заказа из Mini App фиксированным числом запросов
+
+Независимо от размера корзины заказ записывается тремя запросами:
+  1. upsert пользователя по telegram_id (INSERT ... ON CONFLICT ... RETURNING)
+  2. INSERT заказа из SELECT по ресторанам: выбранный ресторан или первый
+     по id, если выбранного нет
+  3. одна пакетная вставка всех order_items
+
+Цены, сумма и названия товаров берутся из расчета корзины по каталогу
+(admin_service.admin.cart.quote_cart), а не из данных клиента.
+
+write_order добавляет к этому уведомление в outbox, списание остатков и
+ключ идемпотентности - всю запись одного заказа без commit. Ее вызывает
+create_order_api (транзакция на заказ).
+
+write_orders записывает так же пачку заказов OrderBatcher: каждый шаг -
+один запрос на всю пачку, поэтому число запросов не растет с числом
+заказов. Если хоть одному заказу пачки отказано, она возвращает None, и
+OrderBatcher пишет заказы по одному через write_order.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import Boolean, Float, Integer, String, func, insert, literal, or_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from admin_service.admin.cart import OUT_OF_STOCK
+from admin_service.admin.catalog import catalog_cache
+from admin_service.admin.idempotency import idempotency_store
+from admin_service.admin.notification_outbox import ORDER, enqueue_notification, enqueue_notifications, outbox_dispatcher
+from admin_service.admin.order_request import OrderRequest, OrderUser
+from admin_service.admin.stock import reserve_stock
+from shared.models import User, Restaurant, Order, OrderItem
+
+
+class OrderRejected(Exception):
+    """Заказ не записан: транзакцию (или savepoint) нужно откатить и вернуть response"""
+
+    def __init__(self, response: Dict[str, Any]):
+        super().__init__(response.get("message"))
+        self.response = response
+
+
+def _user_row(user: OrderUser, phone: str) -> Dict[str, Any]:
+    return {
+        "telegram_id": str(user.id),
+        "name": f"{user.first_name} {user.last_name}".strip(),
+        "phone": phone
+    }
+
+
+def _order_items(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Позиции заказа для ответа и уведомления"""
+    return [
+        {"id": item["id"], "name": item["name"], "qty": item["qty"], "price": item["price"]}
+        for item in items
+    ]
+
+
+def _item_rows(order_id: int, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [
+        {
+            "order_id": order_id,
+            "product_id": item["id"],
+            "quantity": item["qty"],
+            "price": item["price"]
+        }
+        for item in items
+    ]
+
+
+def _notification(order: OrderRequest, quote: Dict[str, Any], ingested: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "order_id": ingested["order_id"],
+        "user": order.user.model_dump() if order.user else None,
+        "address": order.address,
+        "order": ingested["items"],
+        "totalSum": quote["total"],
+        "timestamp": order.timestamp,
+        "restaurant_id": ingested["restaurant_id"]
+    }
+
+
+def _success(order_id: int, quote: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "status": "success",
+        "message": "Заказ успешно создан",
+        "order_id": order_id,
+        "total": quote["total"]
+    }
+
+
+def _upsert_users(rows: List[Dict[str, Any]]):
+    stmt = pg_insert(User).values(rows)
+    # DO NOTHING не возвращает существующую строку, поэтому обновляем ключ сам на себя
+    return stmt.on_conflict_do_update(
+        index_elements=[User.telegram_id],
+        set_={"telegram_id": stmt.excluded.telegram_id}
+    ).returning(User.id, User.telegram_id)
+
+
+async def upsert_user(db: AsyncSession, user: OrderUser, phone: str) -> int:
+    """
+    Найти или создать пользователя одним запросом
+
+    Существующий пользователь не изменяется, как и раньше.
+
+    Returns:
+        int: ID пользователя
+    """
+    result = await db.execute(_upsert_users([_user_row(user, phone)]))
+    return result.scalar_one()
+
+
+async def ingest_order(
+        db: AsyncSession,
+        order: OrderRequest,
+        quote: Dict[str, Any]
+) -> Optional[Dict[str, Any]]:
+    """
+    Записать заказ, его позиции и пользователя (без commit)
+
+    Args:
+        db: сессия базы данных
+        order: заказ из Mini App
+        quote: расчет корзины по каталогу (quote_cart)
+
+    Returns:
+        dict: order_id, restaurant_id и позиции с названиями товаров,
+        None - если в системе нет ни одного ресторана
+    """
+    phone = order.phone
+    items: List[Dict[str, Any]] = quote["items"]
+
+    user_id = None
+    if order.user is not None:
+        user_id = await upsert_user(db, order.user, phone)
+
+    # Выбранный ресторан, а если его нет - первый по id, одним запросом вместе со вставкой заказа
+    restaurant_id = order.restaurant_id
+    restaurant = select(
+        literal(user_id, Integer),
+        Restaurant.id,
+        literal("new", String),
+        literal(quote["total"], Float),
+        literal(phone, String),
+        # Остатки списываются в той же транзакции (admin_service.admin.stock)
+        literal(bool(items), Boolean)
+    )
+    if restaurant_id is not None:
+        restaurant = restaurant.order_by((Restaurant.id == restaurant_id).desc(), Restaurant.id)
+    else:
+        restaurant = restaurant.order_by(Restaurant.id)
+
+    result = await db.execute(
+        insert(Order)
+        .from_select(["user_id", "restaurant_id", "status", "total", "phone", "stock_reserved"], restaurant.limit(1))
+        .returning(Order.id, Order.restaurant_id)
+    )
+    row = result.first()
+    if row is None:
+        return None
+    order_id, restaurant_id = row
+
+    if items:
+        await db.execute(insert(OrderItem), _item_rows(order_id, items))
+
+    return {"order_id": order_id, "restaurant_id": restaurant_id, "items": _order_items(items)}
+
+
+async def write_order(
+        db: AsyncSession,
+        order: OrderRequest,
+        quote: Dict[str, Any],
+        idempotency_key: Optional[str] = None
+) -> Tuple[Dict[str, Any], bool]:
+    """
+    Записать заказ целиком (без commit)
+
+    Args:
+        db: сессия базы данных
+        order: заказ из Mini App
+        quote: расчет корзины по каталогу (quote_cart)
+        idempotency_key: ключ идемпотентности из заголовка
+
+    Returns:
+        tuple: (ответ клиенту, закончился ли какой-то товар)
+
+    Raises:
+        OrderRejected: нет ресторанов, не хватило остатков или ключ уже занят
+    """
+    # Пользователь, заказ и все позиции - фиксированным числом запросов
+    ingested = await ingest_order(db, order, quote)
+    if ingested is None:
+        raise OrderRejected({
+            "status": "error",
+            "message": "Нет доступных ресторанов в системе"
+        })
+
+    # Уведомление в Telegram записывается в той же транзакции и отправляется диспетчером
+    await enqueue_notification(db, ORDER, _notification(order, quote, ingested))
+
+    # Остатки списываются последними, чтобы строки товаров были заблокированы как можно меньше
+    short, sold_out = await reserve_stock(db, order_quantities(quote))
+    if short:
+        raise OrderRejected({
+            "status": "error",
+            "message": "Недостаточно товара в наличии",
+            "unavailable": [{"id": product_id, "reason": OUT_OF_STOCK} for product_id in short]
+        })
+
+    response = _success(ingested["order_id"], quote)
+    if idempotency_key is not None:
+        # Ключ успел занять параллельный запрос - его заказ и возвращаем
+        original = await idempotency_store.save(db, idempotency_key, response)
+        if original is not None:
+            raise OrderRejected(original)
+
+    return response, sold_out
+
+
+async def write_orders(
+        db: AsyncSession,
+        orders: List[Tuple[OrderRequest, Dict[str, Any], Optional[str]]]
+) -> Optional[List[Tuple[Dict[str, Any], bool]]]:
+    """
+    Записать пачку заказов запросами на всю пачку (без commit)
+
+    Args:
+        db: сессия базы данных
+        orders: (заказ из Mini App, расчет корзины, ключ идемпотентности)
+
+    Returns:
+        list: (ответ клиенту, закончился ли какой-то товар) по каждому заказу,
+        None - если какому-то заказу нужно отказать: записанное нужно
+        откатить (savepoint) и записать заказы по одному через write_order
+    """
+    keys = [key for _, _, key in orders if key is not None]
+    if len(set(keys)) != len(keys):
+        # Повтор ключа внутри пачки должен получить ответ первого заказа
+        return None
+
+    # 1. Пользователи всей пачки одним upsert; в одном запросе ключ не может повторяться
+    users: Dict[str, Dict[str, Any]] = {}
+    for order, _, _ in orders:
+        if order.user is not None:
+            row = _user_row(order.user, order.phone)
+            users.setdefault(row["telegram_id"], row)
+    user_ids: Dict[str, int] = {}
+    if users:
+        result = await db.execute(_upsert_users(list(users.values())))
+        user_ids = {telegram_id: user_id for user_id, telegram_id in result.all()}
+
+    # 2. Выбранные рестораны и первый по id для заказов без существующего ресторана
+    requested = {order.restaurant_id for order, _, _ in orders} - {None}
+    result = await db.execute(
+        select(Restaurant.id).where(or_(
+            Restaurant.id.in_(requested),
+            Restaurant.id == select(func.min(Restaurant.id)).scalar_subquery()
+        ))
+    )
+    restaurant_ids = set(result.scalars().all())
+    if not restaurant_ids:
+        return None
+    fallback = min(restaurant_ids)
+
+    # 3. Заказы одной пакетной вставкой, id - в порядке строк
+    rows = []
+    for order, quote, _ in orders:
+        restaurant_id = order.restaurant_id
+        rows.append({
+            "user_id": user_ids[str(order.user.id)] if order.user is not None else None,
+            "restaurant_id": restaurant_id if restaurant_id in restaurant_ids else fallback,
+            "status": "new",
+            "total": quote["total"],
+            "phone": order.phone,
+            "stock_reserved": bool(quote["items"])
+        })
+    result = await db.execute(insert(Order).returning(Order.id, sort_by_parameter_order=True), rows)
+    order_ids = result.scalars().all()
+
+    # 4. Позиции всех заказов
+    item_rows = [
+        row
+        for order_id, (_, quote, _) in zip(order_ids, orders)
+        for row in _item_rows(order_id, quote["items"])
+    ]
+    if item_rows:
+        await db.execute(insert(OrderItem), item_rows)
+
+    # 5. Уведомления
+    ingested = [
+        {"order_id": order_id, "restaurant_id": row["restaurant_id"], "items": _order_items(quote["items"])}
+        for order_id, row, (_, quote, _) in zip(order_ids, rows, orders)
+    ]
+    await enqueue_notifications(db, ORDER, [
+        _notification(order, quote, written)
+        for written, (order, quote, _) in zip(ingested, orders)
+    ])
+
+    # 6. Остатки всей пачки одним списанием
+    quantities: Dict[int, int] = {}
+    for _, quote, _ in orders:
+        for product_id, qty in order_quantities(quote).items():
+            quantities[product_id] = quantities.get(product_id, 0) + qty
+    short, sold_out = await reserve_stock(db, quantities)
+    if short:
+        return None
+
+    # 7. Ключи идемпотентности
+    responses = [_success(order_id, quote) for order_id, (_, quote, _) in zip(order_ids, orders)]
+    saved = await idempotency_store.save_all(db, {
+        key: response
+        for response, (_, _, key) in zip(responses, orders)
+        if key is not None
+    })
+    if not saved:
+        return None
+
+    return [(response, sold_out) for response in responses]
+
+
+def order_quantities(quote: Dict[str, Any]) -> Dict[int, int]:
+    """Количество по id товара (одна позиция может встречаться в корзине несколько раз)"""
+    quantities: Dict[int, int] = {}
+    for line in quote["items"]:
+        quantities[line["id"]] = quantities.get(line["id"], 0) + line["qty"]
+    return quantities
+
+
+def order_committed(response: Dict[str, Any], sold_out: bool, idempotency_key: Optional[str] = None):
+    """Действия после commit заказа"""
+    if sold_out:
+        # Закончившийся товар должен пропасть из меню
+        catalog_cache.invalidate()
+    if idempotency_key is not None:
+        idempotency_store.remember(idempotency_key, response)
+    outbox_dispatcher.notify()
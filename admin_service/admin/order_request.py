@@ -0,0 +1,103 @@
+"""
+Модель заказа из Mini App и ее проверка
+
+Тело POST /api/orders разбирается pydantic-core прямо из байтов
+(model_validate_json) в зависимости parse_order, которая выполняется до
+лимитера записи и до первого запроса к базе данных. Некорректный JSON,
+неверные типы, пустая или слишком длинная корзина и слишком большое тело
+отклоняются за микросекунды ответом 422 и не занимают ни слот лимитера,
+ни соединение пула.
+
+Типы строгие: id и количество - только целые числа JSON, строки вида "3"
+не принимаются. Лишние поля (название и цена позиции, username и т.п.)
+игнорируются: цены все равно берутся из каталога.
+"""
+from typing import Any, Dict, List, Optional
+
+from fastapi import Request
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+
+# Ограничения размера заказа
+MAX_ORDER_BYTES = 64 * 1024
+MAX_CART_LINES = 100
+MAX_QUANTITY = 999
+MAX_TEXT_LENGTH = 500
+
+# Ошибок валидации в ответе
+MAX_ERRORS = 10
+
+
+class OrderModel(BaseModel):
+    model_config = ConfigDict(strict=True, extra="ignore", str_strip_whitespace=True)
+
+
+class OrderLine(OrderModel):
+    id: int = Field(gt=0)
+    qty: int = Field(1, ge=1, le=MAX_QUANTITY)
+
+
+class OrderUser(OrderModel):
+    id: int = Field(gt=0)
+    first_name: str = Field("", max_length=MAX_TEXT_LENGTH)
+    last_name: str = Field("", max_length=MAX_TEXT_LENGTH)
+    username: str = Field("", max_length=MAX_TEXT_LENGTH)
+
+
+class OrderRequest(OrderModel):
+    order: List[OrderLine] = Field(min_length=1, max_length=MAX_CART_LINES)
+    # Сумма клиента только сверяется с расчетом по каталогу
+    totalSum: Optional[float] = None
+    address: Optional[str] = Field("Не указан", max_length=MAX_TEXT_LENGTH)
+    restaurant_id: Optional[int] = None
+    timestamp: Optional[str] = Field(None, max_length=64)
+    phone: str = Field("", max_length=32)
+    user: Optional[OrderUser] = None
+
+
+class InvalidOrder(Exception):
+    """Тело заказа не прошло проверку"""
+
+    def __init__(self, message: str, errors: Optional[List[Dict[str, Any]]] = None):
+        super().__init__(message)
+        self.message = message
+        self.errors = errors or []
+
+    def response(self) -> Dict[str, Any]:
+        """Ответ клиенту в формате ошибок create_order_api"""
+        content: Dict[str, Any] = {"status": "error", "message": self.message}
+        if self.errors:
+            content["errors"] = self.errors
+        return content
+
+
+def validate_order(body: bytes) -> OrderRequest:
+    """
+    Разобрать и проверить тело заказа
+
+    Raises:
+        InvalidOrder: тело слишком большое, не JSON или не соответствует модели
+    """
+    if len(body) > MAX_ORDER_BYTES:
+        raise InvalidOrder("Слишком большой заказ")
+    try:
+        return OrderRequest.model_validate_json(body)
+    except ValidationError as e:
+        errors = [
+            {"loc": list(error["loc"]), "msg": error["msg"]}
+            for error in e.errors(include_url=False, include_input=False)[:MAX_ERRORS]
+        ]
+        raise InvalidOrder("Некорректный заказ", errors)
+
+
+async def parse_order(request: Request) -> OrderRequest:
+    """Dependency: тело заказа, прочитанное не больше MAX_ORDER_BYTES, или 422"""
+    declared = request.headers.get("content-length")
+    if declared is not None and declared.isdigit() and int(declared) > MAX_ORDER_BYTES:
+        raise InvalidOrder("Слишком большой заказ")
+
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > MAX_ORDER_BYTES:
+            raise InvalidOrder("Слишком большой заказ")
+    return validate_order(bytes(body))
@@ -0,0 +1,116 @@
+"""
+Keyset-пагинация и выборка полей для списочных API
+
+Курсор - непрозрачная строка с ключом сортировки последней строки страницы,
+поэтому следующая страница читается диапазоном по индексу, а не через OFFSET.
+"""
+import base64
+import binascii
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shared.config import settings
+
+
+def encode_cursor(key: Dict[str, Any]) -> str:
+    """Закодировать ключ сортировки последней строки в курсор"""
+    raw = json.dumps(key, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Раскодировать курсор из запроса"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        key = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(key, dict):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return key
+
+
+def page_limit(limit: Optional[int]) -> int:
+    """Размер страницы с учетом API_PAGE_SIZE и потолка API_MAX_PAGE_SIZE"""
+    if limit is None:
+        return settings.API_PAGE_SIZE
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be >= 1")
+    return min(limit, settings.API_MAX_PAGE_SIZE)
+
+
+def parse_fields(fields: Optional[str], allowed: Dict[str, Any], default: List[str]) -> List[str]:
+    """
+    Разобрать параметр fields=id,name,price
+
+    Args:
+        fields: значение параметра из запроса
+        allowed: допустимые поля и соответствующие им колонки
+        default: поля по умолчанию
+
+    Returns:
+        list: имена запрошенных полей без повторов (id всегда первым)
+    """
+    if not fields:
+        return list(default)
+    names = []
+    for name in fields.split(","):
+        name = name.strip()
+        if not name:
+            continue
+        if name not in allowed:
+            raise HTTPException(status_code=400, detail=f"Unknown field: {name}")
+        if name not in names:
+            names.append(name)
+    # id нужен для курсора следующей страницы
+    if "id" in names:
+        names.remove("id")
+    return ["id"] + names
+
+
+async def keyset_page(
+        db: AsyncSession,
+        stmt: Select,
+        key_column: Any,
+        cursor: Optional[str],
+        limit: int,
+        descending: bool = False
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Прочитать одну страницу по ключу key_column
+
+    Args:
+        db: сессия базы данных
+        stmt: select с уже выбранными (помеченными label) колонками, включая id
+        key_column: уникальная индексированная колонка сортировки
+        cursor: курсор из предыдущей страницы
+        limit: размер страницы
+        descending: сортировка по убыванию ключа
+
+    Returns:
+        tuple: строки страницы и курсор следующей страницы (None, если страница последняя)
+    """
+    key = decode_cursor(cursor)
+    if key is not None:
+        last_id = key.get("id")
+        # bool - подкласс int, true в курсоре не ключ
+        if not isinstance(last_id, int) or isinstance(last_id, bool):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        stmt = stmt.where(key_column < last_id if descending else key_column > last_id)
+
+    # Читаем на одну строку больше, чтобы понять, есть ли следующая страница
+    stmt = stmt.order_by(key_column.desc() if descending else key_column.asc()).limit(limit + 1)
+    result = await db.execute(stmt)
+    rows = [dict(row._mapping) for row in result.all()]
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor({"id": rows[-1]["id"]})
+    return rows, next_cursor
@@ -0,0 +1,100 @@
+"""
+Расчет итоговых цен товаров по скидкам
+
+Скидка действует на один товар (product_id), на категорию (category_id)
+или на весь ресторан (только restaurant_id). Индекс собирается вместе со
+снимком каталога на заданный момент времени: для каждого товара, категории
+и ресторана хранится только лучшая действующая скидка, поэтому цена товара
+находится тремя обращениями к словарям без перебора скидок.
+
+Собственная discount_price товара остается в силе: итоговая цена - меньшая
+из discount_price и цены со скидкой из индекса.
+"""
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+# (процент, id скидки)
+Rule = Tuple[float, int]
+
+
+def _in_effect(discount: Any, moment: datetime) -> bool:
+    if discount.date_start and discount.date_start > moment:
+        return False
+    if discount.date_end and discount.date_end <= moment:
+        return False
+    return True
+
+
+def _keep_best(index: Dict[int, Rule], key: int, rule: Rule):
+    current = index.get(key)
+    if current is None or rule[0] > current[0]:
+        index[key] = rule
+
+
+class DiscountIndex:
+    """Лучшая действующая скидка по товару, категории и ресторану"""
+
+    def __init__(self, discounts: Iterable[Any], moment: datetime):
+        """
+        Args:
+            discounts: скидки (ORM-объекты или строки с теми же полями)
+            moment: момент времени, на который считаются цены
+        """
+        self.moment = moment
+        self._by_product: Dict[int, Rule] = {}
+        self._by_category: Dict[int, Rule] = {}
+        self._by_restaurant: Dict[int, Rule] = {}
+
+        for discount in discounts:
+            if not discount.is_active or not discount.percent or discount.percent <= 0:
+                continue
+            if not _in_effect(discount, moment):
+                continue
+
+            rule = (min(discount.percent, 100.0), discount.id)
+            if discount.product_id:
+                _keep_best(self._by_product, discount.product_id, rule)
+            elif discount.category_id:
+                _keep_best(self._by_category, discount.category_id, rule)
+            elif discount.restaurant_id:
+                _keep_best(self._by_restaurant, discount.restaurant_id, rule)
+
+    def best_rule(
+            self,
+            product_id: int,
+            category_id: Optional[int],
+            restaurant_id: Optional[int]
+    ) -> Optional[Rule]:
+        """Найти самую большую скидку, применимую к товару"""
+        best = self._by_product.get(product_id)
+        for index, key in ((self._by_category, category_id), (self._by_restaurant, restaurant_id)):
+            rule = index.get(key) if key is not None else None
+            if rule is not None and (best is None or rule[0] > best[0]):
+                best = rule
+        return best
+
+    def price(
+            self,
+            product_id: int,
+            category_id: Optional[int],
+            restaurant_id: Optional[int],
+            price: float,
+            discount_price: Optional[float] = None
+    ) -> Tuple[float, Optional[int]]:
+        """
+        Итоговая цена товара
+
+        Returns:
+            tuple: (итоговая цена, id примененной скидки или None)
+        """
+        effective, discount_id = price, None
+        if discount_price is not None and 0 <= discount_price < price:
+            effective = discount_price
+
+        rule = self.best_rule(product_id, category_id, restaurant_id)
+        if rule is not None:
+            discounted = round(price * (100.0 - rule[0]) / 100.0, 2)
+            if discounted < effective:
+                effective, discount_id = discounted, rule[1]
+
+        return effective, discount_id
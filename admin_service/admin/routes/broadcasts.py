@@ -0,0 +1,122 @@
+"""
+Рассылки акций подписчикам
+
+Создание, приостановка и возобновление кампаний доступны только после
+входа в админку. Отправкой занимается admin_service.admin.broadcast.
+"""
+from typing import Optional
+
+from fastapi import APIRouter, Body, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shared.database import get_db
+from shared.models import BroadcastCampaign, Discount
+from admin_service.admin.admission import admit_write
+from admin_service.admin.auth import require_auth
+from admin_service.admin.broadcast import PAUSED, RUNNING, broadcaster, discount_message
+from admin_service.admin.pagination import keyset_page, page_limit
+from admin_service.admin.schemas import json_response
+
+router = APIRouter(dependencies=[Depends(require_auth)])
+
+CAMPAIGN_FIELDS = [
+    BroadcastCampaign.id,
+    BroadcastCampaign.discount_id,
+    BroadcastCampaign.message,
+    BroadcastCampaign.status,
+    BroadcastCampaign.last_user_id,
+    BroadcastCampaign.sent,
+    BroadcastCampaign.failed,
+    BroadcastCampaign.blocked,
+    BroadcastCampaign.created_at,
+    BroadcastCampaign.finished_at
+]
+
+
+def check_broadcaster():
+    """Рассылку нельзя запустить без бота"""
+    if not broadcaster.is_available():
+        raise HTTPException(status_code=503, detail="Telegram bot is not configured")
+
+
+async def get_campaign_or_404(db: AsyncSession, campaign_id: int) -> BroadcastCampaign:
+    campaign = await db.get(BroadcastCampaign, campaign_id)
+    if campaign is None:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    return campaign
+
+
+@router.get("/api/broadcasts")
+async def list_campaigns(
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        db: AsyncSession = Depends(get_db)
+):
+    """Кампании страницами, от новых к старым, и счетчики рассылки процесса"""
+    stmt = select(*[column.label(column.key) for column in CAMPAIGN_FIELDS])
+    rows, next_cursor = await keyset_page(
+        db, stmt, BroadcastCampaign.id, cursor, page_limit(limit), descending=True
+    )
+    return json_response({"campaigns": rows, "next_cursor": next_cursor, "broadcaster": broadcaster.stats()})
+
+
+@router.get("/api/broadcasts/{campaign_id}")
+async def get_campaign(campaign_id: int, db: AsyncSession = Depends(get_db)):
+    """Кампания с контрольной точкой и отправкой в этом процессе"""
+    result = await db.execute(
+        select(*[column.label(column.key) for column in CAMPAIGN_FIELDS])
+        .where(BroadcastCampaign.id == campaign_id)
+    )
+    row = result.mappings().first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    return json_response({**row, "run": broadcaster.stats(campaign_id)})
+
+
+@router.post("/api/broadcasts", dependencies=[Depends(admit_write), Depends(check_broadcaster)])
+async def create_campaign(
+        discount_id: Optional[int] = Body(None),
+        text: Optional[str] = Body(None),
+        db: AsyncSession = Depends(get_db)
+):
+    """Разослать подписчикам скидку discount_id или свой HTML-текст text"""
+    if text and text.strip():
+        message = text.strip()
+    elif discount_id is not None:
+        discount = await db.get(Discount, discount_id)
+        if discount is None:
+            raise HTTPException(status_code=404, detail="Discount not found")
+        message = discount_message(discount)
+    else:
+        raise HTTPException(status_code=400, detail="discount_id or text is required")
+
+    campaign = BroadcastCampaign(discount_id=discount_id, message=message, status=RUNNING)
+    db.add(campaign)
+    await db.commit()
+    await broadcaster.start(campaign.id)
+    return {"id": campaign.id, "status": RUNNING}
+
+
+@router.post("/api/broadcasts/{campaign_id}/pause", dependencies=[Depends(admit_write)])
+async def pause_campaign(campaign_id: int, db: AsyncSession = Depends(get_db)):
+    """Приостановить кампанию: отправка остановится после текущих сообщений"""
+    campaign = await get_campaign_or_404(db, campaign_id)
+    if campaign.status != RUNNING:
+        raise HTTPException(status_code=409, detail="Campaign is not running")
+    campaign.status = PAUSED
+    await db.commit()
+    broadcaster.pause(campaign_id)
+    return {"id": campaign_id, "status": PAUSED}
+
+
+@router.post("/api/broadcasts/{campaign_id}/resume", dependencies=[Depends(admit_write), Depends(check_broadcaster)])
+async def resume_campaign(campaign_id: int, db: AsyncSession = Depends(get_db)):
+    """Продолжить приостановленную кампанию с контрольной точки"""
+    campaign = await get_campaign_or_404(db, campaign_id)
+    if campaign.status != PAUSED:
+        raise HTTPException(status_code=409, detail="Campaign is not paused")
+    campaign.status = RUNNING
+    await db.commit()
+    await broadcaster.start(campaign_id)
+    return {"id": campaign_id, "status": RUNNING}
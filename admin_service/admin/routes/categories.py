@@ -5,7 +5,12 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update, delete
 from sqlalchemy.orm import joinedload
 from shared.database import get_db
+from admin_service.admin.admission import admit_write
 from admin_service.admin.auth import is_authenticated
+from admin_service.admin.catalog import catalog_cache
+from admin_service.admin.catalog_sync import record_deletion
+from admin_service.admin.listing import fetch_rows, categories_stmt
+from admin_service.admin.schemas import CategoryOut, json_response, category_adapter
 import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
@@ -28,9 +33,7 @@ async def categories_page(request: Request, db: AsyncSession = Depends(get_db)):
     if not is_authenticated(request):
         return RedirectResponse(url="/admin/login", status_code=302)
     
-    stmt = select(Category).options(joinedload(Category.restaurant))
-    result = await db.execute(stmt)
-    categories = result.scalars().unique().all()
+    categories = await fetch_rows(db, categories_stmt())
     
     flash_message = request.session.pop("flash", None)
     
@@ -91,17 +94,17 @@ async def get_categories(db: AsyncSession = Depends(get_db)):
     return {"categories": [{"id": c.id, "name": c.name, "restaurant": c.restaurant.name} for c in categories]}
 
 
-@router.get("/categories/{category_id}")
+@router.get("/categories/{category_id}", response_model=CategoryOut)
 async def get_category(category_id: int, db: AsyncSession = Depends(get_db)):
     """Получить категорию по ID"""
     result = await db.execute(select(Category).where(Category.id == category_id))
     category = result.scalar_one_or_none()
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
-    return category
+    return json_response(category, category_adapter)
 
 
-@router.post("/categories")
+@router.post("/categories", dependencies=[Depends(admit_write)])
 async def create_category(
         request: Request,
         name: str = Form(...),
@@ -115,13 +118,14 @@ async def create_category(
     )
     db.add(category)
     await db.commit()
+    catalog_cache.invalidate()
     
     request.session["flash"] = "Категория создана успешно!"
     
     return RedirectResponse(url="/admin/categories", status_code=303)
 
 
-@router.post("/categories/{category_id}")
+@router.post("/categories/{category_id}", dependencies=[Depends(admit_write)])
 async def update_category(
         request: Request,
         category_id: int,
@@ -139,13 +143,14 @@ async def update_category(
     category.restaurant_id = restaurant_id
 
     await db.commit()
+    catalog_cache.invalidate()
 
     request.session["flash"] = "Категория успешно обновлена!"
 
     return RedirectResponse(url="/admin/categories", status_code=303)
 
 
-@router.delete("/categories/{category_id}")
+@router.delete("/categories/{category_id}", dependencies=[Depends(admit_write)])
 async def delete_category(category_id: int, db: AsyncSession = Depends(get_db)):
     """Удалить категорию"""
     result = await db.execute(select(Category).where(Category.id == category_id))
@@ -154,5 +159,7 @@ async def delete_category(category_id: int, db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Category not found")
 
     await db.execute(delete(Category).where(Category.id == category_id))
+    record_deletion(db, "category", [category_id])
     await db.commit()
+    catalog_cache.invalidate()
     return {"message": "Категория удалена"}
@@ -6,12 +6,18 @@ from sqlalchemy import select, update, delete
 from sqlalchemy.orm import joinedload
 
 from shared.database import get_db
+from admin_service.admin.admission import admit_write
 from admin_service.admin.auth import is_authenticated
+from admin_service.admin.catalog import catalog_cache
+from admin_service.admin.catalog_sync import record_deletion
+from admin_service.admin.discount_scheduler import discount_scheduler
+from admin_service.admin.listing import fetch_rows, discounts_stmt
+from admin_service.admin.schemas import DiscountOut, DiscountWithRelationsOut, json_response, discount_adapter, discount_list_adapter
 import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
 from shared.models import Discount, Category, Product, Restaurant
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from pathlib import Path
 
@@ -22,8 +28,14 @@ TEMPLATES_DIR = Path(__file__).resolve().parent.parent / "templates"
 templates = Jinja2Templates(directory=TEMPLATES_DIR)
 
 
+def check_percent(percent: Optional[float]):
+    """Проверить размер скидки из формы"""
+    if percent is not None and not 0 < percent <= 100:
+        raise HTTPException(status_code=400, detail="Discount percent must be between 0 and 100")
+
+
 # API роуты
-@router.get("/api/discounts")
+@router.get("/api/discounts", response_model=List[DiscountWithRelationsOut])
 async def get_discounts(db: AsyncSession = Depends(get_db)):
     """Получить список всех скидок"""
     stmt = select(Discount).options(
@@ -32,7 +44,7 @@ async def get_discounts(db: AsyncSession = Depends(get_db)):
     )
     result = await db.execute(stmt)
     discounts = result.scalars().unique().all()
-    return discounts
+    return json_response(discounts, discount_list_adapter)
 
 
 # HTML роуты
@@ -43,12 +55,7 @@ async def discounts_page(request: Request, db: AsyncSession = Depends(get_db)):
     if not is_authenticated(request):
         return RedirectResponse(url="/admin/login", status_code=302)
     
-    stmt = select(Discount).options(
-        joinedload(Discount.category),
-        joinedload(Discount.product)
-    )
-    result = await db.execute(stmt)
-    discounts = result.scalars().unique().all()
+    discounts = await fetch_rows(db, discounts_stmt())
 
     flash_message = request.session.pop("flash", None)
 
@@ -83,24 +90,27 @@ async def new_discount_page(request: Request, db: AsyncSession = Depends(get_db)
     })
 
 
-@router.post("/discounts")
+@router.post("/discounts", dependencies=[Depends(admit_write)])
 async def create_discount(
         request: Request,
         title: str = Form(...),
         description: str = Form(...),
         date_start: Optional[datetime] = Form(None),
         date_end: Optional[datetime] = Form(None),
+        percent: Optional[float] = Form(None),
         category_id: Optional[int] = Form(None),
         product_id: Optional[int] = Form(None),
         restaurant_id: int = Form(...),
         db: AsyncSession = Depends(get_db)
 ):
     """Создать новую скидку"""
+    check_percent(percent)
     discount = Discount(
         title=title,
         description=description,
         date_start=date_start,
         date_end=date_end,
+        percent=percent,
         category_id=category_id,
         product_id=product_id,
         restaurant_id=restaurant_id,
@@ -108,22 +118,24 @@ async def create_discount(
     )
     db.add(discount)
     await db.commit()
+    catalog_cache.invalidate()
+    discount_scheduler.reschedule()
 
     request.session["flash"] = "Скидка создана успешно!"
     return RedirectResponse(url="/admin/discounts", status_code=303)
 
 
-@router.get("/discounts/{discount_id}")
+@router.get("/discounts/{discount_id}", response_model=DiscountOut)
 async def get_discount(discount_id: int, db: AsyncSession = Depends(get_db)):
     """Получить скидку по ID"""
     result = await db.execute(select(Discount).where(Discount.id == discount_id))
     discount = result.scalar_one_or_none()
     if not discount:
         raise HTTPException(status_code=404, detail="Discount not found")
-    return discount
+    return json_response(discount, discount_adapter)
 
 
-@router.put("/discounts/{discount_id}")
+@router.put("/discounts/{discount_id}", dependencies=[Depends(admit_write)])
 async def update_discount(
         request: Request,
         discount_id: int,
@@ -131,11 +143,13 @@ async def update_discount(
         description: str = Form(...),
         date_start: Optional[datetime] = Form(None),
         date_end: Optional[datetime] = Form(None),
+        percent: Optional[float] = Form(None),
         category_id: Optional[int] = Form(None),
         product_id: Optional[int] = Form(None),
         db: AsyncSession = Depends(get_db)
 ):
     """Обновить скидку"""
+    check_percent(percent)
     result = await db.execute(select(Discount).where(Discount.id == discount_id))
     discount = result.scalar_one_or_none()
     if not discount:
@@ -145,16 +159,19 @@ async def update_discount(
     discount.description = description
     discount.date_start = date_start
     discount.date_end = date_end
+    discount.percent = percent
     discount.category_id = category_id
     discount.product_id = product_id
 
     await db.commit()
+    catalog_cache.invalidate()
+    discount_scheduler.reschedule()
     
     request.session["flash"] = "Скидка успешно обновлена!"
     return RedirectResponse(url="/admin/discounts", status_code=303)
 
 
-@router.post("/discounts/{discount_id}/edit")
+@router.post("/discounts/{discount_id}/edit", dependencies=[Depends(admit_write)])
 async def update_discount_form(
         request: Request,
         discount_id: int,
@@ -162,12 +179,14 @@ async def update_discount_form(
         description: str = Form(...),
         date_start: Optional[datetime] = Form(None),
         date_end: Optional[datetime] = Form(None),
+        percent: Optional[float] = Form(None),
         category_id: Optional[int] = Form(None),
         product_id: Optional[int] = Form(None),
         restaurant_id: int = Form(...),
         db: AsyncSession = Depends(get_db)
 ):
     """Обновить скидку через HTML-форму (POST)"""
+    check_percent(percent)
     result = await db.execute(select(Discount).where(Discount.id == discount_id))
     discount = result.scalar_one_or_none()
     if not discount:
@@ -177,15 +196,18 @@ async def update_discount_form(
     discount.description = description
     discount.date_start = date_start if date_start else None
     discount.date_end = date_end if date_end else None
+    discount.percent = percent
     discount.category_id = int(category_id) if category_id not in (None, "") else None
     discount.product_id = int(product_id) if product_id not in (None, "") else None
     discount.restaurant_id = restaurant_id
     await db.commit()
+    catalog_cache.invalidate()
+    discount_scheduler.reschedule()
     request.session["flash"] = "Скидка успешно обновлена!"
     return RedirectResponse(url="/admin/discounts", status_code=303)
 
 
-@router.post("/discounts/{discount_id}/toggle")
+@router.post("/discounts/{discount_id}/toggle", dependencies=[Depends(admit_write)])
 async def toggle_active_status(request: Request, discount_id: int, db: AsyncSession = Depends(get_db)):
     """Активировать/деактивировать скидку"""
     result = await db.execute(select(Discount).where(Discount.id == discount_id))
@@ -193,19 +215,24 @@ async def toggle_active_status(request: Request, discount_id: int, db: AsyncSess
     if not discount:
         raise HTTPException(status_code=404, detail="Discount not found")
     
-    discount.__dict__['is_active'] = not bool(discount.is_active)
+    discount.is_active = not bool(discount.is_active)
     await db.commit()
+    catalog_cache.invalidate()
+    discount_scheduler.reschedule()
     
     status = "активирована" if discount.is_active else "деактивирована"
     request.session["flash"] = f"Скидка '{discount.title}' была успешно {status}."
     return RedirectResponse(url="/admin/discounts", status_code=303)
 
 
-@router.post("/discounts/{discount_id}/delete")
+@router.post("/discounts/{discount_id}/delete", dependencies=[Depends(admit_write)])
 async def delete_discount(request: Request, discount_id: int, db: AsyncSession = Depends(get_db)):
     """Удалить скидку"""
     await db.execute(delete(Discount).where(Discount.id == discount_id))
+    record_deletion(db, "discount", [discount_id])
     await db.commit()
+    catalog_cache.invalidate()
+    discount_scheduler.reschedule()
     
     request.session["flash"] = "Скидка была успешно удалена."
     return RedirectResponse(url="/admin/discounts", status_code=303)
@@ -0,0 +1,65 @@
+"""
+Уведомления, которые не удалось отправить (dead letters)
+
+Просмотр и возврат в outbox доступны только после входа в админку:
+записи содержат данные клиентов.
+"""
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shared.database import get_db
+from shared.models import NotificationDeadLetter
+from admin_service.admin.admission import admit_write
+from admin_service.admin.auth import require_auth
+from admin_service.admin.notification_outbox import outbox_dispatcher, replay_dead_letters
+from admin_service.admin.pagination import keyset_page, page_limit
+from admin_service.admin.schemas import json_response
+
+router = APIRouter(dependencies=[Depends(require_auth)])
+
+DEAD_LETTER_FIELDS = [
+    NotificationDeadLetter.id,
+    NotificationDeadLetter.kind,
+    NotificationDeadLetter.payload,
+    NotificationDeadLetter.attempts,
+    NotificationDeadLetter.last_error,
+    NotificationDeadLetter.created_at,
+    NotificationDeadLetter.failed_at
+]
+
+
+@router.get("/api/notifications/dead-letters")
+async def list_dead_letters(
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        db: AsyncSession = Depends(get_db)
+):
+    """Неотправленные уведомления страницами, от новых к старым"""
+    stmt = select(*[column.label(column.key) for column in DEAD_LETTER_FIELDS])
+    rows, next_cursor = await keyset_page(
+        db, stmt, NotificationDeadLetter.id, cursor, page_limit(limit), descending=True
+    )
+    return json_response({"dead_letters": rows, "next_cursor": next_cursor})
+
+
+@router.post("/api/notifications/dead-letters/replay", dependencies=[Depends(admit_write)])
+async def replay_all_dead_letters(ids: Optional[List[int]] = None, db: AsyncSession = Depends(get_db)):
+    """Вернуть в outbox уведомления с id из тела запроса (без тела - все)"""
+    replayed = await replay_dead_letters(db, ids)
+    await db.commit()
+    outbox_dispatcher.notify()
+    return {"replayed": replayed}
+
+
+@router.post("/api/notifications/dead-letters/{dead_letter_id}/replay", dependencies=[Depends(admit_write)])
+async def replay_dead_letter(dead_letter_id: int, db: AsyncSession = Depends(get_db)):
+    """Вернуть одно уведомление в outbox"""
+    replayed = await replay_dead_letters(db, [dead_letter_id])
+    if not replayed:
+        raise HTTPException(status_code=404, detail="Dead letter not found")
+    await db.commit()
+    outbox_dispatcher.notify()
+    return {"replayed": replayed}
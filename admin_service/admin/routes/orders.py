@@ -6,7 +6,12 @@ from sqlalchemy import select, update
 from sqlalchemy.orm import joinedload
 
 from shared.database import get_db
+from admin_service.admin.admission import admit_write
 from admin_service.admin.auth import is_authenticated
+from admin_service.admin.catalog import catalog_cache
+from admin_service.admin.listing import fetch_rows, orders_stmt, restaurants_stmt
+from admin_service.admin.schemas import OrderOut, OrderWithRelationsOut, json_response, order_adapter, order_list_adapter
+from admin_service.admin.stock import release_stock
 from shared.models import Order, User, OrderItem, Product, Restaurant
 from datetime import datetime
 from typing import List
@@ -32,7 +37,7 @@ templates = Jinja2Templates(directory=TEMPLATES_DIR)
 #     return orders
 
 
-@router.get("/api/recent-orders")
+@router.get("/api/recent-orders", response_model=List[OrderWithRelationsOut])
 async def get_recent_orders(db: AsyncSession = Depends(get_db)):
     """Получить последние 3 заказа"""
     stmt = select(Order).options(
@@ -41,7 +46,7 @@ async def get_recent_orders(db: AsyncSession = Depends(get_db)):
     ).order_by(Order.created_at.desc()).limit(3)
     result = await db.execute(stmt)
     orders = result.scalars().unique().all()
-    return orders
+    return json_response(orders, order_list_adapter)
 
 
 # HTML роуты
@@ -52,16 +57,8 @@ async def orders_page(request: Request, db: AsyncSession = Depends(get_db), rest
     if not is_authenticated(request):
         return RedirectResponse(url="/admin/login", status_code=302)
     
-    query = select(Order).options(
-        joinedload(Order.user),
-        joinedload(Order.restaurant)
-    )
-    if restaurant_id:
-        query = query.where(Order.restaurant_id == restaurant_id)
-    result = await db.execute(query)
-    orders = result.scalars().unique().all()
-    result = await db.execute(select(Restaurant))
-    restaurants = result.scalars().all()
+    orders = await fetch_rows(db, orders_stmt(restaurant_id))
+    restaurants = await fetch_rows(db, restaurants_stmt())
     flash_message = request.session.pop("flash", None)
     return templates.TemplateResponse("orders.html", {
         "request": request,
@@ -97,32 +94,45 @@ async def order_details_page(request: Request, order_id: int, db: AsyncSession =
     })
 
 
-@router.put("/orders/{order_id}/status")
+@router.put("/orders/{order_id}/status", dependencies=[Depends(admit_write)])
 async def update_order_status(
         order_id: int,
         status: str = Form(...),
         db: AsyncSession = Depends(get_db)
 ):
-    """Обновить статус заказа"""
-    result = await db.execute(select(Order).where(Order.id == order_id))
+    """
+    Обновить статус заказа
+
+    Отмена возвращает списанные остатки, оплата и подтверждение превращают
+    резерв в продажу.
+    """
+    result = await db.execute(select(Order).where(Order.id == order_id).with_for_update())
     order = result.scalar_one_or_none()
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
 
+    restocked = False
+    if status == "cancelled":
+        restocked = await release_stock(db, order_id)
+    elif status in ("paid", "confirmed"):
+        order.stock_reserved = False
+
     order.status = status
     if status == "paid":
         order.paid_at = datetime.now()
 
     await db.commit()
+    if restocked:
+        catalog_cache.invalidate()
     return {"message": f"Статус заказа {order_id} обновлен"}
 
 
 # API роуты
-@router.get("/api/orders/{order_id}")
+@router.get("/api/orders/{order_id}", response_model=OrderOut)
 async def get_order_details(order_id: int, db: AsyncSession = Depends(get_db)):
     """Получить заказ по ID (API)"""
     result = await db.execute(select(Order).where(Order.id == order_id))
     order = result.scalar_one_or_none()
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
-    return order
+    return json_response(order, order_adapter)
@@ -5,7 +5,11 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update, delete
 from sqlalchemy.orm import joinedload
 from shared.database import get_db
+from admin_service.admin.admission import admit_write
 from admin_service.admin.auth import is_authenticated
+from admin_service.admin.catalog import catalog_cache
+from admin_service.admin.catalog_sync import record_deletion
+from admin_service.admin.listing import fetch_rows, products_stmt
 import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
@@ -28,9 +32,7 @@ async def products_page(request: Request, db: AsyncSession = Depends(get_db)):
     if not is_authenticated(request):
         return RedirectResponse(url="/admin/login", status_code=302)
     
-    stmt = select(Product).options(joinedload(Product.category))
-    result = await db.execute(stmt)
-    products = result.scalars().unique().all()
+    products = await fetch_rows(db, products_stmt())
     
     flash_message = request.session.pop("flash", None)
     
@@ -106,7 +108,7 @@ async def edit_product_page(request: Request, product_id: int, db: AsyncSession
 #     return product
 
 
-@router.post("/products")
+@router.post("/products", dependencies=[Depends(admit_write)])
 async def create_product(
         request: Request,
         name: str = Form(...),
@@ -134,13 +136,14 @@ async def create_product(
     )
     db.add(product)
     await db.commit()
+    catalog_cache.invalidate()
     
     request.session["flash"] = "Товар создан успешно!"
     
     return RedirectResponse(url="/admin/products", status_code=303)
 
 
-@router.post("/products/{product_id}")
+@router.post("/products/{product_id}", dependencies=[Depends(admit_write)])
 async def update_product(
         request: Request,
         product_id: int,
@@ -172,13 +175,14 @@ async def update_product(
     product.discount_price = discount_price
 
     await db.commit()
+    catalog_cache.invalidate()
 
     request.session["flash"] = "Товар успешно обновлен!"
 
     return RedirectResponse(url="/admin/products", status_code=303)
 
 
-@router.delete("/products/{product_id}")
+@router.delete("/products/{product_id}", dependencies=[Depends(admit_write)])
 async def delete_product(product_id: int, db: AsyncSession = Depends(get_db)):
     """Удалить товар"""
     result = await db.execute(select(Product).where(Product.id == product_id))
@@ -187,5 +191,7 @@ async def delete_product(product_id: int, db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Product not found")
 
     await db.execute(delete(Product).where(Product.id == product_id))
+    record_deletion(db, "product", [product_id])
     await db.commit()
+    catalog_cache.invalidate()
     return {"message": "Товар удален"}
@@ -4,7 +4,10 @@ from fastapi.templating import Jinja2Templates
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, delete, update
 from shared.database import get_db
+from admin_service.admin.admission import admit_write
 from admin_service.admin.auth import is_authenticated
+from admin_service.admin.catalog import catalog_cache
+from admin_service.admin.notification_routing import notification_routing
 import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
@@ -33,15 +36,17 @@ async def new_restaurant_page(request: Request):
     
     return templates.TemplateResponse("restaurant_form.html", {"request": request, "restaurant": None})
 
-@router.post("/restaurants")
-async def create_restaurant(request: Request, name: str = Form(...), address: str = Form(...), db: AsyncSession = Depends(get_db)):
+@router.post("/restaurants", dependencies=[Depends(admit_write)])
+async def create_restaurant(request: Request, name: str = Form(...), address: str = Form(...), telegram_chat_id: str = Form(""), db: AsyncSession = Depends(get_db)):
     # Проверяем авторизацию
     if not is_authenticated(request):
         return RedirectResponse(url="/admin/login", status_code=302)
     
-    restaurant = Restaurant(name=name, address=address)
+    restaurant = Restaurant(name=name, address=address, telegram_chat_id=telegram_chat_id.strip() or None)
     db.add(restaurant)
     await db.commit()
+    catalog_cache.invalidate()
+    notification_routing.invalidate()
     request.session["flash"] = "Ресторан успешно создан!"
     return RedirectResponse(url="/admin/restaurants", status_code=303)
 
@@ -56,8 +61,8 @@ async def edit_restaurant_page(request: Request, restaurant_id: int, db: AsyncSe
         raise HTTPException(status_code=404, detail="Restaurant not found")
     return templates.TemplateResponse("restaurant_form.html", {"request": request, "restaurant": restaurant})
 
-@router.post("/restaurants/{restaurant_id}/edit")
-async def update_restaurant(request: Request, restaurant_id: int, name: str = Form(...), address: str = Form(...), db: AsyncSession = Depends(get_db)):
+@router.post("/restaurants/{restaurant_id}/edit", dependencies=[Depends(admit_write)])
+async def update_restaurant(request: Request, restaurant_id: int, name: str = Form(...), address: str = Form(...), telegram_chat_id: str = Form(""), db: AsyncSession = Depends(get_db)):
     # Проверяем авторизацию
     if not is_authenticated(request):
         return RedirectResponse(url="/admin/login", status_code=302)
@@ -67,11 +72,14 @@ async def update_restaurant(request: Request, restaurant_id: int, name: str = Fo
         raise HTTPException(status_code=404, detail="Restaurant not found")
     restaurant.name = name
     restaurant.address = address
+    restaurant.telegram_chat_id = telegram_chat_id.strip() or None
     await db.commit()
+    catalog_cache.invalidate()
+    notification_routing.invalidate()
     request.session["flash"] = "Ресторан успешно обновлен!"
     return RedirectResponse(url="/admin/restaurants", status_code=303)
 
-@router.post("/restaurants/{restaurant_id}/delete")
+@router.post("/restaurants/{restaurant_id}/delete", dependencies=[Depends(admit_write)])
 async def delete_restaurant(request: Request, restaurant_id: int, db: AsyncSession = Depends(get_db)):
     # Проверяем авторизацию
     if not is_authenticated(request):
@@ -99,6 +107,8 @@ async def delete_restaurant(request: Request, restaurant_id: int, db: AsyncSessi
         await db.execute(delete(Restaurant).where(Restaurant.id == restaurant_id))
         
         await db.commit()
+        catalog_cache.invalidate()
+        notification_routing.invalidate()
         request.session["flash"] = "Ресторан успешно удален! Связанные записи сохранены с пустым полем ресторана."
         
     except Exception as e:
@@ -0,0 +1,117 @@
+"""
+Схемы ответов API и быстрая сериализация в JSON
+
+Эндпоинты, которые раньше возвращали объекты SQLAlchemy, отдают данные
+через явные схемы: ORM-объекты читаются по атрибутам (без обхода __dict__
+и без ленивых загрузок связей) и сериализуются pydantic-core сразу в байты.
+"""
+from datetime import datetime
+from typing import Any, List, Optional
+
+from fastapi.responses import Response
+from pydantic import BaseModel, ConfigDict, TypeAdapter
+from pydantic_core import to_json
+
+
+class ORMModel(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+
+class UserOut(ORMModel):
+    id: int
+    telegram_id: str
+    name: Optional[str] = None
+    phone: Optional[str] = None
+
+
+class RestaurantOut(ORMModel):
+    id: int
+    name: str
+    address: str
+
+
+class CategoryOut(ORMModel):
+    id: int
+    name: str
+    restaurant_id: Optional[int] = None
+    version: int
+
+
+class ProductOut(ORMModel):
+    id: int
+    name: str
+    description: Optional[str] = None
+    category_id: Optional[int] = None
+    restaurant_id: Optional[int] = None
+    price: float
+    discount_price: Optional[float] = None
+    size: Optional[str] = None
+    photo: Optional[str] = None
+    is_available: Optional[bool] = None
+    stock: Optional[int] = None
+    version: int
+
+
+class DiscountOut(ORMModel):
+    id: int
+    title: str
+    description: Optional[str] = None
+    date_start: Optional[datetime] = None
+    date_end: Optional[datetime] = None
+    is_active: Optional[bool] = None
+    percent: Optional[float] = None
+    category_id: Optional[int] = None
+    product_id: Optional[int] = None
+    restaurant_id: Optional[int] = None
+    version: int
+
+
+class DiscountWithRelationsOut(DiscountOut):
+    """Скидка с категорией и товаром (связи должны быть загружены joinedload)"""
+    category: Optional[CategoryOut] = None
+    product: Optional[ProductOut] = None
+
+
+class OrderOut(ORMModel):
+    id: int
+    user_id: Optional[int] = None
+    restaurant_id: Optional[int] = None
+    status: Optional[str] = None
+    total: float
+    phone: Optional[str] = None
+    created_at: Optional[datetime] = None
+    paid_at: Optional[datetime] = None
+    admin_comment: Optional[str] = None
+
+
+class OrderWithRelationsOut(OrderOut):
+    """Заказ с пользователем и рестораном (связи должны быть загружены joinedload)"""
+    user: Optional[UserOut] = None
+    restaurant: Optional[RestaurantOut] = None
+
+
+def json_response(value: Any, adapter: Optional[TypeAdapter] = None) -> Response:
+    """
+    Сериализовать ответ в JSON без jsonable_encoder
+
+    Args:
+        value: ORM-объект(ы) при заданном adapter, иначе dict/list из простых типов
+        adapter: TypeAdapter схемы ответа
+
+    Returns:
+        Response: готовое тело application/json
+    """
+    if adapter is not None:
+        content = adapter.dump_json(adapter.validate_python(value, from_attributes=True))
+    else:
+        content = to_json(value)
+    return Response(content=content, media_type="application/json")
+
+
+# Адаптеры создаются один раз: сборка схемы валидации дорогая
+product_adapter = TypeAdapter(ProductOut)
+category_adapter = TypeAdapter(CategoryOut)
+discount_adapter = TypeAdapter(DiscountOut)
+discount_list_adapter = TypeAdapter(List[DiscountWithRelationsOut])
+order_adapter = TypeAdapter(OrderOut)
+order_list_adapter = TypeAdapter(List[OrderWithRelationsOut])
@@ -0,0 +1,158 @@
+"""
+Поиск товаров по снимку каталога
+
+Инвертированный индекс строится по названию и описанию доступных товаров
+один раз на снимок каталога (то есть заново после каждого invalidate()).
+Словарь слов индексируется триграммами: запрос сопоставляется со словами,
+а не с товарами, поэтому стоимость поиска зависит от размера словаря и
+числа совпадений, а не от размера каталога.
+
+Каждое слово запроса ищется как префикс или подстрока слова товара, при
+длине от 3 символов допускаются опечатки (доля общих триграмм не ниже
+MIN_SIMILARITY). Товар должен совпасть со всеми словами запроса.
+"""
+import bisect
+import heapq
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+# Совпадение в названии важнее совпадения в описании
+NAME_WEIGHT = 2.0
+DESCRIPTION_WEIGHT = 1.0
+
+# Минимальная доля общих триграмм для совпадения с опечаткой
+MIN_SIMILARITY = 0.5
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Разбить текст на слова в нижнем регистре (ё приравнивается к е)"""
+    if not text:
+        return []
+    return _WORD_RE.findall(text.lower().replace("ё", "е"))
+
+
+def _trigrams(word: str) -> set:
+    # Пробел в начале дает отдельную триграмму для начала слова,
+    # поэтому префиксные совпадения получают более высокую оценку
+    padded = " " + word
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ProductSearchIndex:
+    """Инвертированный индекс товаров с триграммным индексом словаря"""
+
+    def __init__(self, products: List[Dict[str, Any]]):
+        # Позиция товара в индексе совпадает с его местом по алфавиту,
+        # поэтому при равной оценке результаты идут по названию
+        self.products = sorted(products, key=lambda p: (p["name"].lower(), p["id"]))
+
+        self._words: List[str] = []
+        # Для каждого слова: позиции товаров, где оно есть в названии,
+        # и позиции, где оно есть только в описании
+        self._name_postings: List[List[int]] = []
+        self._description_postings: List[List[int]] = []
+        self._trigram_words: Dict[str, List[int]] = {}
+        self._restaurant_positions: Dict[Optional[int], set] = {}
+
+        word_ids: Dict[str, int] = {}
+        for position, product in enumerate(self.products):
+            self._restaurant_positions.setdefault(product["restaurant_id"], set()).add(position)
+            name_words = set(tokenize(product["name"]))
+            description_words = set(tokenize(product["description"])) - name_words
+            for words, postings in ((name_words, self._name_postings),
+                                    (description_words, self._description_postings)):
+                for word in words:
+                    word_id = word_ids.get(word)
+                    if word_id is None:
+                        word_id = self._add_word(word)
+                        word_ids[word] = word_id
+                    postings[word_id].append(position)
+
+        # Отсортированный словарь для префиксного поиска коротких слов
+        self._sorted_words = sorted(word_ids)
+        self._word_ids = word_ids
+
+    def _add_word(self, word: str) -> int:
+        word_id = len(self._words)
+        self._words.append(word)
+        self._name_postings.append([])
+        self._description_postings.append([])
+        for trigram in _trigrams(word):
+            self._trigram_words.setdefault(trigram, []).append(word_id)
+        return word_id
+
+    def _match_word(self, term: str) -> Dict[int, float]:
+        """Найти слова словаря, подходящие под слово запроса, с оценкой 0..1"""
+        if len(term) < 3:
+            # Короткое слово - только префикс, триграмм для опечаток недостаточно
+            matches = {}
+            start = bisect.bisect_left(self._sorted_words, term)
+            for word in self._sorted_words[start:]:
+                if not word.startswith(term):
+                    break
+                matches[self._word_ids[word]] = 1.0
+            return matches
+
+        trigrams = _trigrams(term)
+        hits = Counter()
+        for trigram in trigrams:
+            hits.update(self._trigram_words.get(trigram, ()))
+
+        matches = {}
+        for word_id, count in hits.items():
+            similarity = count / len(trigrams)
+            if similarity < MIN_SIMILARITY:
+                continue
+            matches[word_id] = 1.0 if term in self._words[word_id] else similarity
+        return matches
+
+    def _score_term(self, term: str) -> Dict[int, float]:
+        """Оценка каждого товара по одному слову запроса (лучшее совпадение)"""
+        groups = []
+        for word_id, similarity in self._match_word(term).items():
+            groups.append((similarity * NAME_WEIGHT, self._name_postings[word_id]))
+            groups.append((similarity * DESCRIPTION_WEIGHT, self._description_postings[word_id]))
+
+        # Группы применяются по возрастанию оценки: более высокая перезаписывает
+        # более низкую, и слияние идет через dict.update без цикла по товарам
+        groups.sort(key=lambda group: group[0])
+        scores: Dict[int, float] = {}
+        for score, positions in groups:
+            scores.update(dict.fromkeys(positions, score))
+        return scores
+
+    def search(self, query: str, restaurant_id: Optional[int] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Найти товары по запросу
+
+        Args:
+            query: строка поиска
+            restaurant_id: искать только в товарах ресторана
+            limit: максимум результатов
+
+        Returns:
+            list: товары снимка, лучшие совпадения первыми
+        """
+        scores: Optional[Dict[int, float]] = None
+        for term in dict.fromkeys(tokenize(query)):
+            term_scores = self._score_term(term)
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {p: scores[p] + term_scores[p] for p in scores.keys() & term_scores.keys()}
+            if not scores:
+                return []
+
+        if not scores:
+            return []
+
+        candidates = scores.keys()
+        if restaurant_id is not None:
+            candidates = candidates & self._restaurant_positions.get(restaurant_id, set())
+
+        # nlargest устойчив: при равной оценке сохраняется порядок позиций, то есть по названию
+        best = heapq.nlargest(limit, sorted(candidates), key=scores.__getitem__)
+        return [self.products[position] for position in best]
@@ -0,0 +1,173 @@
+"""
+Статическая выгрузка каталога для nginx
+
+После каждого изменения каталога снимок выгружается в CATALOG_EXPORT_DIR
+(в docker-compose это именованный том catalog_export, который раздает nginx):
+  - bootstrap.<hash>.json - рестораны, категории и товары целиком
+  - bootstrap-<id>.<hash>.json - то же, ограниченное одним рестораном
+  - menu-<id>.<hash>.json - меню ресторана, как /api/restaurants/{id}/menu
+  - manifest.json - версия каталога и текущие имена файлов
+
+Имена файлов содержат хеш содержимого, поэтому файлы неизменяемы и
+кешируются навсегда, а проверяется только маленький manifest.json. Рядом
+с каждым файлом лежат готовые .gz и .br (если установлен brotli) для
+gzip_static/brotli_static. Файлы предыдущей выгрузки сохраняются, чтобы
+клиенты со старым манифестом успели их загрузить.
+
+Mini App читает манифест и при отсутствии выгрузки идет в /api/*, поэтому
+ошибка записи (например, нет прав на каталог) только пишется в лог.
+"""
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Set
+
+from admin_service.admin.catalog import CatalogCache, CatalogPayload, CatalogSnapshot, catalog_cache
+from shared.config import settings
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+
+# Пауза перед выгрузкой, чтобы серия правок в админке дала одну выгрузку
+DEBOUNCE = 1.0
+
+
+def _write_atomic(path: Path, data: bytes):
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _write_payload(directory: Path, stem: str, payload: CatalogPayload) -> str:
+    """Записать payload и его сжатые варианты, вернуть имя файла"""
+    digest = payload.etag.strip('"')[:16]
+    name = f"{stem}.{digest}.json"
+    path = directory / name
+    if path.exists():
+        return name
+
+    # Сначала сжатые варианты: появление .json означает, что они уже на месте
+    _write_atomic(directory / f"{name}.gz", payload.gzip_body)
+    if payload.brotli_body is not None:
+        _write_atomic(directory / f"{name}.br", payload.brotli_body)
+    _write_atomic(path, payload.body)
+    return name
+
+
+def _manifest_files(manifest: Dict[str, Any]) -> Set[str]:
+    files = set()
+    for section in ("bootstrap", "menus"):
+        files.update(manifest.get(section, {}).values())
+    return files
+
+
+def _read_manifest(directory: Path) -> Dict[str, Any]:
+    try:
+        return json.loads((directory / MANIFEST_NAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def export_snapshot(snapshot: CatalogSnapshot, directory: Path) -> Dict[str, Any]:
+    """
+    Выгрузить снимок каталога в файлы
+
+    Args:
+        snapshot: снимок каталога
+        directory: каталог, который раздает nginx
+
+    Returns:
+        dict: записанный манифест
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    previous = _read_manifest(directory)
+
+    bootstrap = {"all": _write_payload(directory, "bootstrap", snapshot.bootstrap_payload())}
+    menus = {}
+    for restaurant_id in sorted(snapshot.restaurant_ids):
+        key = str(restaurant_id)
+        bootstrap[key] = _write_payload(directory, f"bootstrap-{key}", snapshot.bootstrap_payload(restaurant_id))
+        menus[key] = _write_payload(directory, f"menu-{key}", snapshot.menu_payload(restaurant_id))
+
+    manifest = {
+        "version": snapshot.version,
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "bootstrap": bootstrap,
+        "menus": menus
+    }
+    _write_atomic(
+        directory / MANIFEST_NAME,
+        json.dumps(manifest, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    )
+
+    # Удаляем файлы старше предыдущей выгрузки
+    keep = _manifest_files(manifest) | _manifest_files(previous)
+    for path in directory.iterdir():
+        if path.name == MANIFEST_NAME or path.name.startswith("."):
+            continue
+        base = path.name
+        for suffix in (".gz", ".br"):
+            if base.endswith(suffix):
+                base = base[:-len(suffix)]
+        if base.endswith(".json") and base not in keep:
+            path.unlink(missing_ok=True)
+
+    return manifest
+
+
+class CatalogExporter:
+    """Фоновая выгрузка каталога после каждого изменения"""
+
+    def __init__(self, cache: CatalogCache, directory: Path):
+        self._cache = cache
+        self._directory = directory
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        cache.subscribe(self._changed.set)
+
+    def start(self):
+        """Запустить выгрузку (первая выполняется сразу при старте)"""
+        if self._task is None:
+            self._changed.set()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Остановить выгрузку"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            await self._changed.wait()
+            await asyncio.sleep(DEBOUNCE)
+            self._changed.clear()
+            try:
+                snapshot = await self._cache.get_snapshot()
+                manifest = await asyncio.to_thread(export_snapshot, snapshot, self._directory)
+                logger.info(f"Каталог выгружен в {self._directory}, версия: {manifest['version']}")
+            except PermissionError as e:
+                # Клиенты продолжают получать каталог через /api/*
+                logger.error(f"Нет прав на запись выгрузки каталога в {self._directory}: {e}. "
+                             f"Каталог должен принадлежать пользователю процесса "
+                             f"(при bind mount: chown {os.getuid()} на хосте)")
+            except Exception as e:
+                logger.error(f"Ошибка выгрузки каталога в {self._directory}: {e}")
+
+
+# Глобальная выгрузка каталога (None, если CATALOG_EXPORT_DIR не задан)
+catalog_exporter = CatalogExporter(catalog_cache, Path(settings.CATALOG_EXPORT_DIR)) if settings.CATALOG_EXPORT_DIR else None
+
+
+def get_catalog_exporter() -> Optional[CatalogExporter]:
+    """Получает глобальную выгрузку каталога"""
+    return catalog_exporter
@@ -0,0 +1,137 @@
+"""
+Резервирование остатков товаров
+
+При создании заказа остатки всей корзины списываются одним запросом:
+  WITH locked AS (SELECT id FROM products WHERE id IN (...) ORDER BY id FOR NO KEY UPDATE)
+  UPDATE products SET stock = stock - cart.qty
+  FROM locked, (VALUES ...) AS cart(id, qty)
+  WHERE ... AND (stock IS NULL OR stock >= cart.qty)
+Строки блокируются всегда в порядке id, поэтому параллельные заказы с
+общими товарами ждут друг друга, но не попадают во взаимную блокировку.
+Товар, которого не хватило, не обновляется: заказ откатывается целиком.
+
+stock = NULL означает, что остаток не ведется (как и в Mini App).
+
+Отмена заказа возвращает остатки, подтверждение или оплата превращают
+резерв в продажу - после них отмена остатки уже не возвращает. Флаг
+Order.stock_reserved защищает от повторного возврата.
+
+Когда товар заканчивается или снова появляется, у него меняется версия
+каталога, а вызывающий код сбрасывает кеш каталога - меню в Mini App
+обновляется без пересборки на каждый заказ.
+"""
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import CTE, Integer, Select, case, column, func, or_, select, update, values
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shared.models import CATALOG_VERSION, CATALOG_XID, Order, OrderItem, Product
+
+
+def _lock_stmt(product_ids) -> Select:
+    """Блокировка строк товаров в порядке id"""
+    return (
+        select(Product.id)
+        .where(Product.id.in_(product_ids))
+        .order_by(Product.id)
+        # FOR NO KEY UPDATE: не конфликтует с FOR KEY SHARE, которую берут
+        # проверки внешних ключей при вставке order_items в других заказах
+        .with_for_update(key_share=True)
+    )
+
+
+def _locked(product_ids) -> CTE:
+    return _lock_stmt(product_ids).cte("locked")
+
+
+async def lock_products(db: AsyncSession, product_ids: Iterable[int]):
+    """
+    Заранее заблокировать товары в порядке id
+
+    Нужно транзакции с несколькими заказами: их списания по отдельности
+    брали бы блокировки не по порядку id.
+    """
+    product_ids = sorted(set(product_ids))
+    if product_ids:
+        await db.execute(_lock_stmt(product_ids))
+
+
+async def reserve_stock(db: AsyncSession, quantities: Dict[int, int]) -> Tuple[List[int], bool]:
+    """
+    Списать остатки корзины в текущей транзакции (без commit)
+
+    Args:
+        db: сессия базы данных
+        quantities: количество по id товара
+
+    Returns:
+        tuple: (id товаров, которых не хватило; закончился ли какой-то товар)
+    """
+    if not quantities:
+        return [], False
+
+    locked = _locked(list(quantities))
+    cart = values(column("id", Integer), column("qty", Integer), name="cart").data(list(quantities.items()))
+    remaining = Product.stock - cart.c.qty
+    result = await db.execute(
+        update(Product)
+        .where(
+            Product.id == locked.c.id,
+            Product.id == cart.c.id,
+            or_(Product.stock.is_(None), Product.stock >= cart.c.qty)
+        )
+        .values(
+            stock=remaining,
+            # Версия меняется, только когда товар закончился
+            version=case((remaining <= 0, CATALOG_VERSION), else_=Product.version),
+            version_xid=case((remaining <= 0, CATALOG_XID), else_=Product.version_xid)
+        )
+        .returning(Product.id, Product.stock)
+    )
+    rows = result.all()
+
+    reserved = {product_id for product_id, _ in rows}
+    short = sorted(product_id for product_id in quantities if product_id not in reserved)
+    sold_out = any(stock is not None and stock <= 0 for _, stock in rows)
+    return short, sold_out
+
+
+async def release_stock(db: AsyncSession, order_id: int) -> bool:
+    """
+    Вернуть остатки заказа в текущей транзакции (без commit)
+
+    Остатки возвращаются один раз: флаг stock_reserved снимается тем же
+    запросом, который его проверяет.
+
+    Returns:
+        bool: снова появился ли в наличии какой-то товар
+    """
+    result = await db.execute(
+        update(Order)
+        .where(Order.id == order_id, Order.stock_reserved.is_(True))
+        .values(stock_reserved=False)
+        .returning(Order.id)
+    )
+    if result.first() is None:
+        return False
+
+    items = (
+        select(OrderItem.product_id.label("id"), func.sum(OrderItem.quantity).label("qty"))
+        .where(OrderItem.order_id == order_id)
+        .group_by(OrderItem.product_id)
+        .subquery("items")
+    )
+    locked = _locked(select(items.c.id))
+    result = await db.execute(
+        update(Product)
+        .where(Product.id == locked.c.id, Product.id == items.c.id, Product.stock.is_not(None))
+        .values(
+            stock=Product.stock + items.c.qty,
+            # Версия меняется, только когда товар снова появился
+            version=case((Product.stock <= 0, CATALOG_VERSION), else_=Product.version),
+            version_xid=case((Product.stock <= 0, CATALOG_XID), else_=Product.version_xid)
+        )
+        .returning(Product.stock, items.c.qty)
+    )
+    return any(stock - qty <= 0 < stock for stock, qty in result.all())
+
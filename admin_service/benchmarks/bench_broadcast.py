@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк рассылки подписчикам (admin_service.admin.broadcast)
+
+Создает USERS подписчиков и отправляет им кампанию через бот-заглушку,
+отвечающую за LATENCY_MS. Печатает время, сообщений в секунду и пик
+памяти Python (tracemalloc) рядом с пиком при чтении тех же подписчиков
+целиком (result.all()).
+
+Лимит рассылки снят, чтобы измерить сам движок; с лимитом Telegram
+время кампании равно USERS / TELEGRAM_BROADCAST_RATE.
+
+Нужен PostgreSQL со схемой из alembic (DATABASE_URL, как у приложения).
+Созданные пользователи и кампания удаляются:
+    python admin_service/benchmarks/bench_broadcast.py [USERS] [LATENCY_MS]
+"""
+import asyncio
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from sqlalchemy import delete, func, insert, literal, select, true
+
+from admin_service.admin import broadcast
+from admin_service.admin.broadcast import BroadcastRun, broadcaster
+from shared.database import get_db_session
+from shared.database.connection import engine
+from shared.models import BroadcastCampaign, User
+from shared.telegram.sender import TokenBucket
+
+USERS = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+LATENCY_MS = float(sys.argv[2]) if len(sys.argv) > 2 else 20.0
+
+# id создаваемых пользователей начинаются после существующих
+FIRST_ID = 2_000_000_000 - USERS - 1
+
+
+class StubBot:
+    """Бот-заглушка: каждое сообщение занимает LATENCY_MS"""
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def send_message(self, chat_id, text, parse_mode):
+        await asyncio.sleep(LATENCY_MS / 1000)
+
+
+async def load_all() -> float:
+    # Как без пачек: все подписчики в памяти до начала рассылки
+    tracemalloc.start()
+    async with get_db_session() as db:
+        result = await db.execute(
+            select(User.id, User.telegram_id).where(User.is_subscribed.is_(True), User.id > FIRST_ID)
+        )
+        rows = result.all()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del rows
+    return peak / 1e6
+
+
+async def main():
+    user_id = (FIRST_ID + func.generate_series(1, USERS)).label("id")
+    users = select(user_id).subquery()
+    async with get_db_session() as db:
+        await db.execute(
+            insert(User).from_select(
+                ["id", "telegram_id", "name", "is_subscribed"],
+                select(users.c.id, func.cast(users.c.id, User.telegram_id.type), literal("bench"), true())
+            )
+        )
+        campaign = BroadcastCampaign(message="bench", last_user_id=FIRST_ID)
+        db.add(campaign)
+        await db.commit()
+        campaign_id = campaign.id
+
+    broadcaster.bot = StubBot()
+    broadcaster.bucket = TokenBucket(1e9, 10 ** 9)
+    try:
+        full_peak = await load_all()
+        await broadcaster._open()
+        tracemalloc.start()
+        start = time.perf_counter()
+        await BroadcastRun(broadcaster, campaign_id).run()
+        elapsed = time.perf_counter() - start
+        stream_peak = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+        await broadcaster.stop()
+
+        async with get_db_session() as db:
+            campaign = await db.get(BroadcastCampaign, campaign_id)
+            print(f"подписчиков {USERS}, ответ бота {LATENCY_MS:g} мс, "
+                  f"одновременно {broadcaster.concurrency}, пачки по {broadcast.USERS_BATCH}")
+            print(f"статус {campaign.status}, отправлено {campaign.sent}, "
+                  f"за {elapsed:.1f} с ({campaign.sent / elapsed:.0f} сообщений/с), "
+                  f"контрольная точка каждые {broadcast.CHECKPOINT_EVERY}")
+            print(f"пик памяти: пачками {stream_peak:.1f} МБ, чтение целиком {full_peak:.1f} МБ")
+            print(f"с лимитом Telegram {broadcaster.rate:g}/с кампания заняла бы {USERS / broadcaster.rate / 60:.0f} мин")
+    finally:
+        async with get_db_session() as db:
+            await db.execute(delete(BroadcastCampaign).where(BroadcastCampaign.id == campaign_id))
+            await db.execute(delete(User).where(User.id > FIRST_ID))
+            await db.commit()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
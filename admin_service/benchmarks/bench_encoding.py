@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк сериализации ответов API: jsonable_encoder против схем pydantic
+
+Сравнивает время кодирования 1000 заказов (с пользователем и рестораном,
+как в /admin/api/recent-orders) двумя способами:
+  - до: jsonable_encoder + json.dumps, как FastAPI делает для ORM-объектов
+  - после: json_response() со схемой OrderWithRelationsOut
+
+Использует SQLite в памяти, PostgreSQL не нужен:
+    python admin_service/benchmarks/bench_encoding.py
+"""
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session, joinedload
+
+from shared.models import Base, Order, User, Restaurant
+from admin_service.admin.schemas import json_response, order_list_adapter
+
+ROWS = 1000
+REPEAT = 20
+
+
+def load_orders(session: Session):
+    stmt = select(Order).options(joinedload(Order.user), joinedload(Order.restaurant))
+    return session.execute(stmt).scalars().unique().all()
+
+
+def measure(label: str, func) -> float:
+    func()  # прогрев
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        func()
+    elapsed = (time.perf_counter() - start) / REPEAT * 1000
+    print(f"{label:<40} {elapsed:8.2f} мс на {ROWS} строк")
+    return elapsed
+
+
+def main():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[User.__table__, Restaurant.__table__, Order.__table__])
+
+    with Session(engine) as session:
+        restaurant = Restaurant(name="You Coffee (Nalchik)", address="г. Нальчик, ул. Кабардинская, 25")
+        session.add(restaurant)
+        session.flush()
+        for i in range(ROWS):
+            user = User(telegram_id=str(100000 + i), name=f"Клиент {i}", phone="+79990000000")
+            session.add(Order(
+                user=user,
+                restaurant_id=restaurant.id,
+                status="new",
+                total=450.0 + i,
+                phone="+79990000000",
+                created_at=datetime.now()
+            ))
+        session.commit()
+
+    with Session(engine) as session:
+        orders = load_orders(session)
+
+        before = measure(
+            "jsonable_encoder + json.dumps",
+            lambda: json.dumps(jsonable_encoder(orders), ensure_ascii=False).encode("utf-8")
+        )
+        after = measure(
+            "json_response(OrderWithRelationsOut)",
+            lambda: json_response(orders, order_list_adapter).body
+        )
+        print(f"Ускорение: x{before / after:.1f}")
+
+
+if __name__ == "__main__":
+    main()
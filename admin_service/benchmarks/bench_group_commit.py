@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк групповой записи заказов (admin_service.admin.order_batcher)
+
+Пишет ORDERS одновременных заказов двумя способами:
+  - транзакция и commit на каждый заказ (как create_order_api по умолчанию)
+  - OrderBatcher: окно WINDOW_MS, пачки до MAX_SIZE заказов, один commit
+
+и печатает заказы в секунду, задержку p50/p99 и число commit. Каждый
+вызывающий должен получить свой order_id: проверяется, что все id разные.
+
+Нужен PostgreSQL со схемой из alembic (DATABASE_URL, как у приложения).
+Создает свой ресторан и товар без учета остатка и удаляет все созданное:
+    python admin_service/benchmarks/bench_group_commit.py [ORDERS] [WINDOW_MS] [MAX_SIZE]
+"""
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from sqlalchemy import delete, insert, select
+
+from admin_service.admin.order_batcher import OrderBatcher
+from admin_service.admin.order_ingest import OrderRejected, write_order
+from admin_service.admin.order_request import OrderLine, OrderRequest, OrderUser
+from shared.config import settings
+from shared.database import get_db_session
+from shared.database.connection import engine
+from shared.models import NotificationOutbox, Order, OrderItem, Product, Restaurant
+
+ORDERS = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+WINDOW_MS = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+MAX_SIZE = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+
+
+def make_order(restaurant_id: int, product_id: int, i: int):
+    order = OrderRequest(order=[OrderLine(id=product_id)], restaurant_id=restaurant_id, phone="+79990000000",
+                         address="bench", user=OrderUser(id=900000 + i % 50, first_name="Bench"))
+    quote = {"items": [{"id": product_id, "name": "bench", "qty": 1, "price": 100.0}], "total": 100.0}
+    return order, quote
+
+
+async def direct(order, quote):
+    # Как create_order_api: сессия, запись заказа и commit на каждый заказ
+    async with get_db_session() as db:
+        try:
+            response, _ = await write_order(db, order, quote)
+        except OrderRejected as rejected:
+            await db.rollback()
+            return rejected.response
+        await db.commit()
+        return response
+
+
+async def run(name, submit, orders):
+    latencies = []
+
+    async def timed(order, quote):
+        started = time.perf_counter()
+        response = await submit(order, quote)
+        latencies.append(time.perf_counter() - started)
+        return response
+
+    # Ограничение как у лимитера записи: без него прямой режим ждал бы в очереди пула
+    semaphore = asyncio.Semaphore(settings.DB_POOL_SIZE if name == "commit на заказ" else 2 * MAX_SIZE)
+
+    async def limited(order, quote):
+        async with semaphore:
+            return await timed(order, quote)
+
+    started = time.perf_counter()
+    responses = await asyncio.gather(*(limited(*order) for order in orders))
+    elapsed = time.perf_counter() - started
+
+    ok = [r["order_id"] for r in responses if r.get("status") == "success"]
+    latencies.sort()
+    print(f"{name}: {len(orders) / elapsed:.0f} заказов/с, {elapsed * 1000:.0f} мс, "
+          f"p50 {latencies[len(latencies) // 2] * 1000:.1f} мс, p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} мс, "
+          f"успешно {len(ok)}, разных order_id {len(set(ok))}")
+    return ok
+
+
+async def main():
+    async with get_db_session() as db:
+        restaurant_id = (await db.execute(
+            insert(Restaurant).values(name="bench-group-commit", address="bench").returning(Restaurant.id)
+        )).scalar_one()
+        product_id = (await db.execute(
+            insert(Product).values(name="bench-group-commit", price=100.0, stock=None,
+                                   restaurant_id=restaurant_id, is_available=False).returning(Product.id)
+        )).scalar_one()
+        await db.commit()
+
+    try:
+        orders = [make_order(restaurant_id, product_id, i) for i in range(ORDERS)]
+        await run("commit на заказ", direct, orders)
+
+        batcher = OrderBatcher(WINDOW_MS / 1000, MAX_SIZE)
+        batcher.start()
+        await run(f"пачки (окно {WINDOW_MS:g} мс, до {MAX_SIZE})", batcher.submit, orders)
+        await batcher.stop()
+        stats = batcher.stats()
+        print(f"  commit: {stats['batches']}, средняя пачка: {stats['orders'] / stats['batches']:.1f}, "
+              f"наибольшая: {stats['largest_batch']}, по одному: {stats['fallbacks']}")
+    finally:
+        async with get_db_session() as db:
+            order_ids = select(Order.id).where(Order.restaurant_id == restaurant_id)
+            await db.execute(delete(OrderItem).where(OrderItem.order_id.in_(order_ids)))
+            await db.execute(delete(NotificationOutbox).where(
+                NotificationOutbox.payload["restaurant_id"].as_integer() == restaurant_id))
+            await db.execute(delete(Order).where(Order.restaurant_id == restaurant_id))
+            await db.execute(delete(Product).where(Product.id == product_id))
+            await db.execute(delete(Restaurant).where(Restaurant.id == restaurant_id))
+            await db.commit()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
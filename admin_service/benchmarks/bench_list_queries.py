@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк страниц-списков админки: ORM joinedload против Core-проекции
+
+Для таблиц товаров и заказов на 10 000 и 100 000 строк сравнивает:
+  - до: select(Model).options(joinedload(...)) + scalars().unique().all()
+  - после: запросы из admin_service.admin.listing (только выводимые колонки)
+
+Замеряет время выборки и пиковую память (tracemalloc). Использует SQLite
+в памяти, PostgreSQL не нужен:
+    python admin_service/benchmarks/bench_list_queries.py [10000 100000]
+"""
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session, joinedload
+
+from shared.models import Base, Order, User, Restaurant, Product, Category
+from admin_service.admin.listing import orders_stmt, products_stmt
+
+SIZES = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+REPEAT = 3
+
+
+def seed(engine, rows: int):
+    tables = [t.__table__ for t in (User, Restaurant, Category, Product, Order)]
+    Base.metadata.drop_all(engine, tables=tables)
+    Base.metadata.create_all(engine, tables=tables)
+    now = datetime.now()
+    # version заполняем явно: nextval('catalog_version_seq') есть только в PostgreSQL
+    with engine.begin() as conn:
+        conn.execute(insert(Restaurant), [
+            {"id": 1, "name": "You Coffee (Nalchik)", "address": "г. Нальчик, ул. Кабардинская, 25"}
+        ])
+        conn.execute(insert(Category), [
+            {"id": i, "name": f"Категория {i}", "restaurant_id": 1, "version": i} for i in range(1, 21)
+        ])
+        conn.execute(insert(Product), [
+            {"id": i, "name": f"Товар {i}", "description": "Описание товара " * 4,
+             "price": 150.0 + i % 300, "size": "M", "is_available": True,
+             "category_id": i % 20 + 1, "restaurant_id": 1, "version": i}
+            for i in range(1, rows + 1)
+        ])
+        conn.execute(insert(User), [
+            {"id": i, "telegram_id": str(100000 + i), "name": f"Клиент {i}", "phone": "+79990000000"}
+            for i in range(1, rows // 10 + 1)
+        ])
+        conn.execute(insert(Order), [
+            {"id": i, "user_id": i % (rows // 10) + 1, "restaurant_id": 1, "status": "new",
+             "total": 450.0 + i % 1000, "phone": "+79990000000", "created_at": now}
+            for i in range(1, rows + 1)
+        ])
+
+
+def orm_products(engine):
+    with Session(engine) as session:
+        stmt = select(Product).options(joinedload(Product.category))
+        return len(session.execute(stmt).scalars().unique().all())
+
+
+def orm_orders(engine):
+    with Session(engine) as session:
+        stmt = select(Order).options(joinedload(Order.user), joinedload(Order.restaurant))
+        return len(session.execute(stmt).scalars().unique().all())
+
+
+def core_products(engine):
+    with engine.connect() as conn:
+        return len(conn.execute(products_stmt()).all())
+
+
+def core_orders(engine):
+    with engine.connect() as conn:
+        return len(conn.execute(orders_stmt()).all())
+
+
+def measure(label: str, func, engine):
+    func(engine)  # прогрев
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        func(engine)
+    elapsed = (time.perf_counter() - start) / REPEAT * 1000
+
+    tracemalloc.start()
+    func(engine)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"  {label:<34} {elapsed:9.1f} мс {peak / 1024 / 1024:8.1f} МБ")
+    return elapsed, peak
+
+
+def main():
+    engine = create_engine("sqlite://")
+    for rows in SIZES:
+        seed(engine, rows)
+        print(f"{rows} строк:")
+        for name, orm_func, core_func in (
+                ("products", orm_products, core_products),
+                ("orders", orm_orders, core_orders)
+        ):
+            before_time, before_peak = measure(f"{name}: ORM joinedload", orm_func, engine)
+            after_time, after_peak = measure(f"{name}: Core-проекция", core_func, engine)
+            print(f"  {name}: быстрее в x{before_time / after_time:.1f}, "
+                  f"памяти меньше в x{before_peak / after_peak:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк проверки тела заказа (admin_service.admin.order_request)
+
+Для нескольких видов тел POST /api/orders печатает время:
+  - до: json.loads в dict, как FastAPI разбирал order_data: dict, и
+    проверка состава заказа, которая была в create_order_api
+  - после: validate_order - model_validate_json с ограничениями размера
+
+Некорректные тела раньше доходили до лимитера записи, чтения ключа
+идемпотентности и расчета корзины; теперь они отклоняются здесь.
+
+PostgreSQL не нужен:
+    python admin_service/benchmarks/bench_order_validation.py
+"""
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from admin_service.admin.order_request import InvalidOrder, MAX_CART_LINES, validate_order
+
+REPEAT = 2000
+
+
+def order(lines: int, **overrides) -> bytes:
+    data = {
+        "order": [{"id": i + 1, "name": f"Товар {i}", "qty": 2, "price": 150.0} for i in range(lines)],
+        "totalSum": 300.0 * lines,
+        "address": "ул. Ленина, 1",
+        "restaurant_id": 1,
+        "timestamp": "2026-01-01T12:00:00.000Z",
+        "user": {"id": 123456789, "first_name": "Иван", "last_name": "Петров", "username": "ivan"}
+    }
+    data.update(overrides)
+    return json.dumps(data, ensure_ascii=False).encode()
+
+
+BODIES = {
+    "корзина из 3 позиций": order(3),
+    f"корзина из {MAX_CART_LINES} позиций": order(MAX_CART_LINES),
+    "не JSON": b"<html>" * 100,
+    "количество строкой": order(3, order=[{"id": 1, "qty": "2"}]),
+    f"корзина из {MAX_CART_LINES * 5} позиций": order(MAX_CART_LINES * 5),
+    "тело 1 МБ": b'{"order": [' + b'{"id": 1, "qty": 1},' * 52000 + b'{"id": 1}]}',
+}
+
+
+def before(body: bytes) -> bool:
+    # FastAPI разбирал тело в dict целиком, затем create_order_api проверял позиции
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return False
+    if not isinstance(data, dict):
+        return False
+    items = data.get("order") or []
+    return isinstance(items, list) and all(isinstance(item, dict) for item in items)
+
+
+def after(body: bytes) -> bool:
+    try:
+        validate_order(body)
+    except InvalidOrder:
+        return False
+    return True
+
+
+def measure(func, body: bytes) -> float:
+    func(body)  # прогрев
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        func(body)
+    return (time.perf_counter() - start) / REPEAT * 1e6
+
+
+def main():
+    print(f"{'тело':<28}{'байт':>9}{'до, мкс':>10}{'после, мкс':>12}  принят")
+    for name, body in BODIES.items():
+        print(f"{name:<28}{len(body):>9}{measure(before, body):>10.1f}{measure(after, body):>12.1f}  "
+              f"{'да' if after(body) else 'нет (422)'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк поиска товаров по снимку каталога
+
+Строит ProductSearchIndex по 50 000 сгенерированных товаров и замеряет
+время построения индекса и среднее время запросов разных видов
+(префикс, подстрока, опечатка, несколько слов, поиск в одном ресторане).
+
+База данных не нужна:
+    python admin_service/benchmarks/bench_search.py [50000]
+"""
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from admin_service.admin.search import ProductSearchIndex
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+REPEAT = 200
+
+DRINKS = ["американо", "капучино", "латте", "раф", "эспрессо", "флэт уайт", "какао", "чай", "лимонад", "смузи"]
+FLAVOURS = ["ванильный", "карамельный", "ореховый", "кокосовый", "мятный", "малиновый", "банановый", "сырный"]
+WORDS = ["классический", "двойной", "на", "овсяном", "молоке", "с", "сиропом", "пенкой", "корицей", "сливками",
+         "без", "сахара", "большой", "средний", "горячий", "холодный", "сезонный", "авторский"]
+
+QUERIES = {
+    "префикс": "капу",
+    "короткий префикс": "ла",
+    "подстрока": "пучин",
+    "опечатка": "капучнно",
+    "несколько слов": "ореховый раф",
+    "по описанию": "овсяном",
+}
+
+
+def make_products(rows: int):
+    rnd = random.Random(42)
+    products = []
+    for i in range(1, rows + 1):
+        name = f"{rnd.choice(DRINKS).capitalize()} {rnd.choice(FLAVOURS)} №{i}"
+        description = " ".join(rnd.choice(WORDS) for _ in range(8))
+        products.append({"id": i, "name": name, "description": description, "restaurant_id": i % 10 + 1})
+    return products
+
+
+def main():
+    products = make_products(ROWS)
+
+    start = time.perf_counter()
+    index = ProductSearchIndex(products)
+    print(f"Построение индекса на {ROWS} товаров: {(time.perf_counter() - start) * 1000:.0f} мс")
+
+    for label, query in QUERIES.items():
+        for restaurant_id in (None, 3):
+            index.search(query, restaurant_id)  # прогрев
+            start = time.perf_counter()
+            for _ in range(REPEAT):
+                found = index.search(query, restaurant_id)
+            elapsed = (time.perf_counter() - start) / REPEAT * 1000
+            scope = "все рестораны" if restaurant_id is None else f"ресторан {restaurant_id}"
+            print(f"  {label:<18} {query!r:<16} {scope:<14} {elapsed:7.2f} мс  "
+                  f"{len(found)} шт., первый: {found[0]['name'] if found else '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Нагрузочная проверка резервирования остатков (admin_service.admin.stock)
+
+Запускает ORDERS одновременных транзакций reserve_stock по нескольким
+"горячим" товарам с маленьким остатком; корзины из 1-4 позиций в
+случайном порядке. Проверяет и печатает:
+  - перепродажу: остаток не ушел в минус, и списано ровно столько,
+    сколько в успешных заказах
+  - взаимные блокировки (deadlock detected) и прочие ошибки
+  - задержку транзакции (p50/p99) и максимум ожидающих блокировок в pg_locks
+
+Нужен PostgreSQL со схемой из alembic (DATABASE_URL, как у приложения).
+Создает свои товары и удаляет их после проверки:
+    python admin_service/benchmarks/bench_stock_contention.py [ORDERS] [POOL]
+"""
+import asyncio
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from admin_service.admin.stock import reserve_stock
+from shared.config import settings
+from shared.models import Product
+
+ORDERS = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+POOL = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+PRODUCTS = 8
+STOCK = 150
+MARKER = "bench-stock"
+
+
+async def place_order(sessions, product_ids, stats):
+    lines = random.sample(product_ids, random.randint(1, 4))
+    quantities = {product_id: random.randint(1, 3) for product_id in lines}
+    started = time.perf_counter()
+    try:
+        async with sessions() as db:
+            # Заказ вставляет order_items до списания: проверка внешнего ключа берет FOR KEY SHARE
+            await db.execute(select(Product.id).where(Product.id.in_(lines)).with_for_update(read=True, key_share=True))
+            short, _ = await reserve_stock(db, quantities)
+            if short:
+                await db.rollback()
+                stats["rejected"] += 1
+            else:
+                # Остальная часть транзакции заказа
+                await db.execute(text("SELECT pg_sleep(0.002)"))
+                await db.commit()
+                stats["accepted"] += 1
+                for product_id, qty in quantities.items():
+                    stats["sold"][product_id] += qty
+    except Exception as e:
+        kind = "deadlocks" if "deadlock" in str(e).lower() else "errors"
+        stats[kind] += 1
+    stats["latency"].append(time.perf_counter() - started)
+
+
+async def watch_locks(engine, stats, done: asyncio.Event):
+    async with engine.connect() as conn:
+        while not done.is_set():
+            result = await conn.execute(text("SELECT count(*) FROM pg_locks WHERE NOT granted"))
+            stats["max_waiting"] = max(stats["max_waiting"], result.scalar_one())
+            await asyncio.sleep(0.01)
+
+
+async def main():
+    engine = create_async_engine(settings.DATABASE_URL, pool_size=POOL, max_overflow=0, pool_timeout=120)
+    sessions = async_sessionmaker(engine, expire_on_commit=False)
+
+    async with engine.begin() as conn:
+        result = await conn.execute(
+            insert(Product).returning(Product.id),
+            [{"name": f"{MARKER} {i}", "price": 100.0, "stock": STOCK, "is_available": False}
+             for i in range(PRODUCTS)]
+        )
+        product_ids = list(result.scalars())
+
+    stats = {"accepted": 0, "rejected": 0, "deadlocks": 0, "errors": 0, "max_waiting": 0,
+             "sold": {product_id: 0 for product_id in product_ids}, "latency": []}
+    done = asyncio.Event()
+    watcher = asyncio.create_task(watch_locks(engine, stats, done))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(place_order(sessions, product_ids, stats) for _ in range(ORDERS)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await watcher
+
+    async with engine.begin() as conn:
+        result = await conn.execute(select(Product.id, Product.stock).where(Product.id.in_(product_ids)))
+        stock = dict(result.all())
+        await conn.execute(delete(Product).where(Product.id.in_(product_ids)))
+    await engine.dispose()
+
+    oversold = [pid for pid in product_ids if stock[pid] < 0 or STOCK - stock[pid] != stats["sold"][pid]]
+    latency = sorted(stats["latency"])
+    print(f"Заказов: {ORDERS}, пул соединений: {POOL}, товаров: {PRODUCTS} по {STOCK} шт.")
+    print(f"Время: {elapsed * 1000:.0f} мс, принято: {stats['accepted']}, отклонено (нет остатка): {stats['rejected']}")
+    print(f"Deadlock: {stats['deadlocks']}, других ошибок: {stats['errors']}")
+    print(f"Задержка p50: {latency[len(latency) // 2] * 1000:.1f} мс, "
+          f"p99: {latency[int(len(latency) * 0.99)] * 1000:.1f} мс")
+    print(f"Максимум ожидающих блокировок: {stats['max_waiting']}")
+    print(f"Остатки: {[stock[pid] for pid in product_ids]}")
+    print("Перепродажа: " + (f"ДА, товары {oversold}" if oversold else "нет"))
+    return 1 if oversold or stats["deadlocks"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
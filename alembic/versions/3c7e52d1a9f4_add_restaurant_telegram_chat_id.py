@@ -0,0 +1,26 @@
+"""add_restaurant_telegram_chat_id
+
+Revision ID: 3c7e52d1a9f4
+Revises: f0c1e7a95b32
+Create Date: 2026-10-18 22:17:52.904116
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c7e52d1a9f4'
+down_revision: Union[str, None] = 'f0c1e7a95b32'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('restaurants', sa.Column('telegram_chat_id', sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('restaurants', 'telegram_chat_id')
@@ -0,0 +1,54 @@
+"""add_catalog_versions
+
+Revision ID: 4f2a9c71d8e3
+Revises: c36089f5ffa6
+Create Date: 2026-10-18 10:12:41.208113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4f2a9c71d8e3'
+down_revision: Union[str, None] = 'c36089f5ffa6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+VERSIONED_TABLES = ('categories', 'products', 'discounts')
+
+
+def upgrade() -> None:
+    # Общая последовательность версий каталога
+    op.execute("CREATE SEQUENCE catalog_version_seq")
+
+    for table in VERSIONED_TABLES:
+        # Существующим строкам раздаем версии, затем делаем поле обязательным
+        op.add_column(table, sa.Column('version', sa.BigInteger(), nullable=True))
+        op.execute(f"UPDATE {table} SET version = nextval('catalog_version_seq')")
+        op.alter_column(table, 'version', nullable=False,
+                        server_default=sa.text("nextval('catalog_version_seq')"))
+        op.create_index(f'ix_{table}_version', table, ['version'])
+
+    op.create_table('catalog_tombstones',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('entity', sa.String(length=32), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.BigInteger(), server_default=sa.text("nextval('catalog_version_seq')"), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_catalog_tombstones_version', 'catalog_tombstones', ['version'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_catalog_tombstones_version', table_name='catalog_tombstones')
+    op.drop_table('catalog_tombstones')
+
+    for table in VERSIONED_TABLES:
+        op.drop_index(f'ix_{table}_version', table_name=table)
+        op.drop_column(table, 'version')
+
+    op.execute("DROP SEQUENCE catalog_version_seq")
@@ -0,0 +1,26 @@
+"""add_discount_percent
+
+Revision ID: 9b3e5d2a7c14
+Revises: 4f2a9c71d8e3
+Create Date: 2026-10-18 14:05:27.514306
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b3e5d2a7c14'
+down_revision: Union[str, None] = '4f2a9c71d8e3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('discounts', sa.Column('percent', sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('discounts', 'percent')
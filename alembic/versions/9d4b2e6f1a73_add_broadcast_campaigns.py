@@ -0,0 +1,39 @@
+"""add_broadcast_campaigns
+
+Revision ID: 9d4b2e6f1a73
+Revises: 3c7e52d1a9f4
+Create Date: 2026-10-18 23:12:48.104925
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d4b2e6f1a73'
+down_revision: Union[str, None] = '3c7e52d1a9f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('broadcast_campaigns',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('discount_id', sa.Integer(), nullable=True),
+    sa.Column('message', sa.Text(), nullable=False),
+    sa.Column('status', sa.String(length=16), server_default='running', nullable=False),
+    sa.Column('last_user_id', sa.Integer(), server_default=sa.text('0'), nullable=False),
+    sa.Column('sent', sa.Integer(), server_default=sa.text('0'), nullable=False),
+    sa.Column('failed', sa.Integer(), server_default=sa.text('0'), nullable=False),
+    sa.Column('blocked', sa.Integer(), server_default=sa.text('0'), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['discount_id'], ['discounts.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('broadcast_campaigns')
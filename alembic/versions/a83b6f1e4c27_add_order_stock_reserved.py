@@ -0,0 +1,27 @@
+"""add_order_stock_reserved
+
+Revision ID: a83b6f1e4c27
+Revises: 5e0c9a4d2f81
+Create Date: 2026-10-18 18:11:03.640215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a83b6f1e4c27'
+down_revision: Union[str, None] = '5e0c9a4d2f81'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Старые заказы остатки не списывали - возвращать при отмене нечего
+    op.add_column('orders', sa.Column('stock_reserved', sa.Boolean(), server_default=sa.text('false'), nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('orders', 'stock_reserved')
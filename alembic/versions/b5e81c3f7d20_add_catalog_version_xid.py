@@ -0,0 +1,35 @@
+"""add_catalog_version_xid
+
+Revision ID: b5e81c3f7d20
+Revises: 9d4b2e6f1a73
+Create Date: 2026-10-19 10:41:26.730514
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5e81c3f7d20'
+down_revision: Union[str, None] = '9d4b2e6f1a73'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+VERSIONED_TABLES = ('categories', 'products', 'discounts', 'catalog_tombstones')
+
+CATALOG_XID = sa.text("pg_current_xact_id()::text::bigint")
+
+
+def upgrade() -> None:
+    for table in VERSIONED_TABLES:
+        # Существующие строки получают xid миграции: клиенты заберут их при следующей синхронизации
+        op.add_column(table, sa.Column('version_xid', sa.BigInteger(), server_default=CATALOG_XID, nullable=False))
+        op.create_index(f'ix_{table}_version_xid', table, ['version_xid'])
+
+
+def downgrade() -> None:
+    for table in VERSIONED_TABLES:
+        op.drop_index(f'ix_{table}_version_xid', table_name=table)
+        op.drop_column(table, 'version_xid')
@@ -0,0 +1,28 @@
+"""add_broadcast_campaign_lease
+
+Revision ID: e2a7f94c0b58
+Revises: b5e81c3f7d20
+Create Date: 2026-10-19 11:58:03.419872
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2a7f94c0b58'
+down_revision: Union[str, None] = 'b5e81c3f7d20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('broadcast_campaigns', sa.Column('leased_by', sa.String(length=32), nullable=True))
+    op.add_column('broadcast_campaigns', sa.Column('leased_until', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('broadcast_campaigns', 'leased_until')
+    op.drop_column('broadcast_campaigns', 'leased_by')
@@ -97,12 +97,21 @@
     },
     menu: [],
     categories: [],
+    loadedRestaurants: null, // ID ресторанов, чье меню уже загружено (null - весь каталог)
     cart: new Map(),
-    activeCategory: null
+    activeCategory: null,
+    orderKey: null // Idempotency-Key заказа: один на корзину, повторы отправки идут с ним же
   };
 
   function $(sel) { return document.querySelector(sel); }
 
+  function generateOrderKey() {
+    if (window.crypto && window.crypto.randomUUID) return window.crypto.randomUUID();
+    var key = Date.now().toString(16) + '-';
+    for (var i = 0; i < 4; i++) key += Math.floor(Math.random() * 0x100000000).toString(16);
+    return key;
+  }
+
   function getSelectedAddress() {
     var addresses = state.cafe.addresses || [];
     var idx = state.cafe.selectedAddressIndex || 0;
@@ -179,6 +188,25 @@
     renderMenu();
     updateOrderPanel();
     updateCartSummary();
+
+    // Догружаем меню ресторана, если при старте оно не пришло
+    var restaurantId = getSelectedRestaurantId();
+    if (restaurantId) {
+      rememberRestaurantId(restaurantId);
+      if (state.loadedRestaurants && !state.loadedRestaurants[restaurantId]) {
+        loadRestaurantMenu(restaurantId).then(function () {
+          renderCategories();
+          renderMenu();
+        });
+      }
+    }
+  }
+
+  function getSelectedRestaurantId() {
+    var selectedAddress = getSelectedAddress();
+    if (!selectedAddress || !selectedAddress.id) return null;
+    var match = selectedAddress.id.match(/restaurant_(\d+)/);
+    return match ? parseInt(match[1]) : null;
   }
 
   function renderCategories() {
@@ -406,6 +434,69 @@
     });
     totalEl.textContent = formatPrice(total);
     panel.hidden = state.cart.size === 0;
+    state.orderKey = null; // Корзина изменилась - это уже другой заказ
+    scheduleCartQuote();
+  }
+
+  // Сверка корзины с сервером: цены со скидками и доступность по каталогу
+  var quoteTimer = null;
+  var quoteSeq = 0;
+
+  function scheduleCartQuote() {
+    if (quoteTimer) clearTimeout(quoteTimer);
+    quoteSeq += 1;
+    if (state.cart.size === 0) return;
+    quoteTimer = setTimeout(quoteCart, 300);
+  }
+
+  function quoteCart() {
+    quoteTimer = null;
+    var seq = quoteSeq;
+    var items = [];
+    state.cart.forEach(function (entry) { items.push({ id: entry.item.id, qty: entry.qty }); });
+    // Для Прода
+    var apiUrl = 'https://onlinecustomer.ru/api/cart/quote';
+    // Для Теста
+    //    var apiUrl = 'http://localhost:8000/api/cart/quote';
+    requestCompat(apiUrl, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ items: items, restaurant_id: getSelectedRestaurantId() })
+    }).then(function (response) {
+      if (!response.ok) return null;
+      return response.json();
+    }).then(function (quote) {
+      // Корзина успела измениться - ответ устарел
+      if (!quote || seq !== quoteSeq) return;
+      var changed = false;
+      quote.items.forEach(function (line) {
+        var entry = state.cart.get(line.id);
+        if (entry && entry.item.price !== line.price) {
+          entry.item.price = line.price;
+          changed = true;
+        }
+      });
+      var removed = [];
+      quote.unavailable.forEach(function (line) {
+        var entry = state.cart.get(line.id);
+        if (entry) {
+          removed.push(entry.item.name);
+          state.cart.delete(line.id);
+          changed = true;
+        }
+      });
+      if (changed) {
+        renderMenu();
+        updateOrderPanel();
+        updateCartSummary();
+      }
+      if (removed.length) {
+        showNotification('Корзина обновлена', 'Больше недоступны: ' + removed.join(', '));
+      }
+    }).catch(function (error) {
+      // Без сверки заказ все равно будет пересчитан сервером
+      console.warn('Не удалось рассчитать корзину:', error);
+    });
   }
 
   function sendOrder() {
@@ -447,6 +538,8 @@
       };
     }
     
+    if (!state.orderKey) state.orderKey = generateOrderKey();
+
     console.log('Отправляем заказ:', orderData);
     
     // Отправляем POST-запрос на API админ-панели
@@ -458,7 +551,8 @@
     requestCompat(apiUrl, {
       method: 'POST',
       headers: {
-        'Content-Type': 'application/json'
+        'Content-Type': 'application/json',
+        'Idempotency-Key': state.orderKey
       },
       body: JSON.stringify(orderData)
     }).then(function (response) {
@@ -469,6 +563,7 @@
         console.log('Response data:', data);
         
         if (response.ok && data.status === 'success') {
+          state.orderKey = null;
           if (tg) {
             showNotification('Успех', 'Заказ успешно отправлен!', function() {
               if (tg.close) tg.close();
@@ -478,6 +573,11 @@
           }
         } else {
           var errorMsg = data.message || 'Неизвестная ошибка';
+          if (response.status === 429) {
+            // Сервер перегружен: повтор с тем же Idempotency-Key не создаст второй заказ
+            var retryAfter = response.headers && response.headers.get ? response.headers.get('Retry-After') : null;
+            errorMsg = 'Сервер перегружен, повторите через ' + (retryAfter || 1) + ' с';
+          }
           console.error('API error:', errorMsg);
           throw new Error('Ошибка API: ' + errorMsg);
         }
@@ -544,30 +644,51 @@
     });
   }
 
+  function applyRestaurants(restaurants) {
+    if (!restaurants || !Array.isArray(restaurants)) return;
+    // Преобразуем данные ресторанов в формат адресов
+    state.cafe.addresses = restaurants.map(function(restaurant, index) {
+      return {
+        id: 'restaurant_' + restaurant.id,
+        label: restaurant.name + ' - ' + restaurant.address,
+        map: 'https://yandex.ru/maps/?text=' + encodeURIComponent(restaurant.address)
+      };
+    });
+
+    // Обновляем название кафе
+    if (restaurants.length > 0) {
+      state.cafe.name = restaurants[0].name;
+    }
+  }
+
+  function productPrice(item) {
+    // effective_price уже учитывает скидки; старые ответы и menu.json его не содержат
+    if (item.effective_price !== undefined && item.effective_price !== null) return item.effective_price;
+    return item.discount_price || item.price;
+  }
+
+  function mapCategories(categories) {
+    return categories.map(function(category) {
+      return {
+        id: category.id,
+        name: category.name,
+        slug: category.name.toLowerCase().replace(/\s+/g, '_'),
+        restaurant_id: category.restaurant_id
+      };
+    });
+  }
+
   function loadRestaurants() {
     // Для Прода
         var apiUrl = 'https://onlinecustomer.ru/api/restaurants';
     // Для Теста
 //    var apiUrl = 'http://localhost:8000/api/restaurants';
 
-    return requestCompat(apiUrl, { cache: 'no-store' })
+    // no-cache: браузер перепроверяет ответ по ETag и получает 304, если каталог не менялся
+    return requestCompat(apiUrl, { cache: 'no-cache' })
       .then(function (res) { return res.json(); })
       .then(function (data) {
-        if (data.restaurants && Array.isArray(data.restaurants)) {
-          // Преобразуем данные ресторанов в формат адресов
-          state.cafe.addresses = data.restaurants.map(function(restaurant, index) {
-            return {
-              id: 'restaurant_' + restaurant.id,
-              label: restaurant.name + ' - ' + restaurant.address,
-              map: 'https://yandex.ru/maps/?text=' + encodeURIComponent(restaurant.address)
-            };
-          });
-          
-          // Обновляем название кафе
-          if (data.restaurants.length > 0) {
-            state.cafe.name = data.restaurants[0].name;
-          }
-        }
+        applyRestaurants(data.restaurants);
       })
       .catch(function (error) {
         console.warn('Ошибка загрузки ресторанов:', error);
@@ -581,18 +702,11 @@
     // Для Теста
 //    var apiUrl = 'http://localhost:8000/api/categories';
 
-    return requestCompat(apiUrl, { cache: 'no-store' })
+    return requestCompat(apiUrl, { cache: 'no-cache' })
       .then(function (res) { return res.json(); })
       .then(function (data) {
         if (data.categories && Array.isArray(data.categories)) {
-          return data.categories.map(function(category) {
-            return {
-              id: category.id,
-              name: category.name,
-              slug: category.name.toLowerCase().replace(/\s+/g, '_'),
-              restaurant_id: category.restaurant_id
-            };
-          });
+          return mapCategories(data.categories);
         }
         return [];
       })
@@ -614,7 +728,7 @@
     // Для Теста
 //    var apiUrl = 'http://localhost:8000/api/products';
 
-    return firstSuccessfulFetch([apiUrl, './menu.json', '/menu.json'], { cache: 'no-store' })
+    return firstSuccessfulFetch([apiUrl, './menu.json', '/menu.json'], { cache: 'no-cache' })
       .then(function (res) { return res.json(); })
       .then(function (data) {
         var items;
@@ -626,7 +740,7 @@
             return {
               id: item.id,
               name: item.name,
-              price: item.discount_price || item.price,
+              price: productPrice(item),
               description: item.description,
               category: item.category ? item.category.name.toLowerCase().replace(/\s+/g, '_') : 'other',
               size: item.size,
@@ -659,6 +773,145 @@
       });
   }
 
+  function getRememberedRestaurantId() {
+    try {
+      var value = parseInt(window.localStorage.getItem('restaurant_id'));
+      return isNaN(value) ? null : value;
+    } catch (e) { return null; }
+  }
+
+  function rememberRestaurantId(restaurantId) {
+    try { window.localStorage.setItem('restaurant_id', String(restaurantId)); } catch (e) {}
+  }
+
+  function mapCompactProducts(products, categories) {
+    var categorySlugs = {};
+    categories.forEach(function (category) { categorySlugs[category.id] = category.slug; });
+    return products.map(function (item) {
+      return {
+        id: item.id,
+        name: item.name,
+        price: productPrice(item),
+        description: item.description,
+        category: categorySlugs[item.category_id] || 'other',
+        size: item.size,
+        photo: item.photo,
+        is_available: true,
+        stock: item.stock,
+        restaurant_id: item.restaurant_id
+      };
+    });
+  }
+
+  var catalogManifestPromise = null;
+
+  function loadCatalogManifest() {
+    // Манифест статической выгрузки каталога (nginx отдает файлы без обращения к API).
+    // Загружается один раз; если выгрузки нет, возвращает null
+// Для Прода
+    var manifestUrl = 'https://onlinecustomer.ru/catalog/manifest.json';
+    // Для Теста
+//    var manifestUrl = 'http://localhost/catalog/manifest.json';
+    if (!catalogManifestPromise) {
+      catalogManifestPromise = requestCompat(manifestUrl, { cache: 'no-cache' })
+        .then(function (res) {
+          if (!res.ok) throw new Error('HTTP ' + res.status);
+          return res.json();
+        })
+        .then(function (manifest) {
+          manifest.baseUrl = manifestUrl.replace(/manifest\.json$/, '');
+          return manifest;
+        })
+        .catch(function () { return null; });
+    }
+    return catalogManifestPromise;
+  }
+
+  function requestCatalog(section, key, apiUrl) {
+    // Сначала файл из статической выгрузки, при его отсутствии - API
+    function fromApi() { return requestCompat(apiUrl, { cache: 'no-cache' }); }
+    return loadCatalogManifest().then(function (manifest) {
+      var file = manifest && manifest[section] && manifest[section][key];
+      if (!file) return fromApi();
+      // Имя файла содержит хеш содержимого, HTTP-кеш для него всегда актуален
+      return requestCompat(manifest.baseUrl + file).then(function (res) {
+        return res.ok ? res : fromApi();
+      }, fromApi);
+    });
+  }
+
+  function loadBootstrap(restaurantId) {
+    // Рестораны, категории и меню одним запросом вместо трех.
+    // Если ресторан уже выбирался раньше, загружаем только его меню
+// Для Прода
+    var apiUrl = 'https://onlinecustomer.ru/api/bootstrap';
+    // Для Теста
+//    var apiUrl = 'http://localhost:8000/api/bootstrap';
+    if (restaurantId) apiUrl += '?restaurant_id=' + restaurantId;
+
+    return requestCatalog('bootstrap', restaurantId ? String(restaurantId) : 'all', apiUrl)
+      .then(function (res) {
+        if (res.status === 404 && restaurantId) return null; // ресторан удален - берем весь каталог
+        if (!res.ok) throw new Error('HTTP ' + res.status);
+        return res.json();
+      })
+      .then(function (data) {
+        if (data === null) return loadBootstrap(null);
+        if (!Array.isArray(data.restaurants) || !Array.isArray(data.categories) || !Array.isArray(data.products)) {
+          throw new Error('Invalid data format');
+        }
+        applyRestaurants(data.restaurants);
+        state.categories = mapCategories(data.categories);
+        state.menu = mapCompactProducts(data.products, state.categories);
+
+        state.loadedRestaurants = {};
+        if (restaurantId) {
+          state.loadedRestaurants[restaurantId] = true;
+          state.cafe.addresses.forEach(function (addr, i) {
+            if (addr.id === 'restaurant_' + restaurantId) state.cafe.selectedAddressIndex = i;
+          });
+        } else {
+          data.restaurants.forEach(function (restaurant) { state.loadedRestaurants[restaurant.id] = true; });
+        }
+      })
+      .catch(function (error) {
+        console.warn('Ошибка загрузки bootstrap, загружаем данные по отдельности:', error);
+        return Promise.all([
+          loadRestaurants(),
+          loadCategories(),
+          loadMenu()
+        ]).then(function (results) {
+          // results[0] - restaurants, results[1] - categories, results[2] - menu
+          state.categories = results[1] || [];
+          state.loadedRestaurants = null; // загружен весь каталог
+        });
+      });
+  }
+
+  function loadRestaurantMenu(restaurantId) {
+    // Меню одного ресторана - сервер уже отфильтровал доступность и ресторан
+// Для Прода
+    var apiUrl = 'https://onlinecustomer.ru/api/restaurants/' + restaurantId + '/menu';
+    // Для Теста
+//    var apiUrl = 'http://localhost:8000/api/restaurants/' + restaurantId + '/menu';
+
+    return requestCatalog('menus', String(restaurantId), apiUrl)
+      .then(function (res) {
+        if (!res.ok) throw new Error('HTTP ' + res.status);
+        return res.json();
+      })
+      .then(function (data) {
+        var categories = mapCategories(data.categories || []);
+        var items = mapCompactProducts(data.products || [], categories);
+        state.categories = state.categories.filter(function (c) { return c.restaurant_id !== restaurantId; }).concat(categories);
+        state.menu = state.menu.filter(function (i) { return i.restaurant_id !== restaurantId; }).concat(items);
+        if (state.loadedRestaurants) state.loadedRestaurants[restaurantId] = true;
+      })
+      .catch(function (error) {
+        console.warn('Ошибка загрузки меню ресторана:', error);
+      });
+  }
+
   function setActiveCategory(slug) {
     state.activeCategory = slug;
     var chips = document.querySelectorAll('.brand-menu .chip');
@@ -746,15 +999,12 @@
     }
     renderCafeInfo();
     
-    // Загружаем данные о ресторанах, категориях и меню параллельно
-    Promise.all([
-      loadRestaurants(),
-      loadCategories(),
-      loadMenu()
-    ]).then(function (results) {
-      // results[0] - restaurants, results[1] - categories, results[2] - menu
-      state.categories = results[1] || [];
-      
+    // Загружаем рестораны, категории и меню одним запросом
+    loadBootstrap(getRememberedRestaurantId()).then(function () {
+      // Следующий запуск загрузит меню только выбранного ресторана
+      var restaurantId = getSelectedRestaurantId();
+      if (restaurantId) rememberRestaurantId(restaurantId);
+
       renderCafeInfo(); // Обновляем информацию о кафе после загрузки ресторанов
       renderCategories(); // Отображаем категории (внутри уже вызывается setupCategoryHandlers)
       renderMenu();
@@ -20,4 +20,25 @@ class Settings:
     ADMIN_PORT = int(os.getenv('ADMIN_PORT', 8000))
     BOT_PORT = int(os.getenv('BOT_PORT', 8001))
 
+    # Database connection pool
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))
+
+    # Admission control for write routes (0 - DB_POOL_SIZE; overflow stays for reads)
+    WRITE_CONCURRENCY = int(os.getenv('WRITE_CONCURRENCY', 0))
+    WRITE_QUEUE_SIZE = int(os.getenv('WRITE_QUEUE_SIZE', 0))
+    WRITE_QUEUE_TIMEOUT = float(os.getenv('WRITE_QUEUE_TIMEOUT', 0.5))
+
+    # Group commit for orders: orders arriving within the window share one transaction (0 - disabled)
+    ORDER_BATCH_WINDOW_MS = float(os.getenv('ORDER_BATCH_WINDOW_MS', 0))
+    ORDER_BATCH_MAX_SIZE = int(os.getenv('ORDER_BATCH_MAX_SIZE', 50))
+
+    # API pagination
+    API_PAGE_SIZE = int(os.getenv('API_PAGE_SIZE', 50))
+    API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', 200))
+
+    # Static catalog export for nginx (empty - disabled)
+    CATALOG_EXPORT_DIR = os.getenv('CATALOG_EXPORT_DIR', '')
+
 settings = Settings()
@@ -1,9 +1,17 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Float, Text
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, DateTime, ForeignKey, Float, Text, Sequence, JSON, Index, text
 from sqlalchemy.orm import relationship, declarative_base
 from sqlalchemy.sql import func
 
 Base = declarative_base()
 
+# Общая последовательность версий каталога: любое изменение товара, категории
+# или скидки получает новый номер, по которому клиенты забирают только дельту
+catalog_version_seq = Sequence('catalog_version_seq', metadata=Base.metadata)
+CATALOG_VERSION = text("nextval('catalog_version_seq')")
+# Транзакция, записавшая версию: по ней дельта-синхронизация не пропускает
+# строки транзакций, которые взяли версию раньше, а закоммитились позже
+CATALOG_XID = text("pg_current_xact_id()::text::bigint")
+
 class User(Base):
     __tablename__ = 'users'
     id = Column(Integer, primary_key=True)
@@ -19,6 +27,7 @@ class Restaurant(Base):
     id = Column(Integer, primary_key=True)
     name = Column(String(128), nullable=False)
     address = Column(String(256), nullable=False)
+    telegram_chat_id = Column(String(64))  # чат кухни для уведомлений, NULL - общий TELEGRAM_CHAT_ID
     categories = relationship('Category', back_populates='restaurant')
     products = relationship('Product', back_populates='restaurant')
     discounts = relationship('Discount', back_populates='restaurant')
@@ -29,6 +38,8 @@ class Category(Base):
     id = Column(Integer, primary_key=True)
     name = Column(String(64), nullable=False)
     restaurant_id = Column(Integer, ForeignKey('restaurants.id'), nullable=True)
+    version = Column(BigInteger, nullable=False, server_default=CATALOG_VERSION, onupdate=CATALOG_VERSION, index=True)
+    version_xid = Column(BigInteger, nullable=False, server_default=CATALOG_XID, onupdate=CATALOG_XID, index=True)
     products = relationship('Product', back_populates='category')
     restaurant = relationship('Restaurant', back_populates='categories')
 
@@ -45,6 +56,8 @@ class Product(Base):
     photo = Column(String(256))
     is_available = Column(Boolean, default=True)
     stock = Column(Integer, default=0)
+    version = Column(BigInteger, nullable=False, server_default=CATALOG_VERSION, onupdate=CATALOG_VERSION, index=True)
+    version_xid = Column(BigInteger, nullable=False, server_default=CATALOG_XID, onupdate=CATALOG_XID, index=True)
     category = relationship('Category', back_populates='products')
     order_items = relationship('OrderItem', back_populates='product')
     restaurant = relationship('Restaurant', back_populates='products')
@@ -57,13 +70,26 @@ class Discount(Base):
     date_start = Column(DateTime)
     date_end = Column(DateTime)
     is_active = Column(Boolean, default=True)
+    percent = Column(Float)  # размер скидки в процентах, без него скидка только информационная
     category_id = Column(Integer, ForeignKey('categories.id'), nullable=True)
     product_id = Column(Integer, ForeignKey('products.id'), nullable=True)
     restaurant_id = Column(Integer, ForeignKey('restaurants.id'), nullable=True)
+    version = Column(BigInteger, nullable=False, server_default=CATALOG_VERSION, onupdate=CATALOG_VERSION, index=True)
+    version_xid = Column(BigInteger, nullable=False, server_default=CATALOG_XID, onupdate=CATALOG_XID, index=True)
     category = relationship('Category')
     product = relationship('Product')
     restaurant = relationship('Restaurant', back_populates='discounts')
 
+# Запись об удалении товара, категории или скидки для дельта-синхронизации
+class CatalogTombstone(Base):
+    __tablename__ = 'catalog_tombstones'
+    id = Column(Integer, primary_key=True)
+    entity = Column(String(32), nullable=False)  # product, category, discount
+    entity_id = Column(Integer, nullable=False)
+    version = Column(BigInteger, nullable=False, server_default=CATALOG_VERSION, index=True)
+    version_xid = Column(BigInteger, nullable=False, server_default=CATALOG_XID, index=True)
+    deleted_at = Column(DateTime, server_default=func.now())
+
 class Order(Base):
     __tablename__ = 'orders'
     id = Column(Integer, primary_key=True)
@@ -75,6 +101,7 @@ class Order(Base):
     created_at = Column(DateTime, server_default=func.now())
     paid_at = Column(DateTime)
     admin_comment = Column(Text)
+    stock_reserved = Column(Boolean, nullable=False, server_default=text('false'))  # остатки списаны и еще могут вернуться при отмене
     user = relationship('User', back_populates='orders')
     items = relationship('OrderItem', back_populates='order')
     receipt = relationship('Receipt', uselist=False, back_populates='order')
@@ -99,6 +126,57 @@ class Receipt(Base):
     uploaded_at = Column(DateTime, server_default=func.now())
     order = relationship('Order', back_populates='receipt')
 
+class NotificationOutbox(Base):
+    """Уведомления, записанные в одной транзакции с заказом и ожидающие отправки"""
+    __tablename__ = 'notification_outbox'
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(32), nullable=False)  # order
+    payload = Column(JSON, nullable=False)
+    attempts = Column(Integer, nullable=False, server_default=text('0'))
+    last_error = Column(Text)
+    available_at = Column(DateTime, nullable=False, server_default=func.now())  # не отправлять раньше
+    created_at = Column(DateTime, server_default=func.now())
+    sent_at = Column(DateTime)
+    __table_args__ = (
+        # Диспетчер читает только неотправленные записи
+        Index('ix_notification_outbox_pending', 'available_at', postgresql_where=text('sent_at IS NULL')),
+    )
+
+class NotificationDeadLetter(Base):
+    """Уведомления, которые не удалось отправить за NotificationOutbox.attempts попыток"""
+    __tablename__ = 'notification_dead_letters'
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(32), nullable=False)
+    payload = Column(JSON, nullable=False)
+    attempts = Column(Integer, nullable=False)
+    last_error = Column(Text)
+    created_at = Column(DateTime)  # когда уведомление попало в outbox
+    failed_at = Column(DateTime, server_default=func.now())
+
+class BroadcastCampaign(Base):
+    """Рассылка подписчикам с контрольной точкой для продолжения после перезапуска"""
+    __tablename__ = 'broadcast_campaigns'
+    id = Column(Integer, primary_key=True)
+    discount_id = Column(Integer, ForeignKey('discounts.id', ondelete='SET NULL'), nullable=True)
+    message = Column(Text, nullable=False)  # HTML-сообщение, собирается при создании кампании
+    status = Column(String(16), nullable=False, server_default='running')  # running, paused, done
+    last_user_id = Column(Integer, nullable=False, server_default=text('0'))  # всем с id до него рассылка обработана
+    sent = Column(Integer, nullable=False, server_default=text('0'))
+    failed = Column(Integer, nullable=False, server_default=text('0'))
+    blocked = Column(Integer, nullable=False, server_default=text('0'))  # заблокировали бота и отписаны
+    leased_by = Column(String(32))  # процесс, который отправляет кампанию
+    leased_until = Column(DateTime)
+    created_at = Column(DateTime, server_default=func.now())
+    finished_at = Column(DateTime)
+
+class IdempotencyKey(Base):
+    """Ответ на создание заказа по ключу идемпотентности клиента"""
+    __tablename__ = 'idempotency_keys'
+    key = Column(String(64), primary_key=True)
+    response = Column(JSON, nullable=False)
+    created_at = Column(DateTime, server_default=func.now())
+    expires_at = Column(DateTime, nullable=False, index=True)
+
 class AdminUser(Base):
     __tablename__ = 'admin_users'
     id = Column(Integer, primary_key=True)
@@ -1,18 +1,47 @@
 """
 Модуль для отправки уведомлений в Telegram
+
+Уведомления о заказах не отправляются сразу, а встают в очередь своего
+чата. Очередь отправляет сообщения не чаще, чем позволяет token bucket
+чата (TELEGRAM_CHAT_RATE сообщений в минуту, всплеск до
+TELEGRAM_CHAT_BURST): Telegram ограничивает группы примерно 20
+сообщениями в минуту. Ответ 429 (RetryAfter) останавливает очередь чата
+на retry_after секунд, после чего то же сообщение отправляется снова.
+
+Если заказов в очереди больше, чем можно отправить сейчас, несколько
+заказов объединяются в одну сводку: в час пик уведомления приходят с
+задержкой и реже, но не теряются.
+
+deliver_order_notification возвращает ошибку отправки: повторами с паузой
+и переносом в dead letters занимается outbox (admin_service.admin.notification_outbox).
 """
 import os
 import asyncio
-from typing import Optional, Dict, Any
+import html
+import time
+from collections import deque
+from datetime import timedelta
+from typing import Optional, Dict, Any, Deque, List, Tuple
 import logging
 
 try:
     from telegram import Bot
-    from telegram.error import TelegramError
+    from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+    from telegram.request import HTTPXRequest
 except ImportError:
     Bot = None
+    HTTPXRequest = None
     TelegramError = Exception
 
+    class RetryAfter(Exception):
+        retry_after = 0
+
+    class BadRequest(Exception):
+        pass
+
+    class Forbidden(Exception):
+        pass
+
 # Загружаем переменные окружения из .env файла (если он существует)
 try:
     from dotenv import load_dotenv
@@ -24,6 +53,217 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# Предел длины сообщения Telegram (4096) с запасом
+MAX_MESSAGE_LENGTH = 4000
+
+# Заказов в одной сводке и длина состава заказа в ней
+DIGEST_MAX_ORDERS = 20
+DIGEST_ITEMS_LENGTH = 300
+
+# Сколько заказ ждет в очереди чата, прежде чем считается неотправленным
+QUEUE_TIMEOUT = 120.0
+
+# Таймаут одного запроса send_message
+SEND_TIMEOUT = 30.0
+
+
+class NotSent(Exception):
+    """Сообщение не отправлено по причине, не связанной с его содержимым"""
+
+
+def is_permanent_error(error: BaseException) -> bool:
+    """
+    Повтор не поможет: Telegram отклонил сообщение (BadRequest) или бот
+    не может писать в чат (Forbidden)
+    """
+    return isinstance(error, (BadRequest, Forbidden))
+
+
+def _escape(value: Any) -> str:
+    """Значение из заказа для сообщения с parse_mode='HTML': <, > и & ломают разметку (BadRequest)"""
+    return html.escape(str(value))
+
+
+def _seconds(value: Any) -> float:
+    """retry_after в секундах (int в старых версиях python-telegram-bot, timedelta в новых)"""
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    return float(value or 0)
+
+
+class TokenBucket:
+    """Ограничение частоты сообщений: rate в секунду, всплеск до capacity"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self) -> int:
+        """Сколько сообщений можно отправить без ожидания"""
+        self._refill()
+        if time.monotonic() < self.paused_until:
+            return 0
+        return int(self.tokens)
+
+    def delay(self) -> float:
+        """Сколько секунд ждать следующего сообщения"""
+        self._refill()
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        """Израсходовать токен на отправленное сообщение"""
+        self._refill()
+        self.tokens -= 1
+
+    def pause(self, seconds: float):
+        """Остановить отправку (ответ 429 с retry_after)"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+
+
+class ChatQueue:
+    """Очередь уведомлений одного чата с ограничением частоты"""
+
+    def __init__(self, sender: "TelegramSender", chat_id: str):
+        self.sender = sender
+        self.chat_id = chat_id
+        self.bucket = TokenBucket(sender.chat_rate / 60, sender.chat_burst)
+        # (данные заказа, ответ вызывающему: None - сообщение с заказом отправлено, иначе ошибка)
+        self._pending: Deque[Tuple[Dict[str, Any], asyncio.Future]] = deque()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+        self.messages = 0
+        self.digests = 0
+        self.retry_after = 0
+
+    def put(self, order_data: Dict[str, Any]) -> asyncio.Future:
+        """Поставить заказ в очередь"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((order_data, future))
+        self._wakeup.set()
+        return future
+
+    def stats(self) -> Dict[str, Any]:
+        """Длина очереди и счетчики"""
+        return {
+            "queued": len(self._pending),
+            "available": self.bucket.available(),
+            "messages": self.messages,
+            "digests": self.digests,
+            "retry_after": self.retry_after
+        }
+
+    async def close(self):
+        """Остановить очередь; неотправленные заказы получают ошибку"""
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        while self._pending:
+            _, future = self._pending.popleft()
+            if not future.done():
+                future.set_result(NotSent("Очередь чата остановлена"))
+
+    def _take(self) -> List[Tuple[Dict[str, Any], asyncio.Future]]:
+        """Заказы для следующего сообщения: один или сводка, если очередь больше бюджета"""
+        while self._pending and self._pending[0][1].done():
+            # Вызывающий перестал ждать (QUEUE_TIMEOUT)
+            self._pending.popleft()
+        if not self._pending:
+            return []
+
+        if len(self._pending) <= self.bucket.available():
+            return [self._pending.popleft()]
+
+        batch = []
+        length = 0
+        while self._pending and len(batch) < DIGEST_MAX_ORDERS:
+            order_data, future = self._pending[0]
+            if future.done():
+                self._pending.popleft()
+                continue
+            line_length = len(self.sender._format_digest_line(order_data))
+            if batch and length + line_length > MAX_MESSAGE_LENGTH:
+                break
+            batch.append(self._pending.popleft())
+            length += line_length
+        return batch
+
+    async def _run(self):
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            delay = self.bucket.delay()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            batch = self._take()
+            if not batch:
+                continue
+            orders = [order_data for order_data, _ in batch]
+            if len(orders) == 1:
+                text = self.sender._format_order_message(orders[0])
+            else:
+                text = self.sender._format_digest(orders)
+
+            self.bucket.take()
+            error: Optional[BaseException] = None
+            try:
+                await self.sender._send_message(self.chat_id, text)
+            except RetryAfter as e:
+                # Telegram просит подождать: та же пачка уйдет первой после паузы
+                seconds = _seconds(e.retry_after)
+                logger.warning(f"⏳ Telegram ограничил чат {self.chat_id}: повтор через {seconds:g} с")
+                self.retry_after += 1
+                self.bucket.pause(seconds)
+                self._pending.extendleft(reversed(batch))
+                continue
+            except asyncio.TimeoutError:
+                logger.error(f"⏰ Таймаут при отправке сообщения в Telegram для заказов {self._ids(orders)}")
+                error = NotSent("Таймаут отправки в Telegram")
+            except TelegramError as e:
+                logger.error(f"❌ Ошибка отправки сообщения в Telegram: {e}")
+                error = e
+            except Exception as e:
+                logger.error(f"💥 Неожиданная ошибка при отправке в Telegram: {e}")
+                error = e
+
+            if error is not None and len(orders) > 1 and is_permanent_error(error):
+                # Отклонена сводка, а не конкретный заказ: каждый повторится отдельно
+                error = NotSent(f"Сводка не отправлена: {error}")
+            if error is None:
+                self.messages += 1
+                if len(orders) > 1:
+                    self.digests += 1
+                logger.info(f"✅ Уведомление о заказах отправлено в Telegram: {self._ids(orders)}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(error)
+
+    @staticmethod
+    def _ids(orders: List[Dict[str, Any]]) -> str:
+        return ", ".join(str(order_data.get('order_id', 'unknown')) for order_data in orders)
+
 
 class TelegramSender:
     """Класс для отправки сообщений в Telegram"""
@@ -38,8 +278,18 @@ class TelegramSender:
         """
         self.bot_token = bot_token or os.getenv('TELEGRAM_BOT_TOKEN')
         self.chat_id = chat_id or os.getenv('TELEGRAM_CHAT_ID', '-1003068821769')
+        self.chat_rate = float(os.getenv('TELEGRAM_CHAT_RATE', 20))
+        self.chat_burst = int(os.getenv('TELEGRAM_CHAT_BURST', 3))
+        self.pool_size = int(os.getenv('TELEGRAM_POOL_SIZE', 4))
         self.bot = None
         self.initialization_error = None
+        # Очереди по чатам; создаются в цикле событий, где отправляются уведомления
+        self._queues: Dict[str, ChatQueue] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._started = False
+        # Запросов send_message в работе
+        self.in_flight = 0
+        self.requests = 0
         
         # Расширенная диагностика для отладки
         logger.info(f"TELEGRAM_BOT_TOKEN: {'установлен' if self.bot_token else 'НЕ установлен'}")
@@ -52,7 +302,9 @@ class TelegramSender:
         
         if self.bot_token and Bot:
             try:
-                self.bot = Bot(token=self.bot_token)
+                # Пул keep-alive соединений с Bot API живет столько же, сколько бот:
+                # уведомление стоит одного запроса по уже открытому соединению
+                self.bot = Bot(token=self.bot_token, request=HTTPXRequest(connection_pool_size=self.pool_size))
                 logger.info("Telegram Bot инициализирован успешно")
             except Exception as e:
                 logger.error(f"Ошибка инициализации Telegram бота: {e}")
@@ -74,48 +326,113 @@ class TelegramSender:
         """Возвращает ошибку инициализации, если есть"""
         return self.initialization_error
     
-    async def send_order_notification(self, order_data: Dict[str, Any]) -> bool:
+    def _queue(self, chat_id: str) -> ChatQueue:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Очереди прежнего цикла событий (asyncio.run в скриптах) больше не работают
+            self._queues = {}
+            self._loop = loop
+        queue = self._queues.get(chat_id)
+        if queue is None:
+            queue = self._queues[chat_id] = ChatQueue(self, chat_id)
+        return queue
+
+    async def start(self):
         """
-        Отправляет уведомление о новом заказе в Telegram
+        Открыть соединения с Bot API (вызывается при старте приложения)
+        
+        Клиент HTTP привязан к циклу событий, поэтому бот открывается один раз
+        в цикле приложения и закрывается в close().
+        """
+        if not self.bot or self._started:
+            return
+        try:
+            await self.bot.initialize()
+            self._started = True
+            logger.info("Соединение с Telegram Bot API открыто")
+        except Exception as e:
+            # Бот откроет соединение при первой отправке
+            logger.warning(f"Не удалось открыть соединение с Telegram Bot API: {e}")
+
+    async def _send_message(self, chat_id: str, text: str):
+        self.in_flight += 1
+        self.requests += 1
+        try:
+            await asyncio.wait_for(
+                self.bot.send_message(
+                    chat_id=chat_id,
+                    text=text,
+                    parse_mode='HTML'
+                ),
+                timeout=SEND_TIMEOUT
+            )
+        finally:
+            self.in_flight -= 1
+
+    async def deliver_order_notification(
+            self,
+            order_data: Dict[str, Any],
+            chat_id: Optional[str] = None
+    ) -> Optional[BaseException]:
+        """
+        Отправляет уведомление о новом заказе в Telegram через очередь чата
+        
+        При очереди больше бюджета чата заказ уходит в сводке вместе с другими.
+        Очереди разных чатов отправляют параллельно, каждая в своем лимите.
         
         Args:
             order_data: Данные заказа
+            chat_id: Чат ресторана, None - общий TELEGRAM_CHAT_ID
             
         Returns:
-            bool: True если сообщение отправлено успешно, False в противном случае
+            None если сообщение с заказом отправлено, иначе ошибка отправки
+            (is_permanent_error - повтор не поможет)
         """
         if not self.bot:
             error_msg = self.get_initialization_error() or "Telegram Bot не инициализирован"
             logger.warning(f"Telegram Bot не инициализирован: {error_msg}")
-            return False
+            return NotSent(error_msg)
         
+        chat_id = chat_id or self.chat_id
+        logger.info(f"Ставим в очередь чата {chat_id} заказ {order_data.get('order_id', 'unknown')}")
+        future = self._queue(chat_id).put(order_data)
         try:
-            # Формируем сообщение о заказе
-            message = self._format_order_message(order_data)
-            logger.info(f"Отправляем сообщение в чат {self.chat_id} для заказа {order_data.get('order_id', 'unknown')}")
-            
-            # Отправляем сообщение с таймаутом
-            await asyncio.wait_for(
-                self.bot.send_message(
-                    chat_id=self.chat_id,
-                    text=message,
-                    parse_mode='HTML'
-                ),
-                timeout=30.0  # 30 секунд таймаут
-            )
-            
-            logger.info(f"✅ Уведомление о заказе отправлено в Telegram: {order_data.get('order_id', 'unknown')}")
-            return True
-            
+            return await asyncio.wait_for(future, QUEUE_TIMEOUT)
         except asyncio.TimeoutError:
-            logger.error(f"⏰ Таймаут при отправке сообщения в Telegram для заказа {order_data.get('order_id', 'unknown')}")
-            return False
-        except TelegramError as e:
-            logger.error(f"❌ Ошибка отправки сообщения в Telegram: {e}")
-            return False
-        except Exception as e:
-            logger.error(f"💥 Неожиданная ошибка при отправке в Telegram: {e}")
-            return False
+            logger.error(f"⏰ Заказ {order_data.get('order_id', 'unknown')} не дождался очереди Telegram")
+            return NotSent("Заказ не дождался очереди Telegram")
+    
+    async def send_order_notification(self, order_data: Dict[str, Any]) -> bool:
+        """
+        Отправляет уведомление о новом заказе в Telegram
+        
+        Args:
+            order_data: Данные заказа
+            
+        Returns:
+            bool: True если сообщение отправлено успешно, False в противном случае
+        """
+        return await self.deliver_order_notification(order_data) is None
+    
+    def stats(self) -> Dict[str, Any]:
+        """Запросы к Bot API в работе и очереди чатов: длина, доступные сообщения, счетчики"""
+        return {
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "chats": {chat_id: queue.stats() for chat_id, queue in self._queues.items()}
+        }
+    
+    async def close(self):
+        """Остановить очереди чатов и закрыть соединения с Bot API (вызывается при остановке приложения)"""
+        queues, self._queues = self._queues, {}
+        for queue in queues.values():
+            await queue.close()
+        if self._started:
+            self._started = False
+            try:
+                await self.bot.shutdown()
+            except Exception as e:
+                logger.warning(f"Ошибка закрытия соединения с Telegram Bot API: {e}")
     
     def _format_order_message(self, order_data: Dict[str, Any]) -> str:
         """
@@ -134,26 +451,27 @@ class TelegramSender:
             name = f"{user.get('first_name', '')} {user.get('last_name', '')}".strip()
             username = user.get('username', '')
             if username:
-                user_info = f"👤 <b>Клиент:</b> {name} (@{username})\n"
+                user_info = f"👤 <b>Клиент:</b> {_escape(name)} (@{_escape(username)})\n"
             else:
-                user_info = f"👤 <b>Клиент:</b> {name}\n"
+                user_info = f"👤 <b>Клиент:</b> {_escape(name)}\n"
         else:
             user_info = "👤 <b>Клиент:</b> Анонимный заказ\n"
         
         # Получаем адрес
-        address = order_data.get('address', 'Не указан')
+        address = _escape(order_data.get('address', 'Не указан'))
         
         # Формируем список товаров
         items_text = ""
         if order_data.get('order'):
             for item in order_data['order']:
-                items_text += f"• {item.get('name', 'Неизвестный товар')} x{item.get('qty', 1)} - {item.get('price', 0)}₽\n"
+                items_text += (f"• {_escape(item.get('name', 'Неизвестный товар'))} x{_escape(item.get('qty', 1))}"
+                               f" - {_escape(item.get('price', 0))}₽\n")
         
         # Общая сумма
-        total = order_data.get('totalSum', 0)
+        total = _escape(order_data.get('totalSum', 0))
         
         # ID заказа
-        order_id = order_data.get('order_id', 'Неизвестно')
+        order_id = _escape(order_data.get('order_id', 'Неизвестно'))
         
         # Время заказа
         timestamp = order_data.get('timestamp', '')
@@ -163,7 +481,7 @@ class TelegramSender:
                 dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
                 time_str = dt.strftime('%d.%m.%Y %H:%M')
             except:
-                time_str = timestamp
+                time_str = _escape(timestamp)
         else:
             time_str = "Неизвестно"
         
@@ -183,6 +501,32 @@ class TelegramSender:
         
         return message
     
+    def _format_digest_line(self, order_data: Dict[str, Any]) -> str:
+        """Строка заказа в сводке"""
+        items = ", ".join(
+            f"{item.get('name', 'Неизвестный товар')} x{item.get('qty', 1)}"
+            for item in order_data.get('order') or []
+        )
+        if len(items) > DIGEST_ITEMS_LENGTH:
+            items = items[:DIGEST_ITEMS_LENGTH] + "…"
+        return (
+            f"🛒 <b>#{_escape(order_data.get('order_id', 'Неизвестно'))}</b> · {_escape(order_data.get('totalSum', 0))}₽ · "
+            f"{_escape(order_data.get('address', 'Не указан'))}\n{_escape(items)}\n"
+        )
+    
+    def _format_digest(self, orders: List[Dict[str, Any]]) -> str:
+        """
+        Форматирует сводку из нескольких заказов
+        
+        Args:
+            orders: Данные заказов
+            
+        Returns:
+            str: Отформатированное сообщение
+        """
+        lines = "\n".join(self._format_digest_line(order_data) for order_data in orders)
+        return f"📦 <b>НОВЫЕ ЗАКАЗЫ: {len(orders)}</b>\n\n{lines}".strip()
+    
     async def send_test_message(self) -> bool:
         """
         Отправляет тестовое сообщение для проверки работы бота
@@ -0,0 +1,122 @@
+"""
+Ограничение одновременных запросов на запись: очередь, таймаут и 429
+"""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from admin_service.admin import admission
+from admin_service.admin.admission import RETRY_AFTER, AdmissionLimiter, Overloaded, admit_order
+from admin_service.admin import idempotency
+from admin_service.admin.idempotency import idempotency_store, order_replay
+from admin_service.admin.order_request import InvalidOrder
+
+
+def test_queue_hands_slot_to_first_waiter():
+    async def main():
+        limiter = AdmissionLimiter("test", limit=1, queue_size=2, queue_timeout=1.0)
+        await limiter.acquire()
+        order = []
+
+        async def waiter(name):
+            await limiter.acquire()
+            order.append(name)
+
+        waiters = [asyncio.create_task(waiter(name)) for name in ("a", "b")]
+        await asyncio.sleep(0)
+        assert limiter.queue_depth == 2
+
+        # Очередь заполнена - сразу отказ
+        with pytest.raises(Overloaded):
+            await limiter.acquire()
+
+        limiter.release()
+        await asyncio.sleep(0)
+        limiter.release()
+        await asyncio.gather(*waiters)
+        assert order == ["a", "b"]
+        assert limiter.in_flight == 1
+
+        limiter.release()
+        assert limiter.in_flight == 0
+        assert limiter.stats()["admitted"] == 3 and limiter.stats()["rejected"] == 1
+
+    asyncio.run(main())
+
+
+def test_queue_timeout():
+    async def main():
+        limiter = AdmissionLimiter("test", limit=1, queue_size=1, queue_timeout=0.01)
+        await limiter.acquire()
+        with pytest.raises(Overloaded):
+            await limiter.acquire()
+        assert limiter.queue_depth == 0
+        assert limiter.stats()["timed_out"] == 1
+
+        # Слот не потерян
+        limiter.release()
+        await limiter.acquire()
+        assert limiter.in_flight == 1
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_leaves_queue():
+    async def main():
+        limiter = AdmissionLimiter("test", limit=1, queue_size=1, queue_timeout=1.0)
+        await limiter.acquire()
+        task = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert limiter.queue_depth == 0
+
+        limiter.release()
+        assert limiter.in_flight == 0
+
+    asyncio.run(main())
+
+
+def test_overload_is_429_with_retry_after(monkeypatch):
+    async def main():
+        limiter = AdmissionLimiter("order", limit=1, queue_size=0, queue_timeout=1.0)
+        monkeypatch.setattr(admission, "order_limiter", limiter)
+
+        admitted = admit_order(None)
+        await admitted.__anext__()
+        assert limiter.in_flight == 1
+
+        with pytest.raises(HTTPException) as info:
+            await admit_order(None).__anext__()
+        assert info.value.status_code == 429
+        assert info.value.headers == {"Retry-After": str(RETRY_AFTER)}
+
+        # Повтор с ответом в памяти проходит без слота
+        replay = admit_order({"status": "success", "order_id": 1})
+        await replay.__anext__()
+        assert limiter.in_flight == 1
+
+        with pytest.raises(StopAsyncIteration):
+            await admitted.__anext__()
+        assert limiter.in_flight == 0
+
+    asyncio.run(main())
+
+
+def test_order_replay_uses_memory_only(monkeypatch):
+    def no_database():
+        raise AssertionError("order_replay не должен обращаться к базе данных")
+
+    monkeypatch.setattr(idempotency, "get_db_session", no_database)
+
+    async def main():
+        assert await order_replay(None) is None
+        assert await order_replay("new-key") is None
+        idempotency_store.remember("known-key", {"order_id": 1})
+        assert await order_replay("known-key") == {"order_id": 1}
+        with pytest.raises(InvalidOrder):
+            await order_replay("x" * 100)
+
+    asyncio.run(main())
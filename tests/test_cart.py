@@ -0,0 +1,68 @@
+"""
+Расчет корзины по снимку каталога: цены и причины отказа
+"""
+from types import SimpleNamespace
+
+from admin_service.admin.cart import (
+    INVALID_QUANTITY, NOT_AVAILABLE, OTHER_RESTAURANT, OUT_OF_STOCK, quote_cart
+)
+
+
+def product(id, restaurant_id=1, stock=None, price=100.0, effective_price=None, discount_id=None):
+    return {
+        "id": id, "name": f"товар {id}", "restaurant_id": restaurant_id, "stock": stock,
+        "price": price, "effective_price": price if effective_price is None else effective_price,
+        "discount_id": discount_id
+    }
+
+
+SNAPSHOT = SimpleNamespace(version=7, products_by_id={
+    1: product(1, effective_price=80.0, discount_id=3),
+    2: product(2, restaurant_id=2),
+    3: product(3, restaurant_id=None),
+    4: product(4, stock=0),
+    5: product(5, stock=1),
+})
+
+
+def reasons(quote):
+    return {line["id"]: line["reason"] for line in quote["unavailable"]}
+
+
+def test_prices_from_snapshot():
+    quote = quote_cart(SNAPSHOT, [{"id": 1, "qty": 2}, {"id": "3"}], restaurant_id=1)
+    assert quote["unavailable"] == []
+    assert [(line["id"], line["qty"], line["price"], line["sum"]) for line in quote["items"]] == [
+        (1, 2, 80.0, 160.0), (3, 1, 100.0, 100.0)
+    ]
+    assert quote["items"][0]["base_price"] == 100.0 and quote["items"][0]["discount_id"] == 3
+    assert quote["total"] == 260.0
+    assert quote["catalog_version"] == 7
+
+
+def test_rejection_reasons():
+    quote = quote_cart(SNAPSHOT, [
+        {"id": 99},
+        {"id": "abc"},
+        {"id": 1, "qty": 0},
+        {"id": 1, "qty": "много"},
+        {"id": 2},
+        {"id": 4},
+    ], restaurant_id=1)
+    assert quote["items"] == [] and quote["total"] == 0
+    assert [line["reason"] for line in quote["unavailable"]] == [
+        NOT_AVAILABLE, NOT_AVAILABLE, INVALID_QUANTITY, INVALID_QUANTITY, OTHER_RESTAURANT, OUT_OF_STOCK
+    ]
+
+
+def test_stock_quantity_is_left_to_reserve_stock():
+    # Остаток в снимке может устареть: количество сверх него проверяет reserve_stock
+    quote = quote_cart(SNAPSHOT, [{"id": 5, "qty": 3}])
+    assert reasons(quote) == {}
+    assert quote["total"] == 300.0
+
+
+def test_any_restaurant_without_restaurant_id():
+    quote = quote_cart(SNAPSHOT, [{"id": 1}, {"id": 2}])
+    assert reasons(quote) == {}
+    assert quote["total"] == 180.0
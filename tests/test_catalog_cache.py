@@ -0,0 +1,52 @@
+"""
+Предыдущий снимок каталога, пока база недоступна
+
+После неудачного перестроения запросы REBUILD_BACKOFF секунд получают
+предыдущий снимок сразу, не стоя в очереди за таймаутами соединения.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+
+from admin_service.admin import catalog
+from admin_service.admin.catalog import CatalogCache
+
+
+class Stale:
+    version = 1
+
+
+def test_failed_rebuild_backs_off(monkeypatch):
+    attempts = []
+
+    @asynccontextmanager
+    async def session():
+        yield None
+
+    async def build_snapshot(db, version, moment=None):
+        attempts.append(version)
+        await asyncio.sleep(0.01)
+        raise ConnectionRefusedError("база недоступна")
+
+    monkeypatch.setattr(catalog, "get_db_session", session)
+    monkeypatch.setattr(catalog, "build_snapshot", build_snapshot)
+
+    async def main():
+        cache = CatalogCache()
+        cache._snapshot = Stale()
+        cache.invalidate()
+
+        snapshots = await asyncio.gather(*(cache.get_snapshot() for _ in range(20)))
+        assert all(snapshot is cache._snapshot for snapshot in snapshots)
+        assert len(attempts) == 1
+
+        # Новое изменение каталога в паузе тоже не перестраивает снимок
+        cache.invalidate()
+        assert await cache.get_snapshot() is cache._snapshot
+        assert len(attempts) == 1
+
+        # Пауза истекла - следующий запрос снова пробует базу
+        cache._retry_at = 0.0
+        assert await cache.get_snapshot() is cache._snapshot
+        assert len(attempts) == 2
+
+    asyncio.run(main())
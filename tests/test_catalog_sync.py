@@ -0,0 +1,86 @@
+"""
+Дельта-синхронизация каталога при параллельных записях
+
+Нужен PostgreSQL со схемой из alembic (DATABASE_URL, как у приложения),
+без него тесты пропускаются.
+"""
+import asyncio
+
+import pytest
+from sqlalchemy import delete, select, text, update
+
+from admin_service.admin.catalog_sync import get_catalog_changes, record_deletion
+from shared.database import get_db_session
+from shared.database.connection import engine
+from shared.models import CatalogTombstone, Category
+
+
+async def sync(since: int):
+    async with get_db_session() as db:
+        return await get_catalog_changes(db, since)
+
+
+def ids(changes, kind: str):
+    return {row["id"] if kind == "upserted" else row for row in changes["categories"][kind]}
+
+
+async def interleaved_writers():
+    async with get_db_session() as db:
+        categories = [Category(name=f"sync-test-{i}") for i in range(3)]
+        db.add_all(categories)
+        await db.commit()
+        updated, committed, deleted = (category.id for category in categories)
+
+    try:
+        cursor = (await sync(0))["version"]
+
+        # A берет версию первым и остается открытой, B пишет позже и коммитит
+        async with get_db_session() as writer_a, get_db_session() as writer_b:
+            await writer_a.execute(update(Category).where(Category.id == updated).values(name="sync-test-a"))
+            await writer_a.execute(delete(Category).where(Category.id == deleted))
+            record_deletion(writer_a, "category", [deleted])
+            await writer_a.flush()
+
+            await writer_b.execute(update(Category).where(Category.id == committed).values(name="sync-test-b"))
+            await writer_b.commit()
+
+            during = await sync(cursor)
+            assert updated not in ids(during, "upserted")
+            assert deleted not in ids(during, "deleted")
+
+            await writer_a.commit()
+
+        after = await sync(during["version"])
+        assert updated in ids(after, "upserted")
+        assert deleted in ids(after, "deleted")
+        assert committed in ids(during, "upserted") | ids(after, "upserted")
+        assert after["version"] >= during["version"]
+    finally:
+        async with get_db_session() as db:
+            await db.execute(delete(Category).where(Category.id.in_([updated, committed, deleted])))
+            await db.execute(delete(CatalogTombstone).where(CatalogTombstone.entity_id == deleted))
+            await db.commit()
+
+
+async def database_available() -> bool:
+    try:
+        async with engine.connect() as connection:
+            await connection.execute(select(text("1")))
+        return True
+    except Exception:
+        return False
+    finally:
+        await engine.dispose()
+
+
+def test_changes_of_later_commit_are_not_skipped():
+    if not asyncio.run(database_available()):
+        pytest.skip("PostgreSQL недоступен")
+
+    async def run():
+        try:
+            await interleaved_writers()
+        finally:
+            await engine.dispose()
+
+    asyncio.run(run())
@@ -0,0 +1,49 @@
+"""
+Ключи идемпотентности: проверка ключа и ответы из памяти процесса
+"""
+import asyncio
+
+from admin_service.admin import idempotency
+from admin_service.admin.idempotency import MAX_KEY_LENGTH, IdempotencyStore, valid_key
+
+
+def test_valid_key():
+    assert valid_key("0f1e2d3c-4b5a-6978-8796-a5b4c3d2e1f0")
+    assert valid_key("x" * MAX_KEY_LENGTH)
+    assert not valid_key("")
+    assert not valid_key("x" * (MAX_KEY_LENGTH + 1))
+    assert not valid_key("ключ")
+    assert not valid_key("key\n")
+
+
+def test_memory_expires():
+    store = IdempotencyStore()
+    store.remember("a", {"order_id": 1})
+    store.remember("b", {"order_id": 2}, ttl=-1)
+    assert store.cached("a") == {"order_id": 1}
+    assert store.cached("b") is None
+    assert "b" not in store._memory
+    assert store.cached("c") is None
+
+
+def test_memory_is_bounded(monkeypatch):
+    monkeypatch.setattr(idempotency, "MEMORY_SIZE", 2)
+    store = IdempotencyStore()
+    store.remember("a", {"order_id": 1})
+    store.remember("b", {"order_id": 2})
+    store.remember("a", {"order_id": 1})
+    store.remember("c", {"order_id": 3})
+    # Вытесняется давнее всего записанный ключ
+    assert store.cached("b") is None
+    assert store.cached("a") == {"order_id": 1}
+    assert store.cached("c") == {"order_id": 3}
+
+
+def test_lookup_from_memory_skips_database():
+    class NoDatabase:
+        async def execute(self, stmt):
+            raise AssertionError("ответ из памяти не должен читаться из базы данных")
+
+    store = IdempotencyStore()
+    store.remember("a", {"order_id": 1})
+    assert asyncio.run(store.lookup(NoDatabase(), "a")) == {"order_id": 1}
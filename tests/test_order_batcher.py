@@ -0,0 +1,138 @@
+"""
+Групповая запись заказов: ответы вызывающим
+
+Запись в базу подменяется, PostgreSQL не нужен.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from admin_service.admin import order_batcher
+from admin_service.admin.order_batcher import OrderBatcher
+from admin_service.admin.order_ingest import OrderRejected
+
+
+def test_stop_answers_queued_and_running_orders(monkeypatch):
+    async def main():
+        batcher = OrderBatcher(window=0.01, max_size=2)
+        writing = asyncio.Event()
+
+        async def hang(batch):
+            writing.set()
+            await asyncio.Event().wait()
+
+        monkeypatch.setattr(batcher, "_write", hang)
+        batcher.start()
+        calls = [asyncio.create_task(batcher.submit(None, {}, None)) for _ in range(5)]
+        await writing.wait()
+
+        await batcher.stop()
+        responses = await asyncio.wait_for(asyncio.gather(*calls), 1)
+        assert all(response["status"] == "error" for response in responses)
+        assert (await batcher.submit(None, {}, None))["status"] == "error"
+
+    asyncio.run(main())
+
+
+class FakeSavepoint:
+    def __init__(self, session):
+        self.session = session
+
+    def __await__(self):
+        yield from []
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.session.log.append("rollback" if exc_type else "release")
+
+    async def commit(self):
+        self.session.log.append("release")
+
+    async def rollback(self):
+        self.session.log.append("rollback")
+
+
+class FakeSession:
+    def __init__(self):
+        self.log = []
+
+    def begin_nested(self):
+        return FakeSavepoint(self)
+
+    async def commit(self):
+        self.log.append("commit")
+
+
+def patch_ingest(monkeypatch, write_orders):
+    session = FakeSession()
+    committed = []
+
+    @asynccontextmanager
+    async def get_db_session():
+        yield session
+
+    async def lock_products(db, product_ids):
+        pass
+
+    async def write_order(db, order, quote, idempotency_key):
+        if order == "нет остатка":
+            raise OrderRejected({"status": "error", "message": order})
+        if order == "ошибка":
+            raise RuntimeError(order)
+        return {"status": "success", "order_id": order}, False
+
+    monkeypatch.setattr(order_batcher, "get_db_session", get_db_session)
+    monkeypatch.setattr(order_batcher, "lock_products", lock_products)
+    monkeypatch.setattr(order_batcher, "order_quantities", lambda quote: [])
+    monkeypatch.setattr(order_batcher, "write_orders", write_orders)
+    monkeypatch.setattr(order_batcher, "write_order", write_order)
+    monkeypatch.setattr(order_batcher, "order_committed", lambda response, sold_out, key: committed.append(response))
+    return session, committed
+
+
+async def submit_batch(orders):
+    batcher = OrderBatcher(window=0.05, max_size=len(orders))
+    batcher.start()
+    try:
+        responses = await asyncio.gather(*(batcher.submit(order, {}, None) for order in orders))
+    finally:
+        await batcher.stop()
+    return batcher, responses
+
+
+def test_batch_written_together(monkeypatch):
+    async def write_orders(db, jobs):
+        return [({"status": "success", "order_id": order}, False) for order, _, _ in jobs]
+
+    session, committed = patch_ingest(monkeypatch, write_orders)
+    batcher, responses = asyncio.run(submit_batch([1, 2, 3]))
+
+    assert [response["order_id"] for response in responses] == [1, 2, 3]
+    assert session.log == ["release", "commit"]
+    assert len(committed) == 3
+    assert batcher.stats()["batches"] == 1 and batcher.stats()["fallbacks"] == 0
+
+
+@pytest.mark.parametrize("batch_result", ["rejected", "error"])
+def test_fallback_to_savepoint_per_order(monkeypatch, batch_result):
+    async def write_orders(db, jobs):
+        if batch_result == "error":
+            raise RuntimeError("ошибка записи пачки")
+        return None
+
+    session, committed = patch_ingest(monkeypatch, write_orders)
+    batcher, responses = asyncio.run(submit_batch([1, "нет остатка", "ошибка", 4]))
+
+    assert responses[0] == {"status": "success", "order_id": 1}
+    assert responses[1] == {"status": "error", "message": "нет остатка"}
+    assert responses[2]["status"] == "error" and "ошибка" in responses[2]["message"]
+    assert responses[3] == {"status": "success", "order_id": 4}
+
+    # Пачка откатывается до savepoint, затем у каждого заказа свой savepoint
+    assert session.log == ["rollback", "release", "rollback", "rollback", "release", "commit"]
+    assert [response["order_id"] for response in committed] == [1, 4]
+    assert batcher.stats()["fallbacks"] == 1
@@ -0,0 +1,92 @@
+"""
+Проверка тела заказа: строгие типы, ограничения размера и потолок тела
+"""
+import asyncio
+import json
+
+import pytest
+from starlette.requests import Request
+
+from admin_service.admin.order_request import (
+    MAX_CART_LINES, MAX_ERRORS, MAX_ORDER_BYTES, MAX_QUANTITY, InvalidOrder, parse_order, validate_order
+)
+
+
+def body(**fields) -> bytes:
+    order = {"order": [{"id": 1, "qty": 2}], "totalSum": 300}
+    order.update(fields)
+    return json.dumps(order).encode()
+
+
+def rejected(data: bytes) -> InvalidOrder:
+    with pytest.raises(InvalidOrder) as info:
+        validate_order(data)
+    return info.value
+
+
+def test_valid_order_ignores_extra_fields():
+    order = validate_order(body(
+        order=[{"id": 1, "qty": 2, "name": "Пицца", "price": 1}, {"id": 2}],
+        user={"id": 5, "first_name": "  Иван ", "is_bot": False},
+        address=" ул. Ленина "
+    ))
+    assert [(line.id, line.qty) for line in order.order] == [(1, 2), (2, 1)]
+    assert order.user.first_name == "Иван"
+    assert order.address == "ул. Ленина"
+    assert order.totalSum == 300.0
+
+
+@pytest.mark.parametrize("fields", [
+    {"order": []},
+    {"order": [{"id": 1}] * (MAX_CART_LINES + 1)},
+    {"order": [{"id": "1"}]},
+    {"order": [{"id": 1, "qty": "2"}]},
+    {"order": [{"id": 1, "qty": 1.5}]},
+    {"order": [{"id": 0}]},
+    {"order": [{"id": 1, "qty": 0}]},
+    {"order": [{"id": 1, "qty": MAX_QUANTITY + 1}]},
+    {"address": "x" * 501},
+    {"phone": 123},
+    {"user": {"id": "5"}},
+])
+def test_invalid_fields(fields):
+    error = rejected(body(**fields))
+    assert error.message == "Некорректный заказ"
+    assert error.response()["status"] == "error"
+    assert error.response()["errors"]
+
+
+def test_not_json():
+    assert rejected(b"{").message == "Некорректный заказ"
+    assert rejected(b"[]").message == "Некорректный заказ"
+
+
+def test_errors_are_truncated():
+    error = rejected(body(order=[{"id": "x"}] * 50))
+    assert len(error.response()["errors"]) == MAX_ERRORS
+
+
+def request(chunks, headers=()) -> Request:
+    messages = [{"type": "http.request", "body": chunk, "more_body": True} for chunk in chunks]
+    messages.append({"type": "http.request", "body": b"", "more_body": False})
+
+    async def receive():
+        return messages.pop(0)
+
+    scope = {"type": "http", "method": "POST", "path": "/api/orders", "headers": list(headers)}
+    return Request(scope, receive)
+
+
+def test_body_cap():
+    small = body()
+    order = asyncio.run(parse_order(request([small[:10], small[10:]])))
+    assert order.order[0].id == 1
+
+    # Без Content-Length тело читается не дальше потолка
+    chunk = b" " * (16 * 1024)
+    with pytest.raises(InvalidOrder, match="Слишком большой заказ"):
+        asyncio.run(parse_order(request([chunk] * 5)))
+
+    declared = [(b"content-length", str(MAX_ORDER_BYTES + 1).encode())]
+    with pytest.raises(InvalidOrder, match="Слишком большой заказ"):
+        asyncio.run(parse_order(request([small], declared)))
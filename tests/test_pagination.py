@@ -0,0 +1,89 @@
+"""
+Курсоры keyset-пагинации и выборка полей
+"""
+import asyncio
+import base64
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import column, select, table
+
+from admin_service.admin.pagination import decode_cursor, encode_cursor, keyset_page, page_limit, parse_fields
+from shared.config import settings
+
+ITEMS = table("items", column("id"), column("name"))
+
+
+class FakeSession:
+    """Сессия, возвращающая заданные строки и запоминающая запрос"""
+
+    def __init__(self, ids):
+        self.ids = ids
+        self.stmt = None
+
+    async def execute(self, stmt):
+        self.stmt = stmt
+        rows = [SimpleNamespace(_mapping={"id": id}) for id in self.ids]
+        return SimpleNamespace(all=lambda: rows)
+
+
+def raw_cursor(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor({"id": 12345})
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == {"id": 12345}
+    assert decode_cursor(None) is None
+    assert decode_cursor("") is None
+
+
+@pytest.mark.parametrize("cursor", [
+    "не base64!",
+    raw_cursor(b"not json"),
+    raw_cursor(b"[1, 2]"),
+])
+def test_malformed_cursor(cursor):
+    with pytest.raises(HTTPException) as info:
+        decode_cursor(cursor)
+    assert info.value.status_code == 400
+
+
+@pytest.mark.parametrize("key", [{}, {"id": "5"}, {"id": 1.5}, {"id": True}, {"id": None}])
+def test_tampered_cursor(key):
+    with pytest.raises(HTTPException) as info:
+        asyncio.run(keyset_page(FakeSession([]), select(ITEMS.c.id), ITEMS.c.id, encode_cursor(key), 10))
+    assert info.value.status_code == 400
+
+
+def test_next_cursor_only_when_more_rows():
+    db = FakeSession([9, 8, 7])
+    rows, next_cursor = asyncio.run(keyset_page(
+        db, select(ITEMS.c.id), ITEMS.c.id, encode_cursor({"id": 10}), 2, descending=True
+    ))
+    assert rows == [{"id": 9}, {"id": 8}]
+    assert decode_cursor(next_cursor) == {"id": 8}
+    sql = str(db.stmt.compile(compile_kwargs={"literal_binds": True}))
+    assert "items.id < 10" in sql and "LIMIT 3" in sql
+
+    rows, next_cursor = asyncio.run(keyset_page(FakeSession([3]), select(ITEMS.c.id), ITEMS.c.id, None, 2))
+    assert rows == [{"id": 3}] and next_cursor is None
+
+
+def test_page_limit():
+    assert page_limit(None) == settings.API_PAGE_SIZE
+    assert page_limit(5) == 5
+    assert page_limit(10 ** 6) == settings.API_MAX_PAGE_SIZE
+    with pytest.raises(HTTPException):
+        page_limit(0)
+
+
+def test_parse_fields():
+    allowed = {"id": None, "name": None, "price": None}
+    assert parse_fields(None, allowed, default=["id", "name"]) == ["id", "name"]
+    assert parse_fields("price, name,,price,id", allowed, default=[]) == ["id", "price", "name"]
+    with pytest.raises(HTTPException) as info:
+        parse_fields("id,password", allowed, default=[])
+    assert info.value.status_code == 400
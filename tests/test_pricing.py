@@ -0,0 +1,66 @@
+"""
+Итоговые цены товаров по индексу скидок
+"""
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from admin_service.admin.pricing import DiscountIndex
+
+NOW = datetime(2026, 5, 1, 12, 0)
+
+
+def discount(id, percent, product_id=None, category_id=None, restaurant_id=None, **fields):
+    values = dict(
+        id=id, percent=percent, is_active=True, date_start=None, date_end=None,
+        product_id=product_id, category_id=category_id, restaurant_id=restaurant_id
+    )
+    values.update(fields)
+    return SimpleNamespace(**values)
+
+
+def test_largest_applicable_discount_wins():
+    index = DiscountIndex([
+        discount(1, 10, product_id=5),
+        discount(2, 20, category_id=3),
+        discount(3, 15, restaurant_id=1),
+        discount(4, 50, category_id=4),
+    ], NOW)
+
+    assert index.price(5, 3, 1, 100.0) == (80.0, 2)
+    assert index.price(5, None, 1, 100.0) == (85.0, 3)
+    assert index.price(5, None, None, 100.0) == (90.0, 1)
+    assert index.price(6, 3, 2, 100.0) == (80.0, 2)
+    assert index.price(7, None, 2, 100.0) == (100.0, None)
+
+
+def test_best_discount_per_level():
+    index = DiscountIndex([discount(1, 10, product_id=5), discount(2, 30, product_id=5)], NOW)
+    assert index.price(5, None, None, 100.0) == (70.0, 2)
+
+
+def test_inactive_and_out_of_window_discounts_are_ignored():
+    index = DiscountIndex([
+        discount(1, 10, product_id=5, is_active=False),
+        discount(2, 20, product_id=5, date_start=NOW + timedelta(hours=1)),
+        discount(3, 30, product_id=5, date_end=NOW),
+        discount(4, 0, product_id=5),
+        discount(5, None, product_id=5),
+        discount(6, 5, product_id=5, date_start=NOW, date_end=NOW + timedelta(hours=1)),
+    ], NOW)
+    assert index.price(5, None, None, 100.0) == (95.0, 6)
+
+
+def test_lower_of_discount_price_and_percent():
+    index = DiscountIndex([discount(1, 10, product_id=5)], NOW)
+
+    # Своя discount_price ниже - скидка из индекса не применяется
+    assert index.price(5, None, None, 100.0, 80.0) == (80.0, None)
+    assert index.price(5, None, None, 100.0, 95.0) == (90.0, 1)
+    # discount_price не ниже цены не действует
+    assert index.price(6, None, None, 100.0, 120.0) == (100.0, None)
+
+
+def test_percent_is_capped_and_rounded():
+    index = DiscountIndex([discount(1, 150, product_id=5), discount(2, 33, product_id=6)], NOW)
+    assert index.price(5, None, None, 100.0) == (0.0, 1)
+    assert index.price(6, None, None, 9.99) == (6.69, 2)
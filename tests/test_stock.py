@@ -0,0 +1,109 @@
+"""
+Резервирование остатков при одновременных заказах
+
+Нужен PostgreSQL со схемой из alembic (DATABASE_URL, как у приложения),
+без него тесты пропускаются.
+"""
+import asyncio
+
+import pytest
+from sqlalchemy import delete, select, text
+
+from admin_service.admin.routes.orders import update_order_status
+from admin_service.admin.stock import reserve_stock
+from shared.database import get_db_session
+from shared.database.connection import engine
+from shared.models import Order, OrderItem, Product
+
+ORDERS = 500
+STOCK = 37
+
+
+async def database_available() -> bool:
+    try:
+        async with engine.connect() as connection:
+            await connection.execute(select(text("1")))
+        return True
+    except Exception:
+        return False
+    finally:
+        await engine.dispose()
+
+
+def run(test):
+    if not asyncio.run(database_available()):
+        pytest.skip("PostgreSQL недоступен")
+
+    async def main():
+        try:
+            await test()
+        finally:
+            await engine.dispose()
+
+    asyncio.run(main())
+
+
+async def create_product(stock: int) -> int:
+    async with get_db_session() as db:
+        product = Product(name="stock-test", price=100.0, stock=stock)
+        db.add(product)
+        await db.commit()
+        return product.id
+
+
+async def product_stock(product_id: int) -> int:
+    async with get_db_session() as db:
+        return await db.scalar(select(Product.stock).where(Product.id == product_id))
+
+
+async def concurrent_orders():
+    product_id = await create_product(STOCK)
+
+    async def order() -> bool:
+        async with get_db_session() as db:
+            short, _ = await reserve_stock(db, {product_id: 1})
+            if short:
+                await db.rollback()
+                return False
+            await db.commit()
+            return True
+
+    try:
+        results = await asyncio.gather(*(order() for _ in range(ORDERS)))
+        assert sum(results) == STOCK
+        assert await product_stock(product_id) == 0
+    finally:
+        async with get_db_session() as db:
+            await db.execute(delete(Product).where(Product.id == product_id))
+            await db.commit()
+
+
+async def cancel_twice():
+    product_id = await create_product(7)
+    async with get_db_session() as db:
+        order = Order(total=300.0, stock_reserved=True)
+        db.add(order)
+        await db.flush()
+        db.add(OrderItem(order_id=order.id, product_id=product_id, quantity=3, price=100.0))
+        await db.commit()
+        order_id = order.id
+
+    try:
+        for _ in range(2):
+            async with get_db_session() as db:
+                await update_order_status(order_id, status="cancelled", db=db)
+        assert await product_stock(product_id) == 10
+    finally:
+        async with get_db_session() as db:
+            await db.execute(delete(OrderItem).where(OrderItem.order_id == order_id))
+            await db.execute(delete(Order).where(Order.id == order_id))
+            await db.execute(delete(Product).where(Product.id == product_id))
+            await db.commit()
+
+
+def test_concurrent_orders_do_not_oversell():
+    run(concurrent_orders)
+
+
+def test_second_cancel_does_not_return_stock():
+    run(cancel_twice)
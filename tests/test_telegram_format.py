@@ -0,0 +1,42 @@
+"""
+Сообщения о заказах для parse_mode='HTML'
+
+Данные клиента не должны ломать разметку: Telegram отклоняет такое
+сообщение (BadRequest), и уведомление сразу уходит в dead letters.
+"""
+import html
+import re
+
+from shared.telegram.sender import TelegramSender
+
+ORDER = {
+    "order_id": 42,
+    "address": "ул. Ленина <1> & двор",
+    "totalSum": 300.0,
+    "timestamp": "<вчера>",
+    "user": {"first_name": "Иван <b>", "last_name": "&amp", "username": "i<v>an"},
+    "order": [{"name": "Пицца <Маргарита> & соус", "qty": 2, "price": 150.0}]
+}
+
+# Теги, которые добавляет сам форматтер
+MARKUP = re.compile(r"</?(b|i)>")
+
+
+def assert_valid_html(message: str):
+    text = MARKUP.sub("", message)
+    assert "<" not in text and ">" not in text
+    # Каждый & начинает сущность
+    assert not re.search(r"&(?!(amp|lt|gt|quot|#x27);)", text)
+
+
+def test_order_message_escapes_customer_input():
+    message = TelegramSender(bot_token="")._format_order_message(ORDER)
+    assert_valid_html(message)
+    assert html.escape(ORDER["address"]) in message
+    assert "Пицца &lt;Маргарита&gt; &amp; соус" in message
+
+
+def test_digest_escapes_customer_input():
+    message = TelegramSender(bot_token="")._format_digest([ORDER, {**ORDER, "order_id": "<43>"}])
+    assert_valid_html(message)
+    assert html.escape(ORDER["address"]) in message
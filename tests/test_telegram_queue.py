@@ -0,0 +1,132 @@
+"""
+Ограничение частоты уведомлений: token bucket, сводки и повтор после 429
+
+Бот подменяется заглушкой, python-telegram-bot и сеть не нужны.
+"""
+import asyncio
+
+import pytest
+
+from shared.telegram import sender as sender_module
+from shared.telegram.sender import RetryAfter, TelegramSender, TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(sender_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_token_bucket_refill(clock):
+    bucket = TokenBucket(rate=0.5, capacity=3)
+    assert bucket.available() == 3
+    for _ in range(3):
+        bucket.take()
+    assert bucket.available() == 0
+    assert bucket.delay() == pytest.approx(2.0)
+
+    clock[0] += 3
+    assert bucket.available() == 1
+    clock[0] += 100
+    assert bucket.available() == 3
+
+
+def test_token_bucket_pause(clock):
+    bucket = TokenBucket(rate=10, capacity=3)
+    bucket.pause(5)
+    assert bucket.available() == 0
+    assert bucket.delay() == pytest.approx(5.0)
+
+    # Пауза не сокращается более коротким retry_after
+    bucket.pause(1)
+    assert bucket.delay() == pytest.approx(5.0)
+
+    clock[0] += 5
+    assert bucket.delay() == 0.0
+    assert bucket.available() == 3
+
+
+class StubBot:
+    def __init__(self, fail_first=None):
+        self.sent = []
+        self.fail_first = fail_first
+
+    async def send_message(self, chat_id, text, parse_mode):
+        if self.fail_first is not None:
+            error, self.fail_first = self.fail_first, None
+            raise error
+        self.sent.append((chat_id, text))
+
+
+def make_sender(bot, rate=6000.0, burst=1) -> TelegramSender:
+    sender = TelegramSender("token", "chat")
+    sender.bot = bot
+    sender.chat_rate = rate
+    sender.chat_burst = burst
+    return sender
+
+
+def order(order_id):
+    return {"order_id": order_id, "totalSum": 100, "address": "ул. Ленина", "order": [{"name": "Пицца", "qty": 1}]}
+
+
+def test_burst_is_digested():
+    async def main():
+        bot = StubBot()
+        sender = make_sender(bot, burst=1)
+        results = await asyncio.gather(*(sender.deliver_order_notification(order(i)) for i in range(1, 6)))
+        assert results == [None] * 5
+
+        # Бюджет на одно сообщение, в очереди пять заказов - одна сводка
+        assert len(bot.sent) == 1
+        text = bot.sent[0][1]
+        assert all(f"#{i}" in text for i in range(1, 6))
+        stats = sender.stats()["chats"]["chat"]
+        assert stats["messages"] == 1 and stats["digests"] == 1
+        await sender.close()
+
+    asyncio.run(main())
+
+
+def test_single_order_within_budget():
+    async def main():
+        bot = StubBot()
+        sender = make_sender(bot, burst=3)
+        assert await sender.deliver_order_notification(order(7), "kitchen") is None
+        assert len(bot.sent) == 1 and bot.sent[0][0] == "kitchen"
+        assert sender.stats()["chats"]["kitchen"]["digests"] == 0
+        await sender.close()
+
+    asyncio.run(main())
+
+
+def test_retry_after_requeues_same_batch():
+    async def main():
+        bot = StubBot(fail_first=RetryAfter(1))
+        sender = make_sender(bot, burst=3)
+        results = await asyncio.gather(*(sender.deliver_order_notification(order(i)) for i in (1, 2)))
+        assert results == [None, None]
+
+        # Заказ вернулся в начало очереди: после паузы бюджета нет, и оба
+        # заказа уходят одной сводкой в прежнем порядке
+        assert len(bot.sent) == 1
+        text = bot.sent[0][1]
+        assert text.index("#1") < text.index("#2")
+        assert sender.stats()["chats"]["chat"]["retry_after"] == 1
+        await sender.close()
+
+    asyncio.run(asyncio.wait_for(main(), 10))
+
+
+def test_close_answers_pending_orders():
+    async def main():
+        bot = StubBot()
+        sender = make_sender(bot, rate=0.001, burst=0)
+        pending = asyncio.create_task(sender.deliver_order_notification(order(1)))
+        await asyncio.sleep(0.01)
+        await sender.close()
+        assert isinstance(await pending, sender_module.NotSent)
+        assert bot.sent == []
+
+    asyncio.run(main())